@@ -2,11 +2,15 @@ import tkinter as tk
 import json
 import string
 import random
+import queue
+import threading
 from tkinter import font, messagebox
 from PIL import ImageTk, Image
 from ctypes import windll
 from os import getcwd, startfile
 from dress_flower import make_flower
+from render_service import connect
+from preview import draw_preview
 
 # Ajuste da resolução de texto do Windows
 windll.shcore.SetProcessDpiAwareness(1)
@@ -143,10 +147,95 @@ def make_json():
 
     return id
 
+# Estado da geração dos pedidos, exibido abaixo da imagem
+status = tk.Label(text='', font=SUB_FONT, fg=BLACK)
+status.grid(row=8, column=0, columnspan=6)
+
+# Pedidos aguardando a geração e etapas informadas pela geração, trocados
+# entre a thread da interface e a thread de geração
+orders = queue.Queue()
+events = queue.Queue()
+pending = []
+
+STAGE_TEXT = {
+    'localização': 'criando a geometria',
+    'geometria': 'pintando e exportando',
+    'exportação': 'finalizando',
+    'concluído': 'concluído',
+    'erro': 'erro'
+}
+
+def render_orders():
+    """
+    Gera os pedidos da fila, um de cada vez, fora da thread da interface,
+    e informa cada etapa concluída pela fila de eventos. A prévia é
+    desenhada nesta thread e apenas exibida pela interface.
+    """
+    while True:
+        art_id = orders.get()
+
+        def progress(stage, value):
+            if stage == 'geometria':
+                try:
+                    value = draw_preview(*value, width=375)
+                except Exception:
+                    value = None
+            elif stage != 'concluído':
+                value = None
+            events.put((art_id, stage, value))
+
+        # Utiliza o serviço de renderização, caso esteja em execução, para
+        # aproveitar o Rhino já carregado. Os formatos são exportados em
+        # sequência: os processos de exportação do artist.export_pool
+        # importariam novamente este módulo no Windows, abrindo uma nova
+        # janela em cada processo
+        service = connect()
+        try:
+            make_flower(art_id, parallel=False, service=service,
+                        progress=progress)
+        except Exception as error:
+            events.put((art_id, 'erro', str(error)))
+        finally:
+            if service is not None:
+                service.close()
+
+def show_events():
+    """
+    Atualiza a interface com as etapas informadas pela geração.
+    """
+    while True:
+        try:
+            art_id, stage, value = events.get_nowait()
+        except queue.Empty:
+            break
+
+        if stage == 'geometria' and value is not None:
+            panel.image = ImageTk.PhotoImage(value)
+            panel.configure(image=panel.image)
+        elif stage == 'concluído':
+            pending.remove(art_id)
+            startfile(value.get('jpeg') or
+                      getcwd() + '\\JPEG\\' + art_id + '_HQ.jpeg')
+        elif stage == 'erro':
+            pending.remove(art_id)
+            messagebox.showinfo('Erro!', value)
+
+        text = 'Pedido {}: {}.'.format(art_id, STAGE_TEXT[stage])
+        if len(pending) > 1:
+            text += ' {} pedidos na fila.'.format(len(pending))
+        status.configure(text=text)
+
+    root.after(100, show_events)
+
 def start_drawing():
+    # Coloca o pedido na fila sem esperar pela geração
     art_id = make_json()
-    make_flower(art_id)
-    startfile(getcwd() + '\\JPEG\\' + art_id + "_HQ.jpeg")
+    if art_id is None:
+        return
+    pending.append(art_id)
+    orders.put(art_id)
+    status.configure(text='Pedido {} na fila ({} no total).'.format(
+        art_id, len(pending)))
 
     return
 
@@ -155,4 +244,8 @@ button = tk.Button(width=10, height=2, text='Gerar Arte', font=TIT_FONT,
                    fg=GREEN, command=start_drawing)
 button.grid(row=5, column=3, rowspan=2, columnspan=1, padx=20)
 
+# Inicia a thread de geração e a atualização da interface
+threading.Thread(target=render_orders, daemon=True).start()
+root.after(100, show_events)
+
 root.mainloop()
\ No newline at end of file
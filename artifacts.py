@@ -0,0 +1,332 @@
+# artifacts.py
+#
+# Cache endereçado por conteúdo dos arquivos finais (3DM, PDF, JPEG e SVG).
+# A chave de um pedido é o hash dos valores de entrada já normalizados
+# (dígitos da data, coordenadas, texto, dimensão, cor e passos do
+# gradiente) e da versão do código. Pedidos repetidos recebem os arquivos
+# já gerados por hardlink, ou cópia quando o hardlink não é possível, em
+# vez de uma nova renderização. Como a versão do código faz parte da
+# chave, alterações nos módulos de geração invalidam o cache.
+#
+# O modelo 3DM sem cores de cada geometria também é guardado, com uma
+# chave que não inclui a cor, junto com os valores de entrada de cada
+# pedido e o nome da sua predefinição de qualidade. Assim, uma nova cor
+# para um pedido existente refaz apenas as etapas de pintura e exportação,
+# com a mesma qualidade do modelo. Da mesma forma, a geometria da flor na
+# dimensão de referência é guardada com uma chave que não inclui a
+# dimensão, e é reaproveitada pelas outras dimensões da mesma arte.
+#
+# Uso: python -m artifacts [estatisticas | limpar]
+#
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from os import getcwd, makedirs, path
+from quality import DEFAULT
+
+VERSION = '1.0.0'
+
+STORE = path.join(getcwd(), 'CACHE', 'artifacts')
+
+# Módulos cujo código altera o resultado da arte: todos os módulos do
+# projeto importados pela geração, exceto os que apenas validam ou
+# localizam os valores de entrada, que já fazem parte da chave
+SOURCES = ['dress_flower.py', 'geometry.py', 'outline.py', 'tween.py',
+           'curve_ops.py', 'atlas.py', 'compute.py', 'compute_cache.py',
+           'artist.py', 'colors.py', 'preview.py', 'vector.py', 'quality.py',
+           'raster.py', 'pyramid.py']
+
+# Extensões e pastas de saída de cada formato. As imagens da loja virtual
+# ('imagens') são uma pasta por pedido, com o seu manifesto
+OUTPUTS = {'3dm': ('3DM', '.3dm'), 'pdf': ('PDF', '.pdf'),
+           'jpeg': ('JPEG', '_HQ.jpeg'), 'svg': ('SVG', '.svg'),
+           'png': ('PNG', '.png'), 'imagens': ('IMAGENS', '')}
+
+_code_version = None
+
+def code_version():
+    """
+    Calcula a versão do código: a versão da ferramenta combinada com o
+    hash do conteúdo dos módulos que participam da geração da arte.
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256(VERSION.encode('utf-8'))
+        base = path.dirname(path.abspath(__file__))
+        for name in SOURCES:
+            with open(path.join(base, name), 'rb') as file:
+                digest.update(name.encode('utf-8') + file.read())
+        _code_version = VERSION + '-' + digest.hexdigest()[:12]
+
+    return _code_version
+
+def order_key(date, loc, size, text, color, blend, quality=None):
+    """
+    Cria a chave de conteúdo de um pedido à partir dos valores de entrada
+    normalizados pelo load_input. QUALITY é o nome da predefinição de
+    qualidade (veja quality.cache_name), omitido na produção para que as
+    chaves da produção não mudem.
+    """
+    values = {
+        'data': list(date),
+        'localização': [round(value, 7) for value in loc],
+        'dimensões': size,
+        'texto': text,
+        'cores': color,
+        'passos': blend,
+        'versão': code_version()
+    }
+    if quality is not None:
+        values['qualidade'] = quality
+    data = json.dumps(values, sort_keys=True, ensure_ascii=True)
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def shape_key(date, loc, blend, quality=None):
+    """
+    Cria a chave de conteúdo da geometria da flor, que não depende da
+    dimensão, do texto e da cor da arte.
+    """
+    return order_key(date, loc, None, None, None, blend, quality)
+
+def geometry_key(date, loc, size, text, blend, quality=None):
+    """
+    Cria a chave de conteúdo do modelo 3DM de um pedido, que não depende
+    da cor escolhida.
+    """
+    return order_key(date, loc, size, text, None, blend, quality)
+
+def output_paths(id):
+    """
+    Retorna os caminhos dos arquivos de saída de um pedido.
+    """
+    return {kind: path.join(getcwd(), folder, id + suffix)
+            for kind, (folder, suffix) in OUTPUTS.items()}
+
+def release(id):
+    """
+    Remove os arquivos de saída de um pedido antes de uma nova geração,
+    para que arquivos ligados ao cache por hardlink não sejam alterados.
+    """
+    for target in output_paths(id).values():
+        if path.isdir(target):
+            shutil.rmtree(target)
+        elif path.exists(target):
+            os.remove(target)
+
+def _link(source, target):
+    """
+    Cria um hardlink do arquivo de origem no destino, substituindo um
+    arquivo existente. Caso o hardlink não seja possível, copia o arquivo.
+    Pastas são recriadas no destino com um hardlink de cada arquivo.
+    """
+    if path.abspath(source) == path.abspath(target):
+        return
+    makedirs(path.dirname(target), exist_ok=True)
+    if path.isdir(target):
+        shutil.rmtree(target)
+    elif path.exists(target):
+        os.remove(target)
+    if path.isdir(source):
+        shutil.copytree(source, target, copy_function=_link)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class ArtifactStore:
+    """
+    Armazenamento dos arquivos finais por chave de conteúdo, com um índice
+    SQLite das entradas e das estatísticas de acertos e falhas.
+    """
+    def __init__(self, directory=STORE):
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path.join(directory, 'index.sqlite3'),
+                                   timeout=30)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                'key TEXT PRIMARY KEY, version TEXT, id TEXT, '
+                'created REAL, hits INTEGER DEFAULT 0)')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS stats ('
+                'name TEXT PRIMARY KEY, value INTEGER)')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS orders ('
+                'id TEXT PRIMARY KEY, key TEXT, input TEXT, quality TEXT)')
+
+            # Índices anteriores às predefinições de qualidade, cujos
+            # pedidos são todos da produção
+            columns = [row[1] for row in
+                       self._db.execute('PRAGMA table_info(orders)')]
+            if 'quality' not in columns:
+                self._db.execute('ALTER TABLE orders ADD COLUMN quality TEXT')
+
+    def _count(self, name):
+        with self._db:
+            self._db.execute(
+                'INSERT INTO stats VALUES (?, 1) ON CONFLICT(name) '
+                'DO UPDATE SET value = value + 1', (name,))
+
+    def _entry(self, key):
+        return path.join(self.directory, key[:2], key)
+
+    def fetch(self, key, id, kinds=('3dm', 'pdf', 'jpeg')):
+        """
+        Busca os arquivos KINDS de um pedido já gerado e os disponibiliza
+        com o ID fornecido. Retorna os caminhos dos arquivos, ou None caso
+        a chave não exista no cache ou não tenha algum dos formatos.
+        """
+        entry = self._entry(key)
+        sources = {kind: path.join(entry, kind + OUTPUTS[kind][1])
+                   for kind in kinds}
+        if not all(path.exists(name) for name in sources.values()):
+            self._count('falhas')
+            return None
+
+        targets = {kind: output_paths(id)[kind] for kind in kinds}
+        for kind, source in sources.items():
+            _link(source, targets[kind])
+        with self._db:
+            self._db.execute('UPDATE artifacts SET hits = hits + 1 '
+                             'WHERE key = ?', (key,))
+        self._count('acertos')
+
+        return targets
+
+    def store(self, key, id, outputs):
+        """
+        Guarda os arquivos gerados para um pedido sob a sua chave. Apenas
+        os formatos presentes em OUTPUTS são guardados.
+        """
+        entry = self._entry(key)
+        makedirs(entry, exist_ok=True)
+        for kind, (_, suffix) in OUTPUTS.items():
+            if outputs.get(kind):
+                _link(outputs[kind], path.join(entry, kind + suffix))
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO artifacts (key, version, id, created)'
+                ' VALUES (?, ?, ?, ?)', (key, code_version(), id, time.time()))
+
+    def fetch_model(self, key, name='modelo.3dm'):
+        """
+        Retorna o caminho do modelo 3DM guardado sob a chave, ou None caso
+        o modelo não exista. O arquivo guardado é apenas para leitura.
+        """
+        kind = 'formas' if name == 'forma.3dm' else 'modelos'
+        source = path.join(self._entry(key), name)
+        if not path.exists(source):
+            self._count(kind + ' ausentes')
+            return None
+        self._count(kind + ' reutilizadas' if kind == 'formas'
+                    else kind + ' reutilizados')
+
+        return source
+
+    def model_path(self, key, name='modelo.3dm'):
+        """
+        Registra a entrada de um modelo sob a chave e retorna o caminho em
+        que o modelo deve ser salvo.
+        """
+        entry = self._entry(key)
+        makedirs(entry, exist_ok=True)
+        with self._db:
+            self._db.execute(
+                'INSERT OR IGNORE INTO artifacts (key, version, id, created)'
+                ' VALUES (?, ?, ?, ?)', (key, code_version(), None,
+                                         time.time()))
+
+        return path.join(entry, name)
+
+    def record_order(self, id, key, input, quality=DEFAULT):
+        """
+        Registra a chave do modelo, os valores de entrada normalizados e o
+        nome da predefinição de qualidade de um pedido.
+        """
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO orders VALUES '
+                             '(?, ?, ?, ?)',
+                             (id, key, json.dumps(input, ensure_ascii=False),
+                              quality))
+
+    def order(self, id):
+        """
+        Retorna a chave do modelo, os valores de entrada normalizados e o
+        nome da predefinição de qualidade de um pedido, ou None caso o
+        pedido não tenha sido registrado.
+        """
+        row = self._db.execute('SELECT key, input, quality FROM orders '
+                               'WHERE id = ?', (id,)).fetchone()
+        if row is None:
+            return None
+
+        return row[0], tuple(json.loads(row[1])), row[2] or DEFAULT
+
+    def stats(self):
+        """
+        Retorna as estatísticas de uso do cache.
+        """
+        values = dict(self._db.execute('SELECT name, value FROM stats'))
+        hits = values.get('acertos', 0)
+        misses = values.get('falhas', 0)
+        entries = self._db.execute('SELECT COUNT(*) FROM artifacts')
+        return {
+            'acertos': hits,
+            'falhas': misses,
+            'taxa de acerto': hits / (hits + misses) if hits + misses else 0,
+            'entradas': entries.fetchone()[0],
+            'modelos reutilizados': values.get('modelos reutilizados', 0),
+            'formas reutilizadas': values.get('formas reutilizadas', 0),
+            'versão': code_version()
+        }
+
+    def purge(self, everything=False):
+        """
+        Remove as entradas geradas por outras versões do código, ou todas
+        as entradas com EVERYTHING. Retorna a quantidade removida.
+        """
+        query = 'SELECT key FROM artifacts'
+        args = ()
+        if not everything:
+            query += ' WHERE version != ?'
+            args = (code_version(),)
+        keys = [row[0] for row in self._db.execute(query, args)]
+        for key in keys:
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+        with self._db:
+            self._db.executemany('DELETE FROM artifacts WHERE key = ?',
+                                 [(key,) for key in keys])
+            self._db.executemany('DELETE FROM orders WHERE key = ?',
+                                 [(key,) for key in keys])
+
+        return len(keys)
+
+_store = None
+
+def get_store():
+    """
+    Retorna o armazenamento de arquivos do processo, criando-o se
+    necessário.
+    """
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'estatisticas'
+    store = get_store()
+    if command == 'limpar':
+        print('{} entradas removidas.'.format(store.purge()))
+    elif command == 'estatisticas':
+        print(json.dumps(store.stats(), ensure_ascii=False, indent=4))
+    else:
+        raise SystemExit('Uso: python -m artifacts [estatisticas | limpar]')
@@ -4,10 +4,27 @@
 # e cria funções para exportar o resultado em JPEG (para a versão Web)
 # e em Adobe PDF (para produção).
 #
+# A Session abre o documento uma única vez, à partir de um arquivo 3DM ou
+# de um modelo do rhino3dm transferido em memória, e executa a pintura e
+# as exportações no mesmo documento, salvando o 3DM apenas ao final.
+# O JPEG em alta resolução é capturado em faixas horizontais de TILE
+# linhas, cada uma uma janela da vista, em vez de uma única captura da
+# imagem inteira.
+# Com mais de um formato de saída, as exportações podem ser distribuídas
+# entre processos de exportação, cada um com a sua própria cópia do
+# documento pintado, de modo que o tempo total seja o da exportação mais
+# lenta e não a soma de todas.
+#
 
+import ctypes
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from os import getcwd
 from math import ceil
 import numpy as np
+from PIL import Image
 import rhinoinside
 
 rhinoinside.load()
@@ -18,6 +35,12 @@ from Rhino.Geometry import Point3d, Vector3d, Curve, Hatch
 from System.Collections.Generic import List
 from System.Drawing import Color, Bitmap
 
+# Formatos de saída disponíveis, na ordem de exportação
+FORMATS = ('pdf', 'jpeg')
+
+# Linhas de cada faixa capturada do JPEG em alta resolução
+TILE = 400
+
 def MakeGradient(colors, n):
     """
     Cria uma lista de N cores em um gradiente entre as cores C1 e C2.
@@ -38,16 +61,13 @@ def MakeGradient(colors, n):
     
     return gradient
 
-def paint(filename, colors):
+def PaintDocument(doc, colors):
     """
-    Cria todas as camadas de hatches e cores para o modelo 3DM fornecido, de 
-    acordo com a lista de cores. A lista de cores deve fornecer duas cores e 
-    uma quantidade N de cores intermediárias entre as duas cores.
-    Essa função retorna o nome do arquivo utilizado.
+    Cria todas as camadas de hatches e cores para o documento do Rhino
+    fornecido, de acordo com a lista de cores. A lista de cores deve
+    fornecer duas cores e uma quantidade N de cores intermediárias entre
+    as duas cores.
     """
-    # Abre o arquivo Rhino com base no nome do arquivo fornecido
-    doc = Rhino.RhinoDoc.Open(filename)[0]
-
     # Gera o gradiente de cores e separa as cores em seus respectivos canais    
     gradient = MakeGradient([colors[0][1], colors[0][2]], colors[1] + 2)
 
@@ -76,7 +96,7 @@ def paint(filename, colors):
                 stop = gradient[i]
                 color = Color.FromArgb(255, stop[0], stop[1], stop[2])
                 att = Rhino.DocObjects.ObjectAttributes()
-                att.LayerIndex = 0
+                att.LayerIndex = doc.Layers.FindName('Arte').Index
                 att.ColorSource = Rhino.DocObjects.ObjectColorSource(1)
                 att.PlotColorSource = Rhino.DocObjects.ObjectPlotColorSource(1)
                 att.PlotColor = color
@@ -102,7 +122,7 @@ def paint(filename, colors):
     for hatch in t_hatch:
         color = Color.FromArgb(255, 210, 210, 210)
         att = Rhino.DocObjects.ObjectAttributes()
-        att.LayerIndex = 1
+        att.LayerIndex = doc.Layers.FindName('Texto').Index
         att.ColorSource = Rhino.DocObjects.ObjectColorSource(1)
         att.PlotColorSource = Rhino.DocObjects.ObjectPlotColorSource(1)
         att.PlotColor = color
@@ -113,22 +133,29 @@ def paint(filename, colors):
     for curve in outline:
         doc.Objects.Delete(curve)
 
-    # Salva e fecha o arquivo após finalizar todas as operações    
-    doc.Save()
-    doc.Dispose()
+def paint(filename, colors):
+    """
+    Cria todas as camadas de hatches e cores para o modelo 3DM fornecido, de 
+    acordo com a lista de cores. A lista de cores deve fornecer duas cores e 
+    uma quantidade N de cores intermediárias entre as duas cores.
+    Essa função retorna o nome do arquivo utilizado.
+    """
+    # Abre o arquivo, pinta o documento e salva o arquivo
+    with Session(filename) as session:
+        session.paint(colors)
+        session.save(filename)
 
     return filename
 
-def export_jpeg(size, filename, id):
+def TopView(doc):
     """
-    Exporta o modelo 3DM em dois possíveis arquivos JPEG para visualização, um
-    em baixa resolução (thumbnail) e outro em alta resolução (zoom).
+    Configura a viewport ativa do documento para a vista superior e
+    retorna a vista ativa.
     """
-    # Abre o arquivo do Rhino conforme nome fornecido
-    doc = Rhino.RhinoDoc.Open(filename)[0]
-
-    # Desliga as camadas que não vão ser utilizadas
-    doc.Layers[4].IsVisible = False
+    # Adiciona uma vista ao documento caso ele não possua nenhuma
+    if doc.Views.ActiveView is None:
+        doc.Views.Add('Top', Rhino.Display.DefinedViewportProjection.Top,
+                      System.Drawing.Rectangle(0, 0, 800, 800), True)
 
     # Configura a viewport ativa para a vista superior
     viewport = Rhino.Display.RhinoViewport()
@@ -138,61 +165,299 @@ def export_jpeg(size, filename, id):
     doc.Views.ActiveView.ActiveViewport.PushViewInfo(
         Rhino.DocObjects.ViewInfo(viewport), False
         )
-    
-    # Define as configurações de saída do JPEG
-    view = doc.Views.ActiveView
-    dpi = 72
-    frame = System.Drawing.Size(3200, 3200)
-    settings = Rhino.Display.ViewCaptureSettings(view, frame, dpi)
-    #settings.RasterMode = True
-    settings.ViewArea = Rhino.Display.ViewCaptureSettings.ViewAreaMapping(1)
-    
-    # Salva o arquivo bitmap de saída
-    savepath = getcwd() + "\\JPEG\\" + id + "_HQ.jpeg"
-    
-    # Cria a captura da página especificada
-    bitmap = Rhino.Display.ViewCapture.CaptureToBitmap(settings)
-    bitmap.Save(savepath, System.Drawing.Imaging.ImageFormat.Jpeg)
 
-    # Fecha o documento após finalizar o seu uso
-    doc.Dispose()
+    return doc.Views.ActiveView
+
+def ImportModel(model):
+    """
+    Cria um documento do Rhino à partir de um modelo do rhino3dm em
+    memória, transferindo as layers, os grupos e os objetos sem passar
+    por um arquivo 3DM.
+    """
+    # Converte o modelo do rhino3dm para um File3dm do RhinoCommon
+    data = System.Convert.FromBase64String(model.Encode())
+    source = Rhino.FileIO.File3dm.FromByteArray(data)
+
+    # Cria o documento com as mesmas unidades do modelo
+    doc = Rhino.RhinoDoc.Create(None)
+    doc.ModelUnitSystem = source.Settings.ModelUnitSystem
+
+    # Transfere as layers e os grupos, mapeando os seus índices
+    layers = {}
+    for layer in source.AllLayers:
+        layers[layer.Index] = doc.Layers.Add(layer)
+    groups = {}
+    for group in source.AllGroups:
+        groups[group.Index] = doc.Groups.Add(group.Name)
+
+    # Transfere os objetos na mesma ordem do modelo
+    for object in source.Objects:
+        att = object.Attributes.Duplicate()
+        att.LayerIndex = layers[att.LayerIndex]
+        indices = list(att.GetGroupList() or [])
+        att.RemoveFromAllGroups()
+        for index in indices:
+            att.AddToGroup(groups[index])
+        doc.Objects.Add(object.Geometry, att)
+
+    return doc
+
+def VisibleBox(doc):
+    """
+    Retorna o quadrado, centrado na caixa envolvente dos objetos das
+    layers visíveis, que a captura da extensão da vista enquadra.
+    """
+    box = Rhino.Geometry.BoundingBox.Empty
+    for object in doc.Objects:
+        if doc.Layers[object.Attributes.LayerIndex].IsVisible:
+            box = Rhino.Geometry.BoundingBox.Union(
+                box, object.Geometry.GetBoundingBox(True))
+
+    size = max(box.Max.X - box.Min.X, box.Max.Y - box.Min.Y) / 2
+    center = box.Center
+    return (center.X - size, center.Y - size,
+            center.X + size, center.Y + size)
+
+def BitmapPixels(bitmap):
+    """
+    Copia os pixels de um System.Drawing.Bitmap para um array RGB do
+    NumPy, sem acessar os pixels um a um.
+    """
+    rect = System.Drawing.Rectangle(0, 0, bitmap.Width, bitmap.Height)
+    data = bitmap.LockBits(rect, System.Drawing.Imaging.ImageLockMode.ReadOnly,
+                           System.Drawing.Imaging.PixelFormat.Format24bppRgb)
+    try:
+        buffer = ctypes.string_at(data.Scan0.ToInt64(),
+                                  data.Stride * bitmap.Height)
+    finally:
+        bitmap.UnlockBits(data)
+
+    # As linhas do bitmap são alinhadas em 4 bytes e as cores em BGR
+    rows = np.frombuffer(buffer, np.uint8).reshape(bitmap.Height, data.Stride)
+    return rows[:, :bitmap.Width * 3].reshape(bitmap.Height, bitmap.Width,
+                                              3)[:, :, ::-1]
 
-    return
+def CaptureTiles(doc, view, width, dpi, rows=TILE):
+    """
+    Captura a vista em uma imagem quadrada de WIDTH pixels com o mesmo
+    enquadramento da extensão da vista, em faixas horizontais de ROWS
+    linhas, de cima para baixo. Cada faixa é a captura de uma janela da
+    vista e é retornada como uma PIL.Image assim que é capturada, de modo
+    que apenas uma faixa fica na memória do Rhino de cada vez.
+    """
+    left, bottom, right, top = VisibleBox(doc)
+    scale = (right - left) / width
+    for row in range(0, width, rows):
+        height = min(rows, width - row)
+        frame = System.Drawing.Size(width, height)
+        settings = Rhino.Display.ViewCaptureSettings(view, frame, dpi)
+        settings.SetWindowRect(Point3d(left, top - row * scale, 0),
+                               Point3d(right, top - (row + height) * scale,
+                                       0))
+        settings.ViewArea = \
+            Rhino.Display.ViewCaptureSettings.ViewAreaMapping.Window
+
+        bitmap = Rhino.Display.ViewCapture.CaptureToBitmap(settings)
+        try:
+            yield Image.fromarray(np.ascontiguousarray(BitmapPixels(bitmap)))
+        finally:
+            bitmap.Dispose()
+
+class Session:
+    """
+    Documento do Rhino aberto uma única vez para a pintura e as
+    exportações de uma arte. O modelo pode ser o nome de um arquivo 3DM
+    ou um rhino3dm.File3dm em memória, como o retornado pelo
+    geometry.draw_geometry com write=False.
+    """
+    def __init__(self, model):
+        if isinstance(model, str):
+            self.doc = Rhino.RhinoDoc.Open(model)[0]
+        else:
+            self.doc = ImportModel(model)
+        self.saved = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def paint(self, colors):
+        """
+        Cria os hatches e as cores da arte no documento (veja paint).
+        """
+        PaintDocument(self.doc, colors)
+
+    def export_jpeg(self, size, id):
+        """
+        Exporta o documento em um arquivo JPEG em alta resolução para
+        visualização, sem a moldura de impressão.
+        """
+        doc = self.doc
+
+        # Desliga as camadas que não vão ser utilizadas
+        layer = doc.Layers.FindName('PrintFrame')
+        layer.IsVisible = False
+
+        # Define as configurações de saída do JPEG
+        view = TopView(doc)
+        dpi = 72
+        width = 3200
+
+        # Salva o arquivo bitmap de saída
+        savepath = getcwd() + "\\JPEG\\" + id + "_HQ.jpeg"
+
+        # Captura a vista em faixas e monta a imagem à medida que cada
+        # faixa é capturada
+        image = Image.new('RGB', (width, width))
+        top = 0
+        for tile in CaptureTiles(doc, view, width, dpi):
+            image.paste(tile, (0, top))
+            top += tile.height
+        image.save(savepath, 'JPEG', quality=95)
+
+        # Religa as camadas para as próximas etapas
+        layer.IsVisible = True
+
+        return savepath
+
+    def export_pdf(self, size, id):
+        """
+        Exporta o documento em um arquivo PDF para produção.
+        """
+        # Cria o arquivo PDF de saída
+        pdf = Rhino.FileIO.FilePdf.Create()
+
+        # Define as configurações do arquivo de saída
+        view = TopView(self.doc)
+        dpi = 300
+        px_size = ceil((size/2.54) * dpi)
+        frame = System.Drawing.Size(px_size, px_size)
+        settings = Rhino.Display.ViewCaptureSettings(view, frame, dpi)
+        settings.RasterMode = False
+        settings.ViewArea = Rhino.Display.ViewCaptureSettings.ViewAreaMapping(1)
+        pdf.AddPage(settings)
+
+        # Salva o arquivo PDF na sua devida localização
+        savepath = getcwd() + "\\PDF\\" + id + ".pdf"
+        pdf.Write(savepath)
+
+        return savepath
+
+    def save(self, filename):
+        """
+        Salva o documento em um arquivo 3DM e retorna o nome do arquivo.
+        """
+        self.doc.Write3dmFile(filename, Rhino.FileIO.FileWriteOptions())
+        self.saved = filename
+
+        return filename
+
+    def export(self, kind, size, id):
+        """
+        Exporta o documento no formato KIND, dentre os FORMATS.
+        """
+        if kind not in FORMATS:
+            raise ValueError('Formato de saída não suportado: ' + str(kind))
+
+        return getattr(self, 'export_' + kind)(size, id)
+
+    def export_all(self, size, id, outputs=FORMATS, parallel=True,
+                   filename=None):
+        """
+        Exporta o documento em todos os formatos de OUTPUTS. Com PARALLEL
+        e mais de um formato, o documento é salvo em FILENAME, ou em um
+        arquivo temporário, e cada formato é exportado ao mesmo tempo em
+        um processo de exportação com a sua própria cópia do documento.
+        Retorna os arquivos e os tempos de cada formato, em segundos.
+        """
+        for kind in outputs:
+            if kind not in FORMATS:
+                raise ValueError('Formato de saída não suportado: ' +
+                                 str(kind))
+
+        # Exporta os formatos em sequência no próprio documento
+        if not parallel or len(outputs) < 2:
+            files, timing = {}, {}
+            for kind in outputs:
+                start = time.perf_counter()
+                files[kind] = self.export(kind, size, id)
+                timing[kind] = round(time.perf_counter() - start, 3)
+            return files, timing
+
+        # Salva o documento pintado para as cópias dos processos
+        temporary = filename is None
+        if temporary:
+            handle, filename = tempfile.mkstemp(suffix='.3dm')
+            os.close(handle)
+        self.save(filename)
+
+        try:
+            return export_formats(filename, size, id, outputs)
+        finally:
+            if temporary:
+                os.remove(filename)
+                self.saved = None
+
+    def close(self):
+        """
+        Fecha o documento após finalizar o seu uso.
+        """
+        if self.doc is not None:
+            self.doc.Dispose()
+            self.doc = None
+
+def export_jpeg(size, filename, id):
+    """
+    Exporta o modelo 3DM em dois possíveis arquivos JPEG para visualização, um
+    em baixa resolução (thumbnail) e outro em alta resolução (zoom).
+    """
+    with Session(filename) as session:
+        return session.export_jpeg(size, id)
 
 def export_pdf(size, filename, id):
     """
     Exporta o modelo 3DM em um arquivo PDF para produção.
     """
-    # Abre o arquivo do Rhino conforme nome fornecido
-    doc = Rhino.RhinoDoc.Open(filename)[0]
+    with Session(filename) as session:
+        return session.export_pdf(size, id)
 
-    # Configura a viewport ativa para a vista superior
-    viewport = Rhino.Display.RhinoViewport()
-    viewport.SetToPlanView(Point3d(0, 0, 0), 
-                           Vector3d(1, 0, 0),
-                           Vector3d(0, 1, 0), True)
-    doc.Views.ActiveView.ActiveViewport.PushViewInfo(
-        Rhino.DocObjects.ViewInfo(viewport), False
-        )
+def _export(kind, size, filename, id):
+    """
+    Exporta um formato dentro de um processo de exportação, abrindo a sua
+    própria cópia do documento. Retorna o arquivo e o tempo em segundos.
+    """
+    start = time.perf_counter()
+    with Session(filename) as session:
+        savepath = session.export(kind, size, id)
 
-    # Cria o arquivo PDF de saída
-    pdf = Rhino.FileIO.FilePdf.Create()
+    return savepath, round(time.perf_counter() - start, 3)
 
-    # Define as configurações do arquivo de saída
-    view = doc.Views.ActiveView
-    dpi = 300
-    px_size = ceil((size/2.54) * dpi)
-    frame = System.Drawing.Size(px_size, px_size)
-    settings = Rhino.Display.ViewCaptureSettings(view, frame, dpi)
-    settings.RasterMode = False
-    settings.ViewArea = Rhino.Display.ViewCaptureSettings.ViewAreaMapping(1)
-    pdf.AddPage(settings)
+_pool = None
 
-    # Salva o arquivo PDF na sua devida localização
-    savepath = getcwd() + "\\PDF\\" + id + ".pdf"
-    pdf.Write(savepath)
+def export_pool():
+    """
+    Retorna o conjunto de processos de exportação, com um processo por
+    formato, criando-o na primeira chamada. Os processos carregam o Rhino
+    uma única vez e são reaproveitados entre os pedidos.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(len(FORMATS))
+    return _pool
 
-    # Fecha o documento após finalizar o seu uso
-    doc.Dispose()
+def export_formats(filename, size, id, outputs=FORMATS):
+    """
+    Exporta o modelo 3DM pintado em todos os formatos de OUTPUTS ao mesmo
+    tempo, um por processo de exportação. Retorna os arquivos e os tempos
+    de cada formato, em segundos.
+    """
+    pool = export_pool()
+    futures = {kind: pool.submit(_export, kind, size, filename, id)
+               for kind in outputs}
+    files, timing = {}, {}
+    for kind, future in futures.items():
+        files[kind], timing[kind] = future.result()
 
-    return savepath
\ No newline at end of file
+    return files, timing
@@ -0,0 +1,223 @@
+# atlas.py
+#
+# Atlas de contornos base da flor por data. O contorno base depende apenas
+# dos oito dígitos da data, e a localização só o rotaciona depois. O atlas
+# é construído offline para um intervalo de datas e guardado em arquivos
+# NumPy que são abertos como memmap: os segmentos de todos os contornos em
+# sequência e um índice denso, com uma linha por dia do intervalo, com a
+# posição e a quantidade de segmentos de cada data. A busca de uma data é
+# O(1) e lê do disco apenas os segmentos do seu contorno. O atlas guarda a
+# tolerância com que foi construído e só é utilizado nessa tolerância.
+#
+# Uso: python -m atlas construir [-i DD/MM/AAAA] [-f DD/MM/AAAA] [-w N]
+#                               [-t TOLERÂNCIA]
+#
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import getcwd, makedirs, path
+import numpy as np
+
+DIRECTORY = path.join(getcwd(), 'CACHE', 'atlas')
+
+# Módulos cujo código altera o contorno base da flor
+SOURCES = ['geometry.py', 'outline.py']
+
+def version():
+    """
+    Calcula a versão do atlas à partir do conteúdo dos módulos que
+    participam do cálculo do contorno base.
+    """
+    digest = hashlib.sha256()
+    base = path.dirname(path.abspath(__file__))
+    for name in SOURCES:
+        with open(path.join(base, name), 'rb') as file:
+            digest.update(name.encode('utf-8') + file.read())
+
+    return digest.hexdigest()[:12]
+
+def to_digits(day):
+    """
+    Converte uma data nos oito dígitos utilizados pela arte (DDMMAAAA).
+    """
+    return [int(x) for x in day.strftime('%d%m%Y')]
+
+def from_digits(date):
+    """
+    Converte os oito dígitos de uma data (DDMMAAAA) em um datetime.date.
+    Levanta um ValueError caso a data não exista.
+    """
+    text = ''.join(str(x) for x in date)
+    return datetime.date(int(text[4:]), int(text[2:4]), int(text[:2]))
+
+def _outlines(tolerance, days):
+    """
+    Calcula os contornos base de uma sequência de datas com a tolerância
+    fornecida. Datas para as quais o contorno não pode ser calculado
+    retornam None.
+    """
+    from geometry import base_outline
+
+    outlines = []
+    for day in days:
+        try:
+            outlines.append(np.asarray(base_outline(to_digits(day),
+                                                    tolerance),
+                                       dtype=np.float64))
+        except (ValueError, ZeroDivisionError, IndexError):
+            outlines.append(None)
+
+    return outlines
+
+def build(start, end, directory=DIRECTORY, workers=None, chunk=512,
+          tolerance=None):
+    """
+    Constrói o atlas com os contornos base de todas as datas entre START
+    e END, inclusive, distribuindo o cálculo entre WORKERS processos.
+    TOLERANCE é a tolerância dos contornos, por padrão a de produção
+    (geometry.TOLERANCE). Retorna o resumo da construção.
+    """
+    if tolerance is None:
+        from geometry import TOLERANCE
+        tolerance = TOLERANCE
+
+    begin = time.perf_counter()
+    count = (end - start).days + 1
+    if count <= 0:
+        raise ValueError('A data final deve ser posterior à data inicial.')
+    days = [start + datetime.timedelta(x) for x in range(count)]
+    chunks = [days[x:x + chunk] for x in range(0, count, chunk)]
+
+    # Calcula os contornos de todas as datas do intervalo
+    outlines = []
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        for result in pool.map(partial(_outlines, tolerance), chunks):
+            outlines.extend(result)
+
+    # Organiza o índice denso com a posição e a quantidade de segmentos
+    # de cada data do intervalo
+    index = np.zeros((count, 2), dtype=np.int64)
+    offset = 0
+    for x, outline in enumerate(outlines):
+        size = 0 if outline is None else len(outline)
+        index[x] = offset, size
+        offset += size
+    segments = np.concatenate([o for o in outlines if o is not None])
+
+    # Salva os arquivos do atlas, com os metadados por último para que um
+    # atlas incompleto nunca seja utilizado
+    makedirs(directory, exist_ok=True)
+    meta = path.join(directory, 'atlas.json')
+    if path.exists(meta):
+        os.remove(meta)
+    np.save(path.join(directory, 'segments.npy'), segments)
+    np.save(path.join(directory, 'index.npy'), index)
+    summary = {
+        'início': start.isoformat(),
+        'fim': end.isoformat(),
+        'datas': count,
+        'falhas': sum(o is None for o in outlines),
+        'segmentos': int(offset),
+        'megabytes': round((segments.nbytes + index.nbytes) / 2**20, 2),
+        'tolerância': tolerance,
+        'versão': version()
+    }
+    with open(meta, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=4)
+    summary['segundos'] = round(time.perf_counter() - begin, 3)
+
+    return summary
+
+class Atlas:
+    """
+    Atlas de contornos aberto para leitura, com os arquivos em memmap.
+    """
+    def __init__(self, directory=DIRECTORY):
+        with open(path.join(directory, 'atlas.json'), encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self.start = datetime.date.fromisoformat(self.meta['início'])
+        self.segments = np.load(path.join(directory, 'segments.npy'),
+                                mmap_mode='r')
+        self.index = np.load(path.join(directory, 'index.npy'),
+                             mmap_mode='r')
+
+    def lookup(self, date):
+        """
+        Retorna os segmentos do contorno base da data, fornecida pelos
+        seus oito dígitos, ou None caso a data não esteja no atlas.
+        """
+        try:
+            day = (from_digits(date) - self.start).days
+        except ValueError:
+            return None
+        if day < 0 or day >= len(self.index):
+            return None
+        offset, size = self.index[day]
+        if size == 0:
+            return None
+
+        return np.array(self.segments[offset:offset + size])
+
+_atlas = None
+
+def get_atlas():
+    """
+    Retorna o atlas do processo, abrindo-o na primeira chamada. Retorna
+    None caso o atlas não exista ou tenha sido construído por outra versão
+    do código.
+    """
+    global _atlas
+    if _atlas is None:
+        _atlas = False
+        if path.exists(path.join(DIRECTORY, 'atlas.json')):
+            atlas = Atlas(DIRECTORY)
+            if atlas.meta['versão'] == version():
+                _atlas = atlas
+
+    return _atlas or None
+
+def lookup_outline(date, tolerance):
+    """
+    Busca o contorno base de uma data no atlas. Retorna None caso o atlas
+    não exista, tenha sido construído com outra tolerância ou não contenha
+    a data.
+    """
+    atlas = get_atlas()
+    if atlas is None or atlas.meta.get('tolerância') != tolerance:
+        return None
+
+    return atlas.lookup(date)
+
+def _day(text):
+    return datetime.datetime.strptime(text, '%d/%m/%Y').date()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m atlas',
+        description='Constrói o atlas de contornos base por data.')
+    parser.add_argument('comando', choices=('construir',))
+    parser.add_argument('-i', '--inicio', type=_day, default='01/01/1900',
+                        help='primeira data do atlas (padrão: 01/01/1900)')
+    parser.add_argument('-f', '--fim', type=_day, default='31/12/2040',
+                        help='última data do atlas (padrão: 31/12/2040)')
+    parser.add_argument('-w', '--processos', type=int, default=None,
+                        help='quantidade de processos (padrão: núcleos)')
+    parser.add_argument('-t', '--tolerancia', type=float, default=None,
+                        help='tolerância dos contornos, em centímetros '
+                             '(padrão: a de produção)')
+    args = parser.parse_args(argv)
+
+    summary = build(args.inicio, args.fim, workers=args.processos,
+                    tolerance=args.tolerancia)
+    print(json.dumps(summary, ensure_ascii=False, indent=4))
+
+    return summary
+
+if __name__ == '__main__':
+    main()
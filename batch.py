@@ -0,0 +1,163 @@
+# batch.py
+#
+# Renderiza uma fila de pedidos sem interface gráfica, distribuindo o
+# dress_flower.make_flower entre um conjunto de processos. Cada processo
+# carrega a geometria, o Rhino (quando a predefinição de qualidade pinta
+# pelo Rhino) e conecta ao Rhino.Compute uma única vez, e o resultado
+# de cada pedido é registrado em um manifesto NDJSON assim que termina.
+# Como os pedidos já são distribuídos entre processos, os formatos de
+# saída de cada pedido são exportados em sequência dentro do processo.
+#
+# Uso: python -m batch [-w PROCESSOS] [-m MANIFESTO] [-f pdf,jpeg]
+#                      [-q rascunho|previa|producao]
+#                      (PASTA | ARQUIVO.json | PEDIDOS.ndjson | ID ...)
+#
+
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import getcwd, path
+
+def init_worker(quality='producao'):
+    """
+    Inicializa o processo de renderização antes do primeiro pedido,
+    carregando os módulos de geometria, o cliente do Rhino.Compute e, caso
+    a predefinição de qualidade QUALITY pinte pelo Rhino, o Rhino. Como os
+    módulos pesados são carregados apenas na primeira etapa que os
+    utiliza (veja dress_flower), sem esta carga o primeiro pedido de cada
+    processo pagaria o carregamento do Rhino.
+    """
+    global make_flower, round_trips
+    import compute
+    import geometry
+    from dress_flower import make_flower
+    from compute import round_trips
+    from quality import get_preset
+    compute.connect()
+    if get_preset(quality).renderer == 'rhino':
+        import artist
+
+def render_order(id, source, outputs=None, quality='producao'):
+    """
+    Renderiza um pedido dentro do processo, com a predefinição de
+    qualidade QUALITY, e retorna o registro do seu resultado para o
+    manifesto.
+    """
+    record = {'id': id, 'pid': os.getpid(),
+              'arquivo': source if isinstance(source, str) else None}
+    start = time.perf_counter()
+    try:
+        record['saídas'] = make_flower(id, source, outputs=outputs,
+                                       parallel=False, quality=quality)
+        record['status'] = 'ok'
+    except Exception as error:
+        record['status'] = 'erro'
+        record['erro'] = '{}: {}'.format(type(error).__name__, error)
+        record['detalhes'] = traceback.format_exc()
+    record['segundos'] = round(time.perf_counter() - start, 3)
+    record['requisições'] = round_trips()[0]
+
+    return record
+
+def collect_orders(targets):
+    """
+    Converte os alvos fornecidos (pastas com arquivos JSON, arquivos JSON,
+    fluxos NDJSON normalizados pelo intake ou IDs de pedidos em JSON/) em
+    uma lista de pares (id, arquivo ou valores de entrada).
+    """
+    orders = []
+    for target in targets:
+        if target.endswith('.ndjson'):
+            with open(target, encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        order = json.loads(line)
+                        orders.append((order.pop('id'), order))
+        elif path.isdir(target):
+            for name in sorted(os.listdir(target)):
+                if name.endswith('.json'):
+                    orders.append((name[:-5], path.join(target, name)))
+        elif target.endswith('.json'):
+            orders.append((path.basename(target)[:-5], target))
+        else:
+            orders.append((target, path.join(getcwd(), 'JSON',
+                                             target + '.json')))
+
+    return orders
+
+def run(orders, workers=None, manifest='manifest.ndjson', outputs=None,
+        quality='producao'):
+    """
+    Renderiza os pedidos em um conjunto de WORKERS processos, exportando
+    os formatos de OUTPUTS (por padrão, os da predefinição de qualidade
+    QUALITY), e registra cada resultado no MANIFEST.
+    Retorna o resumo da execução.
+    """
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    done = failed = 0
+
+    with open(manifest, 'w', encoding='utf-8') as output, \
+         ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(quality,)) as pool:
+        futures = [pool.submit(render_order, id, source, outputs, quality)
+                   for id, source in orders]
+        for future in as_completed(futures):
+            record = future.result()
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+            done += 1
+            failed += record['status'] != 'ok'
+            print('[{}/{}] {} {} ({:.1f} s)'.format(
+                done, len(orders), record['id'], record['status'],
+                record['segundos']))
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'pedidos': len(orders),
+        'falhas': failed,
+        'processos': workers,
+        'segundos': round(elapsed, 3),
+        'pedidos por minuto': round(60 * len(orders) / elapsed, 2)
+                              if elapsed else 0.0
+    }
+
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m batch',
+        description='Renderiza uma fila de pedidos em paralelo.')
+    parser.add_argument('alvos', nargs='+',
+                        help='pastas com arquivos JSON, arquivos JSON, '
+                             'fluxos NDJSON ou IDs')
+    parser.add_argument('-w', '--processos', type=int, default=None,
+                        help='quantidade de processos (padrão: núcleos)')
+    parser.add_argument('-m', '--manifesto', default='manifest.ndjson',
+                        help='arquivo do manifesto de resultados')
+    parser.add_argument('-f', '--formatos', default=None,
+                        help='formatos de saída separados por vírgula '
+                             '(padrão: os da qualidade)')
+    parser.add_argument('-q', '--qualidade', default='producao',
+                        choices=('rascunho', 'previa', 'producao'),
+                        help='predefinição de qualidade (padrão: producao)')
+    args = parser.parse_args(argv)
+
+    orders = collect_orders(args.alvos)
+    if not orders:
+        raise SystemExit('Nenhum pedido encontrado.')
+    outputs = None
+    if args.formatos:
+        outputs = tuple(f.strip() for f in args.formatos.split(',')
+                        if f.strip())
+    summary = run(orders, args.processos, args.manifesto, outputs,
+                  args.qualidade)
+    print(json.dumps(summary, ensure_ascii=False, indent=4))
+
+    return summary
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+# compute.py
+#
+# Centraliza o acesso ao servidor do Rhino.Compute. Todas as funções do
+# compute_rhino3d passam pelo Util.ComputeFetch, que é substituído aqui
+# pelo cliente ComputeClient: ele distribui as requisições entre vários
+# servidores (EndpointPool), reutiliza as conexões HTTP, permite enviar
+# chamadas independentes em paralelo ou agrupadas em uma única
+# requisição, e contabiliza as requisições feitas aos servidores.
+#
+# Os servidores podem ser configurados pela variável de ambiente
+# DRESSPOP_COMPUTE_URLS, com os endereços separados por vírgula. As
+# respostas são memorizadas pelo compute_cache, de forma que requisições
+# repetidas não voltam ao servidor.
+#
+
+import json
+import os
+import threading
+import requests
+import compute_rhino3d.Util
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from compute_cache import default_cache
+
+URL = "http://localhost:8081/"
+URLS = [url.strip() for url in
+        os.environ.get('DRESSPOP_COMPUTE_URLS', URL).split(',') if url.strip()]
+
+_client = None
+_cache = None
+_lock = threading.Lock()
+_round_trips = {}
+
+def _encode(obj):
+    """
+    Codifica objetos do rhino3dm para o envio em JSON ao servidor.
+    """
+    if hasattr(obj, "Encode"):
+        return obj.Encode()
+    raise TypeError('Objeto não serializável: ' + type(obj).__name__)
+
+class Endpoint:
+    """
+    Servidor do Rhino.Compute pertencente a um EndpointPool, com a
+    contagem de requisições em andamento e o seu estado de saúde.
+    """
+    def __init__(self, url):
+        self.url = url if url.endswith('/') else url + '/'
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+        self.served = 0
+
+class EndpointPool:
+    """
+    Conjunto de servidores do Rhino.Compute. Cada requisição é direcionada
+    ao servidor menos ocupado ('least_loaded') ou ao próximo da fila
+    ('round_robin'), respeitando o limite de requisições simultâneas por
+    servidor. Servidores que falham são afastados até que a verificação
+    periódica em segundo plano os encontre saudáveis novamente.
+    """
+    def __init__(self, urls, max_in_flight=4, strategy='least_loaded',
+                 health_interval=5.0):
+        if strategy not in ('least_loaded', 'round_robin'):
+            raise ValueError('Estratégia de distribuição desconhecida.')
+        self.endpoints = [Endpoint(url) for url in urls]
+        if not self.endpoints:
+            raise ValueError('Nenhum servidor do Rhino.Compute configurado.')
+        self.max_in_flight = max_in_flight
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self._next = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._monitor = None
+
+    def acquire(self, exclude=()):
+        """
+        Reserva um servidor para uma requisição, aguardando caso todos
+        estejam no limite de requisições simultâneas. Servidores em EXCLUDE
+        (já tentados) só são utilizados se não houver alternativa.
+        """
+        with self._condition:
+            while True:
+                free = [ep for ep in self.endpoints
+                        if ep.in_flight < self.max_in_flight]
+                # Prioriza servidores saudáveis e ainda não tentados
+                for group in ([ep for ep in free if ep.healthy and
+                               ep not in exclude],
+                              [ep for ep in free if ep not in exclude],
+                              free):
+                    if group:
+                        endpoint = self._choose(group)
+                        endpoint.in_flight += 1
+                        return endpoint
+                self._condition.wait()
+
+    def _choose(self, group):
+        """
+        Escolhe um servidor do grupo de acordo com a estratégia definida.
+        """
+        if self.strategy == 'least_loaded':
+            return min(group, key=lambda ep: (ep.in_flight, ep.served))
+        for _ in range(len(self.endpoints)):
+            endpoint = self.endpoints[self._next % len(self.endpoints)]
+            self._next += 1
+            if endpoint in group:
+                return endpoint
+        return group[0]
+
+    def release(self, endpoint, ok=True):
+        """
+        Libera o servidor reservado, registrando o resultado da requisição.
+        """
+        with self._condition:
+            endpoint.in_flight -= 1
+            endpoint.served += 1
+            if ok:
+                endpoint.failures = 0
+            else:
+                endpoint.failures += 1
+                endpoint.healthy = False
+            self._condition.notify_all()
+
+    def check_health(self, session, timeout=2.0):
+        """
+        Consulta o endpoint 'healthcheck' de todos os servidores e atualiza
+        o estado de saúde de cada um.
+        """
+        for endpoint in self.endpoints:
+            try:
+                response = session.get(endpoint.url + 'healthcheck',
+                                       timeout=timeout)
+                healthy = response.status_code == 200
+            except requests.RequestException:
+                healthy = False
+            with self._condition:
+                endpoint.healthy = healthy
+                self._condition.notify_all()
+
+    def start_monitor(self, session):
+        """
+        Inicia a verificação periódica de saúde dos servidores em uma
+        thread em segundo plano.
+        """
+        if self._monitor is not None or self.health_interval is None:
+            return
+
+        def monitor():
+            while not self._stop.wait(self.health_interval):
+                self.check_health(session)
+
+        self._monitor = threading.Thread(target=monitor, daemon=True)
+        self._monitor.start()
+
+    def stop_monitor(self):
+        self._stop.set()
+
+    def status(self):
+        """
+        Retorna o estado de cada servidor do conjunto.
+        """
+        with self._condition:
+            return [{'url': ep.url, 'saudável': ep.healthy,
+                     'em andamento': ep.in_flight, 'atendidas': ep.served,
+                     'falhas': ep.failures} for ep in self.endpoints]
+
+class ComputeClient:
+    """
+    Cliente do Rhino.Compute com um conjunto persistente de conexões HTTP
+    distribuídas entre os servidores de um EndpointPool. Requisições que
+    falham são repetidas em outro servidor. Chamadas independentes podem
+    ser enviadas em paralelo (pipeline) ou agrupadas em uma única
+    requisição (batch), quando o endpoint do servidor aceita o parâmetro
+    'multiple'.
+    """
+    def __init__(self, urls=URLS, max_in_flight=4, strategy='least_loaded',
+                 retries=2, timeout=None, health_interval=5.0):
+        if isinstance(urls, str):
+            urls = [urls]
+        self.pool = EndpointPool(urls, max_in_flight, strategy,
+                                 health_interval)
+        self.urls = tuple(ep.url for ep in self.pool.endpoints)
+        self.retries = retries
+        self.timeout = timeout
+        workers = max_in_flight * len(self.urls)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls),
+                              pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(workers)
+        self.pool.start_monitor(self.session)
+
+    def fetch(self, endpoint, arglist):
+        """
+        Envia uma requisição a um dos servidores, da mesma forma que o
+        Util.ComputeFetch, porém reaproveitando as conexões abertas e
+        repetindo a requisição em outro servidor em caso de falha.
+        """
+        util = compute_rhino3d.Util
+        if util.stopat > 0:
+            endpoint += '&stopat=' if '?' in endpoint else '?stopat='
+            endpoint += str(util.stopat)
+        headers = {'User-Agent': 'compute.rhino3d.py/' + util.__version__}
+        if util.authToken:
+            headers['Authorization'] = 'Bearer ' + util.authToken
+        if util.apiKey:
+            headers['RhinoComputeKey'] = util.apiKey
+        data = json.dumps(arglist, default=_encode)
+
+        # Tenta a requisição em servidores diferentes até o limite
+        tried = []
+        for attempt in range(self.retries + 1):
+            server = self.pool.acquire(exclude=tried)
+            tried.append(server)
+            try:
+                response = self.session.post(server.url + endpoint, 
+                                             data=data, headers=headers,
+                                             timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise requests.HTTPError(response=response)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.HTTPError) as error:
+                self.pool.release(server, ok=False)
+                if attempt == self.retries:
+                    raise error
+                continue
+            self.pool.release(server)
+            response.raise_for_status()
+
+            return response.json()
+
+    def submit(self, func, *args):
+        """
+        Agenda uma chamada do compute_rhino3d em segundo plano e retorna
+        um Future com o seu resultado.
+        """
+        return self.executor.submit(func, *args)
+
+    def pipeline(self, func, argsets):
+        """
+        Envia chamadas independentes da mesma função em paralelo, sobre as
+        conexões persistentes, e retorna os resultados na ordem fornecida.
+        """
+        futures = [self.submit(func, *args) for args in argsets]
+
+        return [future.result() for future in futures]
+
+    def batch(self, func, *columns):
+        """
+        Agrupa várias chamadas da mesma função em uma única requisição,
+        utilizando o parâmetro 'multiple' do compute_rhino3d. Cada coluna
+        fornece um argumento para todas as chamadas.
+        """
+        columns = [list(column) for column in columns]
+        if not columns[0]:
+            return []
+
+        return func(*columns, multiple=True)
+
+    def close(self):
+        """
+        Encerra as conexões e as threads do cliente.
+        """
+        self.pool.stop_monitor()
+        self.executor.shutdown()
+        self.session.close()
+
+def _counted_fetch(endpoint, arglist):
+    """
+    Envia a requisição pelo cliente ativo e contabiliza a viagem de ida e
+    volta para o endpoint utilizado.
+    """
+    name = endpoint.split('?')[0]
+    with _lock:
+        _round_trips[name] = _round_trips.get(name, 0) + 1
+
+    return _client.fetch(endpoint, arglist)
+
+def connect(urls=None, max_in_flight=4, strategy='least_loaded', cache=True):
+    """
+    Configura o cliente dos servidores do Rhino.Compute e passa a
+    direcionar todas as requisições do compute_rhino3d para ele. O cliente
+    é reaproveitado enquanto a configuração não mudar. CACHE pode ser um
+    ComputeCache, True para o cache padrão ou False para desativá-lo.
+    """
+    global _client, _cache
+    urls = [urls] if isinstance(urls, str) else list(urls or URLS)
+    config = (tuple(u if u.endswith('/') else u + '/' for u in urls),
+              max_in_flight, strategy)
+    if _client is None or _client.config != config:
+        if _client is not None:
+            _client.close()
+        _client = ComputeClient(urls, max_in_flight, strategy)
+        _client.config = config
+    compute_rhino3d.Util.url = _client.urls[0]
+
+    # Coloca o cache de respostas à frente das requisições contabilizadas
+    if cache is True:
+        _cache = _cache or default_cache()
+    else:
+        _cache = cache or None
+    if _cache is not None:
+        compute_rhino3d.Util.ComputeFetch = _cache.wrap(_counted_fetch)
+    else:
+        compute_rhino3d.Util.ComputeFetch = _counted_fetch
+
+    return _client
+
+def cache_stats():
+    """
+    Retorna as estatísticas de acertos e falhas do cache de respostas.
+    """
+    if _cache is None:
+        return None
+    stats = dict(_cache.stats)
+    stats['taxa de acerto'] = _cache.hit_rate()
+
+    return stats
+
+def reset_round_trips():
+    """
+    Zera a contagem de requisições, normalmente no início de cada pedido.
+    """
+    with _lock:
+        _round_trips.clear()
+
+def round_trips():
+    """
+    Retorna a quantidade total de requisições feitas ao servidor desde a
+    última contagem zerada e a quantidade por endpoint.
+    """
+    with _lock:
+        return sum(_round_trips.values()), dict(_round_trips)
@@ -0,0 +1,170 @@
+# compute_bench.py
+#
+# Servidor local que simula o Rhino.Compute com latência configurável,
+# utilizado para medir o ganho do ComputeClient (conexões persistentes,
+# pipeline, requisições agrupadas e distribuição entre vários servidores)
+# sem depender de um servidor real.
+#
+# Uso: python -m compute_bench [latência em ms] [quantidade de chamadas]
+#                              [quantidade de servidores]
+#
+
+import contextlib
+import json
+import sys
+import threading
+import time
+import rhino3dm as r3dm
+import compute_rhino3d.Util
+from compute_rhino3d import Curve
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from compute import ComputeClient
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Responde cada requisição após a latência configurada, devolvendo o
+    primeiro argumento de cada chamada como resultado, ou um erro 500
+    enquanto o servidor tiver erros programados.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        size = int(self.headers.get('Content-Length', 0))
+        args = json.loads(self.rfile.read(size))
+        time.sleep(self.server.latency)
+
+        # Responde com um erro os pedidos programados para falhar
+        with self.server.lock:
+            failed = self.server.errors > 0
+            if failed:
+                self.server.errors -= 1
+                self.server.failed += 1
+        if failed:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        # Devolve um resultado por chamada quando 'multiple' é utilizado
+        if 'multiple=true' in self.path:
+            result = [call[0] for call in args]
+        else:
+            result = args[0]
+        body = json.dumps(result).encode('utf-8')
+
+        with self.server.lock:
+            self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        status = 200 if self.server.healthy else 503
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        return
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Servidor substituto do Rhino.Compute, executado em uma thread própria.
+    Registra a quantidade de requisições atendidas, de requisições que
+    falharam e de conexões recebidas. As próximas ERRORS requisições são
+    respondidas com o erro 500, e o 'healthcheck' responde 503 quando
+    HEALTHY é falso.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, port=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.healthy = True
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+        self.connections = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.failed = 0
+            self.connections = 0
+
+def benchmark(latency=0.05, calls=122, servers=1):
+    """
+    Mede o tempo de CALLS projeções de curva enviadas sequencialmente pelo
+    compute_rhino3d original, em pipeline e agrupadas pelo ComputeClient,
+    distribuído entre SERVERS servidores substitutos.
+    Retorna um dicionário com o tempo, as requisições e as conexões de
+    cada modo.
+    """
+    curve = r3dm.Circle(r3dm.Point3d(0, 0, 0), 10).ToNurbsCurve()
+    plane = r3dm.Plane(r3dm.Point3d(0, 0, 10), r3dm.Vector3d(0, 0, 1))
+    results = {}
+
+    with contextlib.ExitStack() as stack:
+        pool = [stack.enter_context(StandInServer(latency))
+                for _ in range(servers)]
+        original = compute_rhino3d.Util.ComputeFetch
+        compute_rhino3d.Util.url = pool[0].url
+        client = ComputeClient([server.url for server in pool])
+        modes = {
+            'sequencial': lambda: [Curve.ProjectToPlane(curve, plane)
+                                   for _ in range(calls)],
+            'pipeline': lambda: client.pipeline(Curve.ProjectToPlane,
+                                                [(curve, plane)] * calls),
+            'batch': lambda: client.batch(Curve.ProjectToPlane,
+                                          [curve] * calls, [plane] * calls),
+        }
+        try:
+            for name, run in modes.items():
+                if name != 'sequencial':
+                    compute_rhino3d.Util.ComputeFetch = client.fetch
+                for server in pool:
+                    server.reset()
+                start = time.perf_counter()
+                output = run()
+                elapsed = time.perf_counter() - start
+                if len(output) != calls:
+                    raise RuntimeError('Resposta incompleta no modo ' + name)
+                results[name] = {
+                    'tempo': elapsed,
+                    'requisições': sum(s.requests for s in pool),
+                    'conexões': sum(s.connections for s in pool)
+                }
+        finally:
+            compute_rhino3d.Util.ComputeFetch = original
+            client.close()
+
+    return results
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 122
+    servers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    for name, stats in benchmark(latency, calls, servers).items():
+        print('{:<12}{:>9.3f} s{:>6} requisições{:>6} conexões'.format(
+            name, stats['tempo'], stats['requisições'], stats['conexões']))
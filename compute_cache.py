@@ -0,0 +1,236 @@
+# compute_cache.py
+#
+# Memoriza as respostas do Rhino.Compute. A chave de cada requisição é o
+# hash SHA-256 do endpoint e dos argumentos serializados de forma canônica
+# (geometrias codificadas pelo rhino3dm, tolerâncias e demais valores).
+# As respostas ficam em uma camada em memória (LRU) e em uma camada
+# persistente em disco, com tamanho máximo e descarte das entradas menos
+# utilizadas. A gravação em disco é feita fora da trava da camada em
+# memória, e o descarte, que percorre todo o diretório, em uma thread em
+# segundo plano, de modo que as buscas de outras threads não esperam pelo
+# disco.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from os import getcwd, path
+
+def _encode(obj):
+    """
+    Codifica objetos do rhino3dm para a serialização canônica.
+    """
+    if hasattr(obj, "Encode"):
+        return obj.Encode()
+    raise TypeError('Objeto não serializável: ' + type(obj).__name__)
+
+def request_key(endpoint, arglist):
+    """
+    Cria a chave determinística de uma requisição ao Rhino.Compute.
+    """
+    data = json.dumps([endpoint, arglist], default=_encode, sort_keys=True,
+                      separators=(',', ':'), ensure_ascii=True)
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+class ComputeCache:
+    """
+    Cache em duas camadas para as respostas do Rhino.Compute: uma LRU em
+    memória com até MEMORY_ITEMS respostas e um diretório em disco com até
+    DISK_BYTES bytes, cujas entradas menos acessadas são descartadas
+    primeiro.
+    """
+    def __init__(self, directory=None, memory_items=512,
+                 disk_bytes=512 * 1024 ** 2):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_size = None
+        self._evictor = None
+        self.stats = {'memória': 0, 'disco': 0, 'falhas': 0,
+                      'tempo economizado': 0.0}
+        self._cost = {}
+
+    def _file(self, key):
+        return path.join(self.directory, key[:2], key + '.json')
+
+    def _remember(self, key, body):
+        """
+        Guarda a resposta na camada em memória, descartando a menos
+        utilizada quando o limite é atingido.
+        """
+        self._memory[key] = body
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _scan(self):
+        """
+        Lista as entradas em disco com o seu tamanho e último acesso.
+        """
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    try:
+                        stat = os.stat(path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size,
+                                    path.join(root, name)))
+
+        return entries
+
+    def _store(self, key, body):
+        """
+        Grava a resposta em disco, sem a trava da camada em memória. O
+        arquivo temporário é criado com um nome único, já que a mesma
+        resposta pode ser gravada ao mesmo tempo por duas threads ou por
+        dois processos que compartilham o diretório. Caso o tamanho
+        máximo seja ultrapassado, ou ainda não seja conhecido, o descarte
+        é iniciado em segundo plano.
+        """
+        filename = self._file(key)
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        handle, temp = tempfile.mkstemp(suffix='.tmp',
+                                        dir=path.dirname(filename))
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(body)
+            os.replace(temp, filename)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+        with self._disk_lock:
+            if self._disk_size is not None:
+                self._disk_size += len(body)
+                if self._disk_size <= self.disk_bytes:
+                    return
+            if self._evictor is not None and self._evictor.is_alive():
+                return
+            self._evictor = threading.Thread(target=self._evict,
+                                             daemon=True)
+            self._evictor.start()
+
+    def _evict(self):
+        """
+        Calcula o tamanho do diretório e, caso ele ultrapasse o limite,
+        descarta as entradas acessadas há mais tempo até 90% do limite.
+        As respostas gravadas durante o descarte são somadas na próxima
+        verificação.
+        """
+        entries = sorted(self._scan())
+        size = sum(entry[1] for entry in entries)
+        if size > self.disk_bytes:
+            for _, length, name in entries:
+                if size <= 0.9 * self.disk_bytes:
+                    break
+                try:
+                    os.remove(name)
+                    size -= length
+                except OSError:
+                    pass
+
+        with self._disk_lock:
+            self._disk_size = size
+
+    def get(self, key):
+        """
+        Busca uma resposta pela chave, primeiro em memória e depois em
+        disco. Retorna os bytes da resposta, ou None caso não exista.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memória'] += 1
+                self.stats['tempo economizado'] += self._cost.get(key, 0)
+                return self._memory[key]
+
+        if self.directory is not None:
+            filename = self._file(key)
+            try:
+                with open(filename, 'rb') as file:
+                    body = file.read()
+                os.utime(filename)
+            except OSError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.stats['disco'] += 1
+                    self._remember(key, body)
+                return body
+
+        with self._lock:
+            self.stats['falhas'] += 1
+
+        return None
+
+    def put(self, key, body, cost=0.0):
+        """
+        Guarda uma resposta nas duas camadas do cache.
+        """
+        with self._lock:
+            self._remember(key, body)
+            self._cost[key] = cost
+            if len(self._cost) > self.memory_items:
+                self._cost.pop(next(iter(self._cost)))
+        if self.directory is not None:
+            self._store(key, body)
+
+    def wrap(self, fetch):
+        """
+        Cria uma versão memorizada da função de requisição FETCH, com a
+        mesma assinatura do Util.ComputeFetch.
+        """
+        def cached_fetch(endpoint, arglist):
+            key = request_key(endpoint, arglist)
+            body = self.get(key)
+            if body is None:
+                start = time.perf_counter()
+                response = fetch(endpoint, arglist)
+                body = json.dumps(response).encode('utf-8')
+                self.put(key, body, time.perf_counter() - start)
+
+            # Cada chamada recebe uma cópia independente da resposta
+            return json.loads(body)
+
+        return cached_fetch
+
+    def hit_rate(self):
+        """
+        Retorna a proporção de requisições atendidas pelo cache.
+        """
+        hits = self.stats['memória'] + self.stats['disco']
+        total = hits + self.stats['falhas']
+
+        return hits / total if total else 0.0
+
+    def clear(self):
+        """
+        Descarta todas as respostas em memória e em disco.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._cost.clear()
+            if self.directory is not None:
+                for _, _, name in self._scan():
+                    try:
+                        os.remove(name)
+                    except OSError:
+                        pass
+                with self._disk_lock:
+                    self._disk_size = 0
+
+def default_cache():
+    """
+    Cria o cache padrão, gravado na pasta CACHE/compute do projeto.
+    """
+    return ComputeCache(path.join(getcwd(), 'CACHE', 'compute'))
@@ -0,0 +1,301 @@
+# curve_ops.py
+#
+# Operações simples sobre curvas que antes eram enviadas ao Rhino.Compute
+# (projeção em plano, caixa delimitadora e ponto mais próximo), calculadas
+# localmente a partir das funções de avaliação do rhino3dm.
+#
+# O rhino3dm não tem o Curve.ClosestPoint, e o GetTightBoundingBox das
+# curvas NURBS não é justo (inclui parte do polígono de controle). Os
+# dois cálculos decompõem a curva nos seus trechos de Bézier e avaliam
+# cada trecho com o NumPy, sem uma chamada ao rhino3dm por ponto. A
+# amostragem pelo PointAt é mantida para as curvas que não são NURBS.
+#
+
+from math import comb
+import numpy as np
+import rhino3dm as r3dm
+
+GOLDEN = (5 ** 0.5 - 1) / 2
+
+# Amostras por trecho de Bézier, que localizam os extremos, e por
+# iteração do refinamento
+SPAN_SAMPLES = 16
+
+def _coords(curve, t):
+    """
+    Retorna as coordenadas de um ponto da curva como um array NumPy.
+    """
+    p = curve.PointAt(t)
+    return np.array([p.X, p.Y, p.Z])
+
+def _samples(curve, count):
+    """
+    Avalia a curva em COUNT + 1 parâmetros uniformes do seu domínio.
+    """
+    domain = curve.Domain
+    params = np.linspace(domain.T0, domain.T1, count + 1)
+    points = np.array([[p.X, p.Y, p.Z] for p in
+                       [curve.PointAt(t) for t in params]])
+
+    return params, points
+
+def _minimize(func, a, b, iterations=60):
+    """
+    Encontra o mínimo de uma função unimodal no intervalo [A, B] pelo
+    método da seção áurea.
+    """
+    c = b - GOLDEN * (b - a)
+    d = a + GOLDEN * (b - a)
+    fc, fd = func(c), func(d)
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - GOLDEN * (b - a)
+            fc = func(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + GOLDEN * (b - a)
+            fd = func(d)
+
+    return (a + b) / 2
+
+def _refine(curve, params, values, index, func):
+    """
+    Refina o mínimo de FUNC encontrado na amostra de índice fornecido,
+    buscando entre os parâmetros vizinhos. Em curvas fechadas, amostras
+    na costura também são refinadas do outro lado do domínio.
+    """
+    last = len(params) - 1
+    brackets = [(params[max(index - 1, 0)], params[min(index + 1, last)])]
+    if curve.IsClosed and index in (0, last):
+        brackets = [(params[0], params[1]), (params[last - 1], params[last])]
+
+    best = params[index]
+    for lo, hi in brackets:
+        t = _minimize(func, lo, hi)
+        if func(t) < min(func(best), values[index]):
+            best = t
+
+    return best
+
+def project_to_plane(curve, plane):
+    """
+    Projeta uma curva em um plano, equivalente ao Curve.ProjectToPlane.
+    A projeção paralela à normal do plano é uma transformação afim, portanto
+    aplicá-la aos pontos de controle da curva é exato.
+    """
+    # Cria a matriz de projeção P = I - n.nT e a translação até o plano
+    n = plane.ZAxis
+    length = (n.X ** 2 + n.Y ** 2 + n.Z ** 2) ** 0.5
+    n = np.array([n.X, n.Y, n.Z]) / length
+    o = np.array([plane.Origin.X, plane.Origin.Y, plane.Origin.Z])
+    matrix = np.eye(3) - np.outer(n, n)
+    offset = n * (o @ n)
+
+    xform = r3dm.Transform(1.0)
+    for i in range(3):
+        for j in range(3):
+            setattr(xform, 'M{}{}'.format(i, j), matrix[i, j])
+        setattr(xform, 'M{}3'.format(i), offset[i])
+
+    # Aplica a projeção a uma cópia da curva
+    projected = curve.Duplicate()
+    projected.Transform(xform)
+
+    return projected
+
+def _spans(curve):
+    """
+    Decompõe uma curva NURBS nos seus trechos de Bézier. Retorna os
+    parâmetros de início e fim de cada trecho no domínio da curva e um
+    array com os pontos de controle homogêneos de cada trecho, ou None
+    caso a decomposição não seja possível.
+    """
+    if not isinstance(curve, r3dm.NurbsCurve):
+        return None
+
+    # O trecho I ocupa o intervalo entre os nós I + grau - 1 e I + grau,
+    # e os intervalos vazios, de nós repetidos, não têm trecho
+    degree = curve.Degree
+    knots = [curve.Knots[i] for i in range(len(curve.Knots))]
+    domains, spans = [], []
+    for i in range(len(curve.Points) - degree):
+        t0, t1 = knots[i + degree - 1], knots[i + degree]
+        if t1 <= t0:
+            continue
+        bezier = curve.ConvertSpanToBezier(i)
+        if bezier is None:
+            return None
+        bezier = bezier.ToNurbsCurve()
+        points = [bezier.Points[j] for j in range(len(bezier.Points))]
+        domains.append((t0, t1))
+        spans.append([[p.X, p.Y, p.Z, p.W] for p in points])
+    if len(spans) != curve.SpanCount:
+        return None
+
+    return np.array(domains), np.array(spans)
+
+def _basis(degree, u):
+    """
+    Calcula os polinômios de Bernstein de grau DEGREE nos parâmetros U,
+    entre 0 e 1. Retorna um array de parâmetros x (DEGREE + 1).
+    """
+    u = np.atleast_1d(np.asarray(u, dtype=float))[:, None]
+    k = np.arange(degree + 1)
+    binomial = np.array([comb(degree, i) for i in k])
+
+    return binomial * u ** k * (1 - u) ** (degree - k)
+
+def _bezier(points, u):
+    """
+    Avalia trechos de Bézier racionais, com os pontos de controle
+    homogêneos POINTS (trechos x pontos x 4), nos parâmetros U, entre 0 e
+    1. Retorna um array de trechos x parâmetros x 3.
+    """
+    basis = _basis(points.shape[-2] - 1, u)
+    weighted = np.einsum('uk,skd->sud', basis, points)
+
+    return weighted[..., :3] / weighted[..., 3:]
+
+def evaluate(curve, params):
+    """
+    Avalia os pontos de uma curva nos parâmetros PARAMS, em uma única
+    operação sobre os trechos de Bézier das curvas NURBS, ou pelo PointAt
+    nas demais curvas. Retorna um array (N, 3).
+    """
+    params = np.asarray(params, dtype=float)
+    spans = _spans(curve)
+    if spans is None:
+        points = np.empty((len(params), 3))
+        for i, t in enumerate(params):
+            p = curve.PointAt(t)
+            points[i] = (p.X, p.Y, p.Z)
+        return points
+
+    # Localiza o trecho de cada parâmetro e o converte para o intervalo
+    # do trecho
+    domains, points = spans
+    index = np.minimum(np.searchsorted(domains[:, 1], params),
+                       len(domains) - 1)
+    t0, t1 = domains[index, 0], domains[index, 1]
+    basis = _basis(points.shape[-2] - 1, (params - t0) / (t1 - t0))
+    weighted = np.einsum('nk,nkd->nd', basis, points[index])
+
+    return weighted[:, :3] / weighted[:, 3:]
+
+def _zoom(points, func, lo, hi, iterations=10):
+    """
+    Refina o mínimo de FUNC sobre um trecho de Bézier no intervalo
+    [LO, HI], avaliando SPAN_SAMPLES + 1 parâmetros de uma vez e
+    reduzindo o intervalo aos vizinhos do menor valor a cada iteração.
+    Retorna o parâmetro e o valor.
+    """
+    for _ in range(iterations):
+        u = np.linspace(lo, hi, SPAN_SAMPLES + 1)
+        values = func(_bezier(points, u)[0])
+        i = int(np.argmin(values))
+        lo, hi = u[max(i - 1, 0)], u[min(i + 1, SPAN_SAMPLES)]
+
+    return u[i], values[i]
+
+def _spans_minimum(curve, spans, func):
+    """
+    Encontra o parâmetro da curva do mínimo de FUNC sobre os seus pontos,
+    amostrando todos os trechos de Bézier de uma vez e refinando a melhor
+    amostra dentro do seu trecho e, nas extremidades, também no trecho
+    vizinho. Retorna o parâmetro e o valor.
+    """
+    domains, points = spans
+    count = len(points)
+    u = np.linspace(0, 1, SPAN_SAMPLES + 1)
+    values = func(_bezier(points, u).reshape(-1, 3)).reshape(count, -1)
+    span, j = divmod(int(np.argmin(values)), SPAN_SAMPLES + 1)
+
+    # Intervalos vizinhos à melhor amostra
+    brackets = [(span, u[max(j - 1, 0)], u[min(j + 1, SPAN_SAMPLES)])]
+    if j == 0 and (span > 0 or curve.IsClosed):
+        brackets.append(((span - 1) % count, u[-2], 1.0))
+    if j == SPAN_SAMPLES and (span < count - 1 or curve.IsClosed):
+        brackets.append(((span + 1) % count, 0.0, u[1]))
+
+    best = (values[span, j], span, u[j])
+    for index, lo, hi in brackets:
+        t, value = _zoom(points[index:index + 1], func, lo, hi)
+        if value < best[0]:
+            best = (value, index, t)
+
+    value, index, t = best
+    t0, t1 = domains[index]
+    return t0 + t * (t1 - t0), value
+
+def bounding_box(curve, samples=2048):
+    """
+    Calcula a caixa delimitadora justa de uma curva, equivalente ao
+    GeometryBase.GetBoundingBox(curve, True). Os extremos de cada eixo
+    são localizados nos trechos de Bézier e refinados pela seção áurea.
+    Curvas que não podem ser decompostas são amostradas em SAMPLES
+    pontos.
+    """
+    nurbs = curve.ToNurbsCurve()
+    spans = _spans(nurbs) if nurbs is not None else None
+    if spans is None:
+        return _sampled_box(curve, samples)
+
+    lower = np.empty(3)
+    upper = np.empty(3)
+    for axis in range(3):
+        lower[axis] = _spans_minimum(nurbs, spans, lambda p: p[:, axis])[1]
+        upper[axis] = -_spans_minimum(nurbs, spans, lambda p: -p[:, axis])[1]
+
+    return r3dm.BoundingBox(r3dm.Point3d(*lower), r3dm.Point3d(*upper))
+
+def closest_point(curve, point, samples=2048):
+    """
+    Calcula o parâmetro do ponto da curva mais próximo do ponto fornecido,
+    equivalente ao Curve.ClosestPoint. Retorna [sucesso, parâmetro], no
+    mesmo formato da resposta do Rhino.Compute. Curvas que não podem ser
+    decompostas são amostradas em SAMPLES pontos.
+    """
+    target = np.array([point.X, point.Y, point.Z])
+    spans = _spans(curve)
+    if spans is None:
+        return _sampled_closest_point(curve, target, samples)
+
+    func = lambda p: np.sum((p - target) ** 2, axis=1)
+    return [True, float(_spans_minimum(curve, spans, func)[0])]
+
+def _sampled_box(curve, samples):
+    """
+    Caixa delimitadora por amostragem de SAMPLES pontos da curva,
+    refinados pela seção áurea.
+    """
+    params, points = _samples(curve, samples)
+    lower = np.empty(3)
+    upper = np.empty(3)
+
+    # Refina o mínimo e o máximo de cada coordenada
+    for axis in range(3):
+        low = lambda t: _coords(curve, t)[axis]
+        high = lambda t: -_coords(curve, t)[axis]
+        i = int(np.argmin(points[:, axis]))
+        j = int(np.argmax(points[:, axis]))
+        t = _refine(curve, params, points[:, axis], i, low)
+        lower[axis] = min(low(t), points[i, axis])
+        t = _refine(curve, params, -points[:, axis], j, high)
+        upper[axis] = max(-high(t), points[j, axis])
+
+    return r3dm.BoundingBox(r3dm.Point3d(*lower), r3dm.Point3d(*upper))
+
+def _sampled_closest_point(curve, target, samples):
+    """
+    Ponto mais próximo por amostragem de SAMPLES pontos da curva,
+    refinados pela seção áurea.
+    """
+    params, points = _samples(curve, samples)
+    dist = np.sum((points - target) ** 2, axis=1)
+
+    # Refina o parâmetro entre as amostras vizinhas à mais próxima
+    func = lambda t: np.sum((_coords(curve, t) - target) ** 2)
+    t = _refine(curve, params, dist, int(np.argmin(dist)), func)
+
+    return [True, float(t)]
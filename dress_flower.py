@@ -5,35 +5,73 @@
 # Versão: 1.0.0
 
 import json
+import os
 import sys
+import tempfile
+import time
 
 from os import getcwd
 from geolocation import coordinates
 from colors import color_table
-from geometry import draw_geometry
-from artist import paint, export_jpeg, export_pdf
+from validation import check_color, check_input
+from quality import DEFAULT, PRESETS, cache_name, get_preset
+from artifacts import (get_store, geometry_key, order_key, output_paths,
+                       release, shape_key)
+
+# Os módulos de geometria (rhino3dm e Rhino.Compute) e de pintura (Rhino)
+# são carregados apenas na primeira etapa que os utiliza, para que a
+# validação dos pedidos e a interface não esperem pelo Rhino.
+
+# Formatos exportados por padrão: os formatos finais da arte exportados
+# pelo Rhino. O SVG para a loja virtual ('svg') é exportado apenas quando
+# pedido, à partir do modelo sem pintura (veja vector.export_svg).
+FORMATS = ('pdf', 'jpeg')
+
+# Formatos exportados sem o Rhino, à partir do modelo sem pintura: o SVG,
+# o PNG de impressão desenhado em faixas (veja raster.render_png) e as
+# imagens reduzidas e os blocos do zoom da loja virtual (veja
+# pyramid.export_images), que com o Rhino são reduzidas do JPEG exportado
+# por ele, quando o JPEG também é pedido
+LOCAL_FORMATS = ('svg', 'png', 'imagens')
+
+def cached_kinds(save_3dm, outputs):
+    """
+    Formatos buscados e guardados no cache de artefatos para um pedido.
+    """
+    return (('3dm',) if save_3dm else ()) + tuple(outputs)
+
+# Quantidade de passos entre as duas cores da arte na qualidade de
+# produção (veja quality)
+BLEND = PRESETS[DEFAULT].blend
+
+# Etapas informadas ao PROGRESS do make_flower e do recolor, em ordem
+STAGES = ('localização', 'geometria', 'exportação', 'concluído')
+
+def report(progress, stage, value=None):
+    """
+    Informa uma etapa concluída à função PROGRESS, caso fornecida.
+    """
+    if progress is not None:
+        progress(stage, value)
 
 def load_input(file):
     """
     Carrega os valores de entrada à partir de um arquivo JSON e formata
     eles de acordo com o esquema necessário para a geração da arte.
+    Também aceita os valores de entrada já carregados em um dicionário.
+    Todos os valores são validados antes da busca da localização.
     """
 
     # Carrega os valores de entrada
-    input = json.load(file)
-
-    # Avalia se os valores de entrada da data estão corretos
-    date = input['data'].split('/')
-    if len(date) != 3:
-        raise ValueError('Confira se inseriu a data com dia, mês e ano.')
-    elif len(date[0]) != 2 or len(date[1]) != 2 or len(date[2]) != 4:
-        raise ValueError('Confira se a data está no formato DD/MM/AAAA.')
-    elif ''.join(date).isnumeric() == False:
-        raise ValueError('Confira se inseriu corretamente a data.')
+    input = json.load(file) if hasattr(file, 'read') else dict(file)
 
-    # Formata a data como uma lista de números inteiros
-    date = ''.join(date)
-    date = [int(x) for x in date]
+    # Avalia se os valores de entrada estão corretos e formata a data 
+    # como uma lista de números inteiros. A dimensão não é limitada às
+    # dimensões da loja, que são avaliadas apenas na entrada dos pedidos
+    # (intake e job_server)
+    date = check_input(input, sizes=None)
+    size = input['dimensões']
+    color = input['cores']
 
     # Avalia se os valores de entrada de localização estão corretos
     geodata = coordinates(input['cidade'], input['estado'], input['pais'])
@@ -52,52 +90,343 @@ def load_input(file):
     text = city.lower() + " · " + state.lower() + \
            " · " + input['data'].replace('/', ' · ')
 
-    # Avalia se o valor de entrada para o tamanho da arte está correto
-    if type(input['dimensões']) != int:
-        raise TypeError('Valor de entrada para a dimensão não é compatível.')
-    else:
-        size = input['dimensões']
-    
-    # Avalia se o valor de entrada para as cores está correto
-    if type(input['cores']) != int:
-        raise TypeError('Valor de entrada para as cores não é compatível.')
-    elif input['cores'] < 1 or input['cores'] > 12:
-        raise ValueError('Não existe valor compatível com a cor selecionada.')
+    return date, loc, size, text, color
+
+def build_shape(input, blend, reuse=True, quality=DEFAULT):
+    """
+    Cria a geometria da flor de um pedido na dimensão de referência, ou
+    carrega a geometria já criada para outra dimensão da mesma arte, com
+    a tolerância da predefinição de qualidade QUALITY.
+    """
+    from geometry import flower_shape, read_shape, write_shape
+
+    preset = get_preset(quality)
+    store = get_store()
+    key = shape_key(input[0], input[1], blend, cache_name(preset))
+
+    # Busca a geometria já criada para a mesma data e localização
+    if reuse:
+        filename = store.fetch_model(key, 'forma.3dm')
+        if filename is not None:
+            return read_shape(filename)
+
+    # Cria a geometria e a guarda para as outras dimensões
+    shape = flower_shape(input[0], input[1], blend,
+                         tolerance=preset.tolerance)
+    write_shape(shape, store.model_path(key, 'forma.3dm'))
+
+    return shape
+
+def build_model(input, colors, art_id, reuse=True, quality=DEFAULT):
+    """
+    Etapa de geometria: cria o modelo 3DM de um pedido, ou carrega um
+    modelo idêntico já criado e altera apenas a cor das curvas. O modelo
+    sem pintura e os valores de entrada do pedido são guardados para que
+    uma nova cor possa ser aplicada sem refazer esta etapa. As
+    tolerâncias da geometria e do texto são as da predefinição de
+    qualidade QUALITY.
+    Retorna o modelo em memória, como um rhino3dm.File3dm.
+    """
+    from geometry import draw_geometry, set_curve_color
+
+    preset = get_preset(quality)
+    store = get_store()
+    key = geometry_key(*input[:4], colors[1], cache_name(preset))
+
+    # Busca um modelo com a mesma geometria, independente da cor
+    filename = store.fetch_model(key) if reuse else None
+    if filename is not None:
+        model = set_curve_color(filename, colors)
     else:
-        color = input['cores']
+        shape = build_shape(input, colors[1], reuse, preset)
+        model = draw_geometry(input[0], input[1], input[2], input[3],
+                              colors, art_id, shape=shape, write=False,
+                              tolerance=preset.tolerance,
+                              text_tolerance=preset.text_tolerance)
+        model.Write(store.model_path(key))
+    store.record_order(art_id, key, input, preset.name)
 
-    return date, loc, size, text, color
+    return model
 
-def make_flower(id):
-    
+def export_local(model, colors, art_id, outputs, quality=DEFAULT):
+    """
+    Pinta e exporta a arte nos formatos de OUTPUTS sem o Rhino, à partir
+    do modelo sem pintura: o JPEG pelo rasterizador, com a largura da
+    predefinição de qualidade QUALITY, o PNG de impressão em faixas, o
+    PDF e o SVG pelo vector e as imagens da loja virtual pelo pyramid. O
+    JPEG e as imagens da loja virtual utilizam a mesma rasterização.
+    Retorna os arquivos e os tempos de cada formato, em segundos.
+    """
+    preset = get_preset(quality)
+    files, timing = {}, {}
+    image = None
+    for kind in outputs:
+        start = time.perf_counter()
+        if kind in ('jpeg', 'imagens') and image is None:
+            from raster import rasterize
+            image = rasterize(model, colors, preset.width, preset.samples)
+        if kind == 'jpeg':
+            from raster import save_jpeg
+            files[kind] = save_jpeg(image, art_id)
+        elif kind == 'imagens':
+            from pyramid import export_images
+            files[kind] = export_images(image, art_id)
+        elif kind == 'png':
+            from raster import render_png
+            files[kind] = render_png(model, colors, art_id,
+                                     samples=preset.samples)
+        elif kind == 'pdf':
+            from vector import export_pdf
+            files[kind] = export_pdf(model, colors, art_id)
+        elif kind == 'svg':
+            from vector import export_svg
+            files[kind] = export_svg(model, colors, art_id)
+        else:
+            raise ValueError('Formato de saída não suportado: ' + str(kind))
+        timing[kind] = round(time.perf_counter() - start, 3)
+
+    return files, timing
+
+def export_rhino_images(result, art_id):
+    """
+    Cria as imagens da loja virtual à partir do JPEG exportado pelo Rhino
+    no RESULT do finish, acrescentando a pasta e o tempo ao RESULT.
+    """
+    from pyramid import export_images
+
+    start = time.perf_counter()
+    result['imagens'] = export_images(result['jpeg'], art_id)
+    result['tempos']['imagens'] = round(time.perf_counter() - start, 3)
+
+def finish(input, colors, model, art_id, save_3dm=True, outputs=FORMATS,
+           parallel=True, service=None, quality=DEFAULT):
+    """
+    Etapas de pintura e exportação: aplica o gradiente de cores ao modelo
+    e exporta a arte nos formatos de OUTPUTS (PDF e JPEG por padrão), com
+    o documento aberto uma única vez. Os formatos de LOCAL_FORMATS,
+    quando pedidos, são exportados antes da pintura, sem o Rhino, exceto
+    as imagens da loja virtual, que com o JPEG são reduzidas do JPEG
+    exportado pelo Rhino (veja export_rhino_images). Com
+    PARALLEL, os formatos são exportados ao mesmo tempo em processos
+    separados (veja artist.Session.export_all). O modelo pintado é salvo
+    em 3DM, a não ser que SAVE_3DM seja falso. Retorna um dicionário com
+    os arquivos 3DM, PDF e JPEG e, em 'tempos', os tempos de cada etapa
+    em segundos.
+    Com SERVICE, um render_service.RenderClient, as etapas são executadas
+    pelo serviço de renderização, que mantém o Rhino carregado.
+    Nas predefinições de qualidade QUALITY sem o Rhino, a arte é pintada
+    e exportada por export_local, sem o serviço, e o modelo 3DM é salvo
+    sem pintura.
+    """
+    preset = get_preset(quality)
+    file3dm = output_paths(art_id)['3dm'] if save_3dm else None
+
+    # Com o Rhino, as imagens da loja virtual são reduzidas do JPEG
+    # exportado pelo Rhino, quando ele também é pedido, em vez de uma
+    # segunda rasterização sem o Rhino
+    images = (preset.renderer != 'local' and 'imagens' in outputs and
+              'jpeg' in outputs)
+
+    # Exporta os formatos sem o Rhino à partir do modelo ainda sem
+    # pintura, ou todos os formatos nas qualidades sem o Rhino
+    local = tuple(kind for kind in outputs
+                  if (kind in LOCAL_FORMATS or preset.renderer == 'local')
+                  and not (images and kind == 'imagens'))
+    local_files, timing = export_local(model, colors, art_id, local, preset)
+    outputs = tuple(kind for kind in outputs
+                    if kind not in local and kind != 'imagens')
+
+    if preset.renderer == 'local':
+        if save_3dm:
+            model.Write(file3dm)
+        result = {'3dm': file3dm}
+        result.update(local_files)
+        result['tempos'] = timing
+        return result
+
+    # Envia o modelo ao serviço de renderização por um arquivo 3DM
+    if service is not None:
+        filename = file3dm
+        if filename is None:
+            handle, filename = tempfile.mkstemp(suffix='.3dm')
+            os.close(handle)
+        try:
+            model.Write(filename)
+            result = {'3dm': file3dm}
+            result.update(service.finish(filename, art_id, input[2], colors,
+                                         outputs, file3dm))
+        finally:
+            if file3dm is None:
+                os.remove(filename)
+        result.update(local_files)
+        result['tempos'] = dict(timing, **result.get('tempos', {}))
+        if images:
+            export_rhino_images(result, art_id)
+        return result
+
+    from artist import Session
+    with Session(model) as session:
+        # Finaliza a arte com as cores fornecidas pelo usuário, dentro
+        # das opções pré-definidas
+        start = time.perf_counter()
+        session.paint(colors)
+        painted = round(time.perf_counter() - start, 3)
+
+        # Exporta a arte nos formatos de saída
+        files, exported = session.export_all(input[2], art_id, outputs,
+                                             parallel, file3dm)
+
+        # Salva o modelo pintado, caso ainda não tenha sido salvo para
+        # os processos de exportação
+        if save_3dm and session.saved != file3dm:
+            session.save(file3dm)
+
+    result = {'3dm': file3dm}
+    result.update(files)
+    result.update(local_files)
+    result['tempos'] = dict(timing, pintura=painted, **exported)
+    if images:
+        export_rhino_images(result, art_id)
+
+    return result
+
+def make_flower(id, source=None, reuse=True, save_3dm=True, outputs=None,
+                parallel=True, service=None, progress=None, quality=DEFAULT):
+    """
+    Gera a arte completa de um pedido à partir do seu arquivo JSON, por
+    padrão JSON/<id>.json, ou do arquivo fornecido em SOURCE. SOURCE
+    também pode ser um dicionário com os valores de entrada do pedido.
+    Com REUSE, pedidos com os mesmos valores de entrada de um pedido já
+    gerado recebem os arquivos do cache em vez de uma nova renderização.
+    Com SAVE_3DM falso, o modelo 3DM final não é salvo. OUTPUTS define os
+    formatos exportados, por padrão os da predefinição de qualidade, e
+    PARALLEL se eles são exportados ao mesmo tempo.
+    QUALITY é o nome da predefinição de qualidade (veja quality): a
+    produção, por padrão, ou o rascunho e a prévia, com menos passos
+    entre as cores, tolerâncias maiores e a pintura sem o Rhino.
+    Com SERVICE, a pintura e a exportação são feitas pelo serviço de
+    renderização (veja finish).
+    PROGRESS, caso fornecida, é chamada com cada etapa de STAGES ao ser
+    concluída e o seu valor: os valores de entrada, o modelo 3DM sem
+    pintura e as cores, None e os arquivos gerados. Pedidos encontrados
+    no cache passam direto para a etapa final.
+    Retorna um dicionário com os arquivos 3DM, PDF e JPEG gerados.
+    """
     # Formata o nome do arquivo JSON de entrada, e retorna um aviso caso um 
     # arquivo não tenha sido encontrado ou a ID não tenha sido fornecida
     # if len(sys.argv) != 2:
     #     raise ValueError('Insira o ID da arte.')
-    try:
-        filename = getcwd() + "\\JSON\\" + id + '.json'
-        file = open(filename, encoding='utf-8')
-    except:
-        raise ValueError('Não foi encontrado arquivo JSON com o ID fornecido.')
+    file = source
+    if not isinstance(source, dict):
+        try:
+            filename = source or getcwd() + "\\JSON\\" + id + '.json'
+            with open(filename, encoding='utf-8') as json_file:
+                file = json.load(json_file)
+        except OSError:
+            raise ValueError('Não foi encontrado arquivo JSON com o ID '
+                             'fornecido.')
+
+    # Zera a contagem de requisições ao Rhino.Compute feitas pelo pedido,
+    # disponível em compute.round_trips() ao final da geração
+    from compute import reset_round_trips
+    reset_round_trips()
 
     # Carrega os valores de entrada à partir de um arquivo JSON
     input = load_input(file)
     art_id = str(id)
+    report(progress, 'localização', input)
 
     # Define as cores para serem utilizadas na arte de acordo com
     # a tabela de cores pré-definidas, bem como a quantidade de 
     # passos entre as duas cores definidas
-    blend = 120
-    colors = [color_table(input[4]), blend]
+    preset = get_preset(quality)
+    outputs = preset.outputs if outputs is None else outputs
+    colors = [color_table(input[4]), preset.blend]
+
+    # Busca os arquivos de um pedido idêntico já gerado
+    store = get_store()
+    key = order_key(*input, preset.blend, cache_name(preset))
+    kinds = cached_kinds(save_3dm, outputs)
+    if reuse:
+        cached = store.fetch(key, art_id, kinds)
+        if cached is not None:
+            store.record_order(art_id, geometry_key(*input[:4], preset.blend,
+                                                    cache_name(preset)),
+                               input, preset.name)
+            report(progress, 'concluído', cached)
+            return cached
 
     # Gera a arte à partir dos valores de entrada
-    file3dm = draw_geometry(input[0], input[1], input[2], 
-                            input[3], colors, art_id)
-    
-    # Finaliza a arte com as cores fornecidas pelo usuário, dentro
-    # das opções pré-definidas
-    flower = paint(file3dm, colors)
+    release(art_id)
+    model = build_model(input, colors, art_id, reuse, preset)
+    report(progress, 'geometria', (model, colors))
+    result = finish(input, colors, model, art_id, save_3dm, outputs, parallel,
+                    service, preset)
+    report(progress, 'exportação')
+
+    # Guarda os arquivos gerados para os próximos pedidos idênticos
+    if all(result.get(kind) for kind in kinds):
+        store.store(key, art_id, result)
+    report(progress, 'concluído', result)
+
+    return result
+
+def recolor(id, color, new_id=None, save_3dm=True, outputs=None,
+            parallel=True, service=None, progress=None, quality=None):
+    """
+    Gera novamente a arte de um pedido já gerado com outra cor, dentre as
+    12 opções, à partir do seu modelo 3DM guardado, sem refazer a busca da
+    localização e a geometria. A nova arte usa o ID NEW_ID, ou substitui a
+    arte original caso ele não seja fornecido. SAVE_3DM, OUTPUTS, PARALLEL
+    SERVICE e PROGRESS funcionam como no make_flower. A predefinição de
+    qualidade é a registrada com o pedido original; QUALITY, caso
+    fornecida, deve ser a mesma, já que o modelo guardado tem a
+    quantidade de curvas da qualidade original.
+    Retorna um dicionário com os arquivos 3DM, PDF e JPEG gerados.
+    """
+    check_color(color)
+    store = get_store()
+    record = store.order(str(id))
+    if record is None:
+        raise ValueError('Não foi encontrado modelo para o ID fornecido.')
+    key, input, recorded = record
+    if quality is not None and get_preset(quality).name != recorded:
+        raise ValueError('O pedido foi gerado com a qualidade ' + recorded +
+                         ', e não pode receber outra cor com a qualidade ' +
+                         get_preset(quality).name + '.')
+    input = input[:4] + (color,)
+    art_id = str(new_id or id)
+    preset = get_preset(recorded)
+    outputs = preset.outputs if outputs is None else outputs
+    colors = [color_table(color), preset.blend]
+
+    # Busca os arquivos de um pedido idêntico já gerado
+    report(progress, 'localização', input)
+    kinds = cached_kinds(save_3dm, outputs)
+    cached = store.fetch(order_key(*input, preset.blend, cache_name(preset)),
+                         art_id, kinds)
+    if cached is not None:
+        store.record_order(art_id, key, input, preset.name)
+        report(progress, 'concluído', cached)
+        return cached
+
+    # Carrega o modelo sem pintura e aplica a nova cor às curvas
+    release(art_id)
+    filename = store.fetch_model(key)
+    if filename is None:
+        raise ValueError('O modelo do pedido não está mais disponível.')
+    from geometry import set_curve_color
+    model = set_curve_color(filename, colors)
+    store.record_order(art_id, key, input, preset.name)
+    report(progress, 'geometria', (model, colors))
+
+    # Refaz apenas a pintura e a exportação
+    result = finish(input, colors, model, art_id, save_3dm, outputs, parallel,
+                    service, preset)
+    report(progress, 'exportação')
+    if all(result.get(kind) for kind in kinds):
+        store.store(order_key(*input, preset.blend, cache_name(preset)),
+                    art_id, result)
+    report(progress, 'concluído', result)
 
-    # Exporta a arte em JPEG e em PDF
-    pdf = export_pdf(input[2], flower, art_id)
-    jpeg = export_jpeg(input[2], flower, art_id)
\ No newline at end of file
+    return result
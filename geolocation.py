@@ -1,30 +1,236 @@
-# geolocation.py 
+# geolocation.py
 #
 # Utiliza o módulo geopy e a base de dados Nominatim-OSM para
 # coletar os valores decimais de latitude e longitude de uma
 # localização fornecida pelo usuário.
 #
+# As localizações encontradas são guardadas em um cache SQLite, com
+# chaves normalizadas de (cidade, estado, país), que também pode ser
+# alimentado por um gazetteer offline em CSV. A busca pela rede é apenas
+# o último recurso e o provedor pode ser substituído.
+#
+# Uso: python -m geolocation importar <arquivo.csv>
+#
+
+import csv
+import sqlite3
+import sys
+import threading
+import unicodedata
+from os import getcwd, makedirs, path
+
+DATABASE = path.join(getcwd(), 'CACHE', 'geocode.sqlite3')
+
+# Tempo máximo de espera, em segundos, pelo banco de dados bloqueado por
+# outro processo (como os workers do batch)
+BUSY_TIMEOUT = 30
+
+class ProviderError(Exception):
+    """
+    Falha de um provedor de geolocalização ao buscar uma localização.
+    """
+
+class Location:
+    """
+    Localização com a mesma interface utilizada do geopy.Location:
+    latitude, longitude e o endereço em raw['address'].
+    """
+    def __init__(self, latitude, longitude, city, state):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.raw = {'address': {'city': city, 'state': state}}
+
+def normalize(text):
+    """
+    Normaliza um nome de lugar para a chave do cache: sem acentos, em
+    letras minúsculas e sem espaços repetidos.
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+
+    return ' '.join(text.lower().split())
+
+class NominatimProvider:
+    """
+    Provedor de geolocalização pela rede, utilizando o Nominatim-OSM.
+    O geolocalizador é criado uma única vez e reaproveitado, e o geopy só
+    é carregado quando a primeira busca pela rede é necessária.
+    """
+    def __init__(self, user_agent="DressPOP", timeout=10):
+        from geopy.geocoders import Nominatim
+        self.geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    def __call__(self, cidade, estado, pais):
+        from geopy.exc import GeopyError
+
+        # Formata os valores de entrada para um dicionário de query
+        # estruturado
+        address = {'city': cidade, 'state': estado, 'country': pais}
+        try:
+            location = self.geolocator.geocode(address, addressdetails=True)
+        except GeopyError as error:
+            raise ProviderError(str(error)) from error
+        if location is None:
+            return None
+
+        # Converte o resultado para uma localização do cache
+        details = location.raw.get('address', {})
+        city = details.get('city', details.get('town', cidade.strip()))
+        state = details.get('state', estado.strip())
+
+        return Location(location.latitude, location.longitude, city, state)
 
-from geopy.geocoders import Nominatim
+class GeocodeCache:
+    """
+    Cache persistente de localizações em SQLite, com uma camada em memória
+    para as consultas repetidas dentro do mesmo processo.
+    """
+    def __init__(self, database=DATABASE):
+        if database != ':memory:':
+            makedirs(path.dirname(database), exist_ok=True)
+        self._db = sqlite3.connect(database, timeout=BUSY_TIMEOUT,
+                                   check_same_thread=False)
+        self._lock = threading.Lock()
+        self._memory = {}
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS places ('
+                'city TEXT, state TEXT, country TEXT, '
+                'latitude REAL, longitude REAL, '
+                'city_name TEXT, state_name TEXT, source TEXT, '
+                'PRIMARY KEY (city, state, country))'
+            )
+
+    @staticmethod
+    def key(cidade, estado, pais):
+        return normalize(cidade), normalize(estado), normalize(pais)
+
+    def get(self, cidade, estado, pais):
+        """
+        Busca uma localização no cache. Retorna None caso não exista.
+        """
+        key = self.key(cidade, estado, pais)
+        if key in self._memory:
+            return self._memory[key]
+        with self._lock:
+            row = self._db.execute(
+                'SELECT latitude, longitude, city_name, state_name '
+                'FROM places WHERE city = ? AND state = ? AND country = ?',
+                key).fetchone()
+        if row is None:
+            return None
+        location = Location(*row)
+        self._memory[key] = location
+
+        return location
+
+    def put(self, cidade, estado, pais, location, source='rede'):
+        """
+        Guarda uma localização no cache.
+        """
+        self.put_many([(cidade, estado, pais, location)], source)
+
+    def put_many(self, entries, source):
+        """
+        Guarda várias localizações no cache em uma única transação.
+        """
+        rows = []
+        for cidade, estado, pais, location in entries:
+            key = self.key(cidade, estado, pais)
+            address = location.raw['address']
+            rows.append(key + (location.latitude, location.longitude,
+                               address['city'], address['state'], source))
+            self._memory[key] = location
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows)
+
+    def import_gazetteer(self, filename):
+        """
+        Importa um gazetteer offline em CSV, com as colunas cidade, estado,
+        pais, latitude e longitude, e opcionalmente nome_cidade e
+        nome_estado (nomes utilizados no texto da arte). Retorna a
+        quantidade de localizações importadas.
+        """
+        entries = []
+        with open(filename, encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                city = row.get('nome_cidade') or row['cidade'].strip()
+                state = row.get('nome_estado') or row['estado'].strip()
+                location = Location(float(row['latitude']),
+                                    float(row['longitude']), city, state)
+                entries.append((row['cidade'], row['estado'], row['pais'],
+                                location))
+        self.put_many(entries, 'gazetteer')
+
+        return len(entries)
+
+_cache = None
+_provider = 'nominatim'
+
+def set_provider(provider):
+    """
+    Substitui o provedor de geolocalização pela rede. O provedor recebe
+    (cidade, estado, pais) e retorna uma Location ou None, e levanta um
+    ProviderError ou um OSError em caso de falha. Com None, as buscas
+    ficam restritas ao cache.
+    """
+    global _provider
+    _provider = provider
+
+def get_cache():
+    """
+    Retorna o cache de localizações do processo, criando-o se necessário.
+    """
+    global _cache
+    if _cache is None:
+        _cache = GeocodeCache()
+    return _cache
 
 def coordinates(cidade, estado, pais):
     """
     Utiliza o módulo geopy para coletar os valores de latitude
     e longitude de uma localização. Caso a localização não exista,
-    ou o geolocator retorne alguma exceção, a função retorna um
-    valor vazio.
+    ou o provedor falhe (ProviderError ou um erro de rede), a função
+    retorna um valor vazio.
+    A localização é buscada primeiro no cache local e somente depois no
+    provedor pela rede, cujo resultado é guardado no cache.
     """
-    # Formata os valores de entrada para um dicionário de query estruturado
-    address = {'city': cidade, 'state': estado, 'country': pais}
-    
+    global _provider
+
+    # Busca a localização no cache local
+    cache = get_cache()
+    location = cache.get(cidade, estado, pais)
+    if location is not None:
+        return location
+
     # Inicializa o localizador utilizando o Nominatim-OSM
-    geolocator = Nominatim(user_agent="DressPOP")
-    
-    # Inicia a busca pela localização do endereço. Caso uma exceção
-    # surja, retorna um valor vazio. Do contrario, retorna a localização.
+    if _provider == 'nominatim':
+        _provider = NominatimProvider()
+    elif _provider is None:
+        return None
+
+    # Inicia a busca pela localização do endereço. Caso o provedor ou a
+    # rede falhem, retorna um valor vazio. Do contrario, retorna a
+    # localização.
     try:
-        location = geolocator.geocode(address, addressdetails=True)
-    except:
+        location = _provider(cidade, estado, pais)
+    except (ProviderError, OSError):
         return None
 
-    return location
\ No newline at end of file
+    # Guarda a localização no cache. Caso o banco de dados continue
+    # bloqueado, a localização é retornada sem ser guardada
+    if location is not None:
+        try:
+            cache.put(cidade, estado, pais, location)
+        except sqlite3.OperationalError:
+            pass
+
+    return location
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'importar':
+        raise SystemExit('Uso: python -m geolocation importar <arquivo.csv>')
+    total = get_cache().import_gazetteer(sys.argv[2])
+    print('{} localizações importadas.'.format(total))
@@ -7,14 +7,29 @@
 
 import math
 import rhino3dm as r3dm
-import compute_rhino3d.Util
-from compute_rhino3d import Curve, GeometryBase, Intersection
+import compute
+from compute_rhino3d import Curve, Intersection
 from os import getcwd
+from outline import flower_outline, to_curve
+from atlas import lookup_outline
+from tween import tween_curves
+from curve_ops import project_to_plane, bounding_box, closest_point
 
 X_AXIS = r3dm.Vector3d(1, 0, 0)
 Y_AXIS = r3dm.Vector3d(0, 1, 0)
 Z_AXIS = r3dm.Vector3d(0, 0, 1)
 
+# Dimensão de referência, em centímetros, em que a geometria da flor é
+# criada antes de ser escalada para a dimensão de cada arte. É a maior
+# dimensão disponível, para que as tolerâncias absolutas dos cálculos
+# nunca fiquem menos precisas do que nas artes maiores.
+REFERENCE = 90
+
+# Tolerâncias da geometria da flor e do contorno do texto, em centímetros,
+# utilizadas na qualidade de produção (veja quality)
+TOLERANCE = 0.001
+TEXT_TOLERANCE = 0.01
+
 def PointPolar(radius, phi):
     """
     Transforma coordenadas polares em coordenadas cartesianas
@@ -50,10 +65,11 @@ def Remap(value, old_domain, new_domain):
 
     return remapped_value
 
-def GetTangentCurves(c1, c2):
+def GetTangentCircles(c1, c2):
     """
-    Calcula as linhas tangentes a dois circulos, C1 e C2.
-    Retorna essas linhas como objetos rhino3dm.Line(p1, p2).
+    Cria os círculos auxiliares para o cálculo das tangentes a dois
+    círculos, C1 e C2: o círculo com diâmetro entre os centros e o círculo
+    interno ao maior, com raio R - r. Retorna as curvas NURBS dos dois.
     """
     # Organiza a lista de círculos de acordo com o raio
     c = sorted([c1, c2], key= lambda x:x.Radius)
@@ -67,11 +83,25 @@ def GetTangentCurves(c1, c2):
     
     # Cria o círculo interno ao círculo maior, com raio R - r
     inn_circle = r3dm.Circle(c[1].Center, (c[1].Radius - c[0].Radius))
+
+    return mid_circle.ToNurbsCurve(), inn_circle.ToNurbsCurve()
+
+def GetTangentCurves(c1, c2, intersection=None):
+    """
+    Calcula as linhas tangentes a dois circulos, C1 e C2.
+    Retorna essas linhas como objetos rhino3dm.Line(p1, p2).
+    A intersecção entre os círculos auxiliares (veja GetTangentCircles)
+    pode ser fornecida já calculada, para que várias delas sejam enviadas
+    ao Rhino.Compute em uma única requisição.
+    """
+    # Organiza a lista de círculos de acordo com o raio
+    c = sorted([c1, c2], key= lambda x:x.Radius)
     
     # Calcula os pontos de intersecção entre os círculos auxiliares
-    intersection = Intersection.CurveCurve(mid_circle.ToNurbsCurve(),
-                                           inn_circle.ToNurbsCurve(),
-                                           0.001, 0.001)
+    if intersection is None:
+        mid_circle, inn_circle = GetTangentCircles(c1, c2)
+        intersection = Intersection.CurveCurve(mid_circle, inn_circle,
+                                               0.001, 0.001)
     i1 = r3dm.Point3d(intersection[0]['PointA']['X'], 
                       intersection[0]['PointA']['Y'], 0.0)
     i2 = r3dm.Point3d(intersection[1]['PointA']['X'], 
@@ -127,40 +157,32 @@ def GetCorners(points):
 
     return min_point, max_point
 
-def draw_geometry(date, loc, size, text, color, id):
+def set_curve_color(model, color):
     """
-    Cria o arquivo 3DM com a geometria necessária para a arte,
-    utilizando as funcões do rhino3dm e do Rhino.Compute.
-    Essa função retorna o nome do arquivo 3DM após a finalização
-    de todas as operações.
+    Altera a cor da layer 'Curvas' de um modelo 3DM já criado pelo
+    draw_geometry, única parte do modelo que depende da cor escolhida.
+    O modelo pode ser um rhino3dm.File3dm ou o nome de um arquivo 3DM, que
+    é carregado sem ser alterado. Essa função retorna o modelo em memória.
     """
-    # Inicializa a instância do servidor do Rhino.Compute
-    compute_rhino3d.Util.url = "http://localhost:8081/"
+    # Organiza a cor com o valor Alpha das curvas de sobreposição
+    crv_color = tuple(color[0][0][:3]) + (122,)
 
-    # Adiciona as cores do valor Alpha ao conjunto de cores
-    color[0][0].append(122)
+    # Altera a cor de exibição e de impressão da layer
+    if isinstance(model, str):
+        model = r3dm.File3dm.Read(model)
+    layer = model.Layers.FindName('Curvas', 0)
+    layer.Color = crv_color
+    layer.PlotColor = crv_color
 
-    # Organiza as cores para referenciação nas layers
-    crv_color = tuple([val for val in color[0][0]])
-    blend = color[1]
-
-    # Cria o arquivo 3DM em que serão feitas as operações
-    model = r3dm.File3dm()
-    model.Settings.ModelUnitSystem = r3dm.UnitSystem.Centimeters
-
-    # Cria as layers base da arte
-    model.Layers.AddLayer('Arte', (0, 0, 0, 255))
-    model.Layers.AddLayer('Texto', (210, 210, 210, 255))
-    model.Layers.AddLayer('Curvas', crv_color)
-    model.Layers.FindName('Curvas', 0).PlotColor = crv_color
-    model.Layers.FindName('Curvas', 0).PlotWeight = size/200
-
-    # Cria as layers base de visualização
-    model.Layers.AddLayer('ViewFrame', (255, 255, 255, 255))
-    model.Layers.AddLayer('PrintFrame', (255, 255, 255, 255))
+    return model
 
+def PetalCircles(date, size):
+    """
+    Calcula a geometria base das pétalas da flor à partir dos oito dígitos
+    da data, para a dimensão SIZE. Retorna o círculo central, os centros
+    das pétalas e os seus raios.
+    """
     # Cria as dimensões básicas para a geração da arte
-    bleed = 5.0
     margin = size * 0.05
     radius = (size/2) - margin
     arc = 360/8
@@ -186,10 +208,48 @@ def draw_geometry(date, loc, size, text, color, id):
 
     # Cria os pontos da arte baseado nas suas coordenadas polares
     points = [PointPolar(scale[x], angle[x]) for x in range(len(date))]
+    radii = [scale[x]/5 for x in range(len(points))]
+
+    return center, points, radii
+
+def base_outline(date, tolerance=TOLERANCE):
+    """
+    Calcula localmente, com o módulo outline, o contorno base da flor na
+    dimensão de referência: a união dos círculos das pétalas com os
+    polígonos tangentes, com as pontas anguladas arredondadas. Os cantos
+    cujo arredondamento ficaria a menos de TOLERANCE do canto são
+    mantidos. O contorno depende apenas da data e é retornado como os
+    segmentos do outline.flower_outline.
+    """
+    center, points, radii = PetalCircles(date, REFERENCE)
+    centers = [[point.X, point.Y] for point in points]
+
+    return flower_outline(centers, radii, center.Radius,
+                          [REFERENCE/100, REFERENCE/200], tolerance)
+
+def compute_outline(date, tolerance=TOLERANCE):
+    """
+    Calcula pelo Rhino.Compute o contorno base da flor na dimensão de
+    referência, o mesmo do base_outline: a união dos círculos das pétalas
+    com os polígonos tangentes, com as pontas anguladas arredondadas.
+    Retorna o contorno como uma curva do rhino3dm.
+    """
+    client = compute.connect()
+    size = REFERENCE
 
     # Cria os círculos que compõem as pétalas da flor
-    circles = [r3dm.Circle(points[x], scale[x]/5) for x in range(len(points))]
-    plines = [GetTangentCurves(center, circles[x]) for x in range(len(circles))]
+    center, points, radii = PetalCircles(date, size)
+    circles = [r3dm.Circle(points[x], radii[x]) 
+               for x in range(len(points))]
+
+    # Calcula as intersecções auxiliares de todas as pétalas em uma
+    # única requisição e cria os polígonos tangentes
+    aux = [GetTangentCircles(center, circle) for circle in circles]
+    tol = [tolerance] * len(aux)
+    inter = client.batch(Intersection.CurveCurve, [a[0] for a in aux], 
+                         [a[1] for a in aux], tol, tol)
+    plines = [GetTangentCurves(center, circles[x], inter[x]) 
+              for x in range(len(circles))]
 
     # Cria a união das curvas produzidas, fazendo a forma base da flor
     objects = [center.ToNurbsCurve()]
@@ -200,8 +260,47 @@ def draw_geometry(date, loc, size, text, color, id):
     flower = Curve.CreateBooleanUnion(objects)[0]
 
     # Arredonda as pontas anguladas da geometria
-    flower = Curve.CreateFilletCornersCurve(flower, size/100, 0.001, 0.001)
-    flower = Curve.CreateFilletCornersCurve(flower, size/200, 0.001, 0.001)
+    flower = Curve.CreateFilletCornersCurve(flower, size/100, tolerance,
+                                            tolerance)
+    flower = Curve.CreateFilletCornersCurve(flower, size/200, tolerance,
+                                            tolerance)
+
+    return flower
+
+def flower_shape(date, loc, blend, kernel='compute', tweening='compute',
+                 tolerance=TOLERANCE):
+    """
+    Cria a geometria da flor, que depende apenas da data, da localização
+    e da quantidade de passos entre as cores, na dimensão de referência
+    REFERENCE. Todas as medidas da flor são proporcionais à dimensão da
+    arte, e a geometria é instanciada nas outras dimensões por uma escala
+    no plano XY (veja draw_geometry).
+    O contorno base da flor é calculado localmente pelo módulo outline
+    quando kernel='local', ou pelo Rhino.Compute quando kernel='compute'.
+    Da mesma forma, as curvas intermediárias são criadas pelo módulo tween
+    quando tweening='local', ou pelo Rhino.Compute quando
+    tweening='compute'.
+    TOLERANCE é a tolerância das intersecções, dos arredondamentos e das
+    curvas intermediárias.
+    Retorna as curvas da layer 'Arte', da curva superior à inferior, e as
+    curvas de sobreposição, já centralizadas na origem.
+    """
+    # Inicializa o cliente do servidor do Rhino.Compute
+    compute.connect()
+
+    # Cria as dimensões básicas para a geração da arte
+    origin = r3dm.Point3d(0, 0, 0)
+
+    if kernel == 'local':
+        # Busca o contorno base da flor no atlas de datas, ou o calcula
+        # localmente caso a data não esteja no atlas ou o atlas tenha outra
+        # tolerância
+        segments = lookup_outline(date, tolerance)
+        if segments is None:
+            segments = base_outline(date, tolerance)
+        flower = to_curve(segments)
+    else:
+        flower = compute_outline(date, tolerance)
 
     # Rotaciona a geometria de base de acordo com os valores de latitude e
     # longitude obtidos
@@ -220,11 +319,128 @@ def draw_geometry(date, loc, size, text, color, id):
 
     # Ajusta o ponto de início da curva inferior
     point_on_flower = flower.PointAt(param_on_flower)
-    param_on_backfl = Curve.ClosestPoint(backfl, point_on_flower)[1]
+    param_on_backfl = closest_point(backfl, point_on_flower)[1]
     backfl.ChangeClosedCurveSeam(param_on_backfl)
 
     # Cria as curvas intermediárias entre as duas bases
-    tween = Curve.CreateTweenCurvesWithMatching(flower, backfl, blend)
+    if tweening == 'local':
+        tween = tween_curves(flower, backfl, blend, tolerance)
+    elif tolerance == TOLERANCE:
+        tween = Curve.CreateTweenCurvesWithMatching(flower, backfl, blend)
+    else:
+        # Outras tolerâncias utilizam a variante com a tolerância explícita,
+        # e a de produção mantém a tolerância do documento do Rhino.Compute
+        tween = Curve.CreateTweenCurvesWithMatching1(flower, backfl, blend,
+                                                     tolerance)
+
+    # Organiza as curvas da arte e projeta as curvas de sobreposição ao
+    # plano superior
+    curves = [flower] + list(tween) + [backfl]
+    top_plane = r3dm.Plane(r3dm.Point3d(0, 0, 10), Z_AXIS)
+    overlay = [project_to_plane(flower, top_plane),
+               project_to_plane(backfl, top_plane)]
+    for curve in tween:
+        overlay.append(project_to_plane(curve, top_plane))
+
+    # Calcula o ponto central do conjunto das curvas
+    box1 = bounding_box(flower)
+    box2 = bounding_box(backfl)
+    corners = GetCorners([box1.Min, box2.Min, box1.Max, box2.Max])
+    bbox = r3dm.BoundingBox(corners[0], corners[1])
+
+    # Cria o vetor de transformação das geometrias
+    vec = r3dm.Vector3d(-bbox.Center.X, -bbox.Center.Y, -2.5)
+    move_center = r3dm.Transform.Translation(vec)
+
+    # Move as curvas de acordo com o vetor de transformação
+    for curve in curves + overlay:
+        curve.Transform(move_center)
+
+    return curves, overlay
+
+def write_shape(shape, filename):
+    """
+    Salva a geometria criada pelo flower_shape em um arquivo 3DM, com as
+    curvas da arte na layer 0 e as de sobreposição na layer 1.
+    """
+    model = r3dm.File3dm()
+    model.Settings.ModelUnitSystem = r3dm.UnitSystem.Centimeters
+    model.Layers.AddLayer('Arte', (0, 0, 0, 255))
+    model.Layers.AddLayer('Curvas', (0, 0, 0, 255))
+    for index in range(2):
+        att = r3dm.ObjectAttributes()
+        att.LayerIndex = index
+        for curve in shape[index]:
+            model.Objects.AddCurve(curve, att)
+    model.Write(filename)
+
+    return filename
+
+def read_shape(filename):
+    """
+    Carrega a geometria salva pelo write_shape.
+    """
+    shape = ([], [])
+    for object in r3dm.File3dm.Read(filename).Objects:
+        shape[object.Attributes.LayerIndex].append(object.Geometry)
+
+    return shape
+
+def draw_geometry(date, loc, size, text, color, id, kernel='compute',
+                  tweening='compute', shape=None, write=True,
+                  tolerance=TOLERANCE, text_tolerance=TEXT_TOLERANCE):
+    """
+    Cria o arquivo 3DM com a geometria necessária para a arte,
+    utilizando as funcões do rhino3dm e do Rhino.Compute.
+    A geometria da flor (veja flower_shape) pode ser fornecida em SHAPE,
+    já calculada para outro pedido ou outra dimensão da mesma arte. Apenas
+    o texto e as molduras são criados para cada dimensão.
+    Essa função retorna o nome do arquivo 3DM após a finalização
+    de todas as operações. Com WRITE=False, o modelo não é salvo e o
+    próprio rhino3dm.File3dm é retornado, para ser transferido em memória
+    ao artist.Session.
+    TOLERANCE é a tolerância da geometria da flor (veja flower_shape) e
+    TEXT_TOLERANCE a do contorno do texto.
+    """
+    # Inicializa o cliente do servidor do Rhino.Compute
+    compute.connect()
+
+    # Organiza as cores para referenciação nas layers, com o valor Alpha
+    # das curvas de sobreposição em uma cópia da cor, sem alterar as cores
+    # recebidas, que são reutilizadas nas outras dimensões e na pintura
+    crv_color = tuple(color[0][0][:3]) + (122,)
+    blend = color[1]
+
+    # Cria o arquivo 3DM em que serão feitas as operações
+    model = r3dm.File3dm()
+    model.Settings.ModelUnitSystem = r3dm.UnitSystem.Centimeters
+
+    # Cria as layers base da arte
+    model.Layers.AddLayer('Arte', (0, 0, 0, 255))
+    model.Layers.AddLayer('Texto', (210, 210, 210, 255))
+    model.Layers.AddLayer('Curvas', crv_color)
+    model.Layers.FindName('Curvas', 0).PlotColor = crv_color
+    model.Layers.FindName('Curvas', 0).PlotWeight = size/200
+
+    # Cria as layers base de visualização
+    model.Layers.AddLayer('ViewFrame', (255, 255, 255, 255))
+    model.Layers.AddLayer('PrintFrame', (255, 255, 255, 255))
+
+    # Cria as dimensões básicas para a geração da arte
+    bleed = 5.0
+    margin = size * 0.05
+
+    # Cria a geometria da flor na dimensão de referência
+    if shape is None:
+        shape = flower_shape(date, loc, blend, kernel, tweening, tolerance)
+    curves, overlay = shape
+
+    # Cria a escala no plano XY da dimensão de referência para a dimensão
+    # da arte, mantendo as alturas das curvas
+    factor = size/REFERENCE
+    resize = r3dm.Transform(1.0)
+    resize.M00 = factor
+    resize.M11 = factor
 
     # Agrupa as geometrias para alinhamento com o quadro
     model.Groups.Add(r3dm.Group())
@@ -232,44 +448,25 @@ def draw_geometry(date, loc, size, text, color, id):
     att = r3dm.ObjectAttributes()
     att.LayerIndex = 0
     att.AddToGroup(0)
-    model.Objects.AddCurve(flower, att)
-    for curve in tween:
+    for curve in curves:
+        curve = curve.Duplicate()
+        curve.Transform(resize)
         model.Objects.AddCurve(curve, att)
-    model.Objects.AddCurve(backfl, att)
 
-    # Projeta as curvas de sobreposição ao plano superior
-    top_plane = r3dm.Plane(r3dm.Point3d(0, 0, 10), Z_AXIS)
-    project = []
-    project.append(Curve.ProjectToPlane(flower, top_plane))
-    project.append(Curve.ProjectToPlane(backfl, top_plane))
-    for curve in tween:
-        project.append(Curve.ProjectToPlane(curve, top_plane))
-    
     # Adiciona as curvas de sobreposição ao modelo
     satt = r3dm.ObjectAttributes()
     satt.LayerIndex = 2
-    for curve in project:
+    for curve in overlay:
+        curve = curve.Duplicate()
+        curve.Transform(resize)
         model.Objects.AddCurve(curve, satt)
 
-    # Calcula o ponto central do conjunto das curvas
-    box1 = GeometryBase.GetBoundingBox(flower, True)
-    box2 = GeometryBase.GetBoundingBox(backfl, True)
-    corners = GetCorners([box1.Min, box2.Min, box1.Max, box2.Max])
-    bbox = r3dm.BoundingBox(corners[0], corners[1])
-
-    # Cria o vetor de transformação das geometrias
-    vec = r3dm.Vector3d(-bbox.Center.X, -bbox.Center.Y, -2.5)
-    move_center = r3dm.Transform.Translation(vec)
-
-    # Move os objetos de acordo com o vetor de transformação
-    for object in model.Objects:
-        object.Geometry.Transform(move_center)
-    
     # Cria o texto da arte de acordo com os textos recebidos
     pln_txt = r3dm.Plane(r3dm.Point3d((-size/2) + margin/2, 
                                       (-size/2) + margin/2, 0), Z_AXIS)
     crv_txt = Curve.CreateTextOutlines(text, 'Arial', 
-                                       0.3, 0, True, pln_txt, 1.0, 0.01)
+                                       0.3, 0, True, pln_txt, 1.0,
+                                       text_tolerance)
 
     # Cria a moldura da arte de acordo com as dimensões recebidas
     f1 = r3dm.Point3d(size/2, size/2, 0.0)
@@ -301,6 +498,10 @@ def draw_geometry(date, loc, size, text, color, id):
     patt.LayerIndex = 4
     model.Objects.AddCurve(print_frame.ToNurbsCurve(), patt)
 
+    # Retorna o modelo em memória, sem salvá-lo
+    if not write:
+        return model
+
     # Salva o arquivo 3DM após todas as operações serem finalizadas
     filename = getcwd() + "\\3DM\\" + id + '.3dm'
     model.Write(filename)
@@ -0,0 +1,120 @@
+# import_bench.py
+#
+# Mede o tempo de inicialização a frio dos caminhos que não dependem do
+# Rhino: a validação de pedidos (dress_flower.load_input e
+# colors.color_table) e as importações do app antes de abrir a janela.
+# Cada medição é feita em um novo interpretador, e a mediana é comparada
+# com o limite de cada caminho. Também avalia se nenhum módulo pesado
+# (Rhino, rhino3dm, Rhino.Compute, geopy, NumPy) foi carregado.
+# Retorna um código de saída diferente de zero caso algum caminho passe
+# do limite, para ser utilizado na integração contínua.
+#
+# Uso: python -m import_bench [-n REPETIÇÕES] [--validacao SEGUNDOS]
+#                             [--interface SEGUNDOS]
+#
+
+import argparse
+import ast
+import json
+import statistics
+import subprocess
+import sys
+from os import path
+
+BASE = path.dirname(path.abspath(__file__))
+
+# Limites da mediana do tempo de importação, em segundos
+BUDGETS = {'validação': 0.25, 'interface': 0.75}
+
+# Módulos que não devem ser carregados na inicialização
+HEAVY = ('rhinoinside', 'clr', 'Rhino', 'System', 'rhino3dm',
+         'compute_rhino3d', 'requests', 'geopy', 'numpy')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'segundos': elapsed,
+                  'pesados': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def app_imports():
+    """
+    Coleta as importações do nível superior do app.py, cada uma protegida
+    contra módulos disponíveis apenas no Windows.
+    """
+    with open(path.join(BASE, 'app.py'), encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append('try:\n    {}\nexcept ImportError:\n    pass'
+                         .format(ast.unparse(node)))
+
+    return '\n'.join(lines)
+
+def paths():
+    """
+    Retorna o código de importação de cada caminho medido.
+    """
+    return {
+        'validação': 'from dress_flower import load_input\n'
+                     'from colors import color_table',
+        'interface': app_imports()
+    }
+
+def measure(imports, repeat=5):
+    """
+    Mede a importação em REPEAT novos interpretadores. Retorna a mediana
+    do tempo, em segundos, e os módulos pesados carregados. Levanta um
+    RuntimeError caso a importação falhe.
+    """
+    code = PROBE.format(imports=imports, heavy=HEAVY)
+    times, heavy = [], set()
+    for x in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=BASE,
+                                capture_output=True, text=True)
+        if output.returncode != 0:
+            lines = output.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else 'erro desconhecido')
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        times.append(result['segundos'])
+        heavy.update(result['pesados'])
+
+    return statistics.median(times), sorted(heavy)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m import_bench',
+        description='Mede o tempo de inicialização a frio sem o Rhino.')
+    parser.add_argument('-n', '--repeticoes', type=int, default=5,
+                        help='interpretadores por caminho (padrão: 5)')
+    parser.add_argument('--validacao', type=float,
+                        default=BUDGETS['validação'],
+                        help='limite do caminho de validação, em segundos')
+    parser.add_argument('--interface', type=float,
+                        default=BUDGETS['interface'],
+                        help='limite do caminho da interface, em segundos')
+    args = parser.parse_args(argv)
+    budgets = {'validação': args.validacao, 'interface': args.interface}
+
+    failed = False
+    for name, imports in paths().items():
+        try:
+            seconds, heavy = measure(imports, args.repeticoes)
+        except RuntimeError as error:
+            failed = True
+            print('{:<10} falhou: {}'.format(name, error))
+            continue
+        ok = seconds <= budgets[name] and not heavy
+        failed |= not ok
+        print('{:<10} {:8.1f} ms (limite {:.0f} ms) {}{}'.format(
+            name, seconds * 1000, budgets[name] * 1000,
+            'ok' if ok else 'REGRESSÃO',
+            ' carregou: ' + ', '.join(heavy) if heavy else ''))
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
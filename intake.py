@@ -0,0 +1,186 @@
+# intake.py
+#
+# Entrada de pedidos em lote. Lê um fluxo de pedidos em NDJSON ou CSV,
+# valida todos os registros em uma única passagem, sem Rhino e sem rede,
+# e grava um fluxo NDJSON normalizado com os pedidos válidos, pronto para
+# o batch, e um relatório com os pedidos rejeitados.
+#
+# Uso: python -m intake ENTRADA [-s SAÍDA] [-r REJEITADOS] [--somente-cache]
+#
+
+import argparse
+import csv
+import json
+import random
+import re
+import string
+import time
+from os import getcwd, path
+from validation import FIELDS, check_input
+
+# IDs de pedido aceitos no fluxo: utilizados como nomes dos arquivos do
+# pedido (JSON/<id>.json, 3DM/<id>.3dm etc.)
+ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+def _coerce(value):
+    """
+    Converte valores numéricos em texto (como nas colunas de um CSV, ou
+    '31x31' no caso das dimensões) para números inteiros.
+    """
+    if type(value) == str:
+        text = value.strip().split('x')[0].strip()
+        if text.isdigit():
+            return int(text)
+    return value
+
+def normalize(record):
+    """
+    Normaliza um registro de pedido: remove espaços extras dos textos e
+    converte dimensões e cores para números inteiros.
+    """
+    order = {}
+    for field in FIELDS:
+        if field not in record:
+            continue
+        value = record[field]
+        if field in ('dimensões', 'cores'):
+            value = _coerce(value)
+        elif type(value) == str:
+            value = value.strip()
+        order[field] = value
+
+    return order
+
+def read_records(file, fmt):
+    """
+    Lê os registros de um fluxo NDJSON ou CSV, retornando pares
+    (linha, registro). Linhas que não podem ser lidas retornam a exceção
+    no lugar do registro.
+    """
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(file), start=2):
+            yield number, row
+        return
+
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('O registro não é um objeto JSON.')
+        except ValueError as error:
+            record = error
+        yield number, record
+
+def new_id(taken, directory=None):
+    """
+    Cria um ID aleatório de 10 letras, no mesmo formato do app, que ainda
+    não tenha sido utilizado: que não esteja em TAKEN e que não tenha um
+    pedido salvo na pasta DIRECTORY, por padrão a pasta JSON.
+    """
+    directory = directory or path.join(getcwd(), 'JSON')
+    letters = string.ascii_lowercase
+    while True:
+        id = ''.join(random.choice(letters) for i in range(10))
+        if id not in taken and \
+                not path.exists(path.join(directory, id + '.json')):
+            return id
+
+def check_id(id, taken, directory=None):
+    """
+    Avalia se o ID fornecido no fluxo pode ser utilizado: se contém apenas
+    letras, números, '-' e '_', se não se repete no fluxo (TAKEN) e se não
+    tem um pedido salvo na pasta DIRECTORY, por padrão a pasta JSON.
+    Levanta um ValueError caso contrário.
+    """
+    directory = directory or path.join(getcwd(), 'JSON')
+    if not ID_PATTERN.fullmatch(id):
+        raise ValueError('ID de pedido inválido: ' + id)
+    if id in taken:
+        raise ValueError('ID de pedido repetido: ' + id)
+    if path.exists(path.join(directory, id + '.json')):
+        raise ValueError('ID de pedido já utilizado: ' + id)
+
+def intake(file, output, rejects, fmt='ndjson', cache_only=False,
+           directory=None):
+    """
+    Valida todos os pedidos do fluxo FILE, gravando os válidos em OUTPUT
+    e os rejeitados em REJECTS, ambos em NDJSON. Com CACHE_ONLY, pedidos
+    cuja localização não está no cache de geolocalização são rejeitados.
+    Os IDs são avaliados em relação aos pedidos salvos na pasta
+    DIRECTORY, por padrão a pasta JSON (veja check_id). Retorna o resumo
+    da validação.
+    """
+    if cache_only:
+        from geolocation import get_cache
+        cache = get_cache()
+
+    start = time.perf_counter()
+    taken = set()
+    accepted = rejected = 0
+    for number, record in read_records(file, fmt):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            order = normalize(record)
+            check_input(order)
+
+            # Avalia se o ID fornecido é válido e ainda não foi utilizado,
+            # ou cria um novo ID
+            id = str(record.get('id') or '').strip()
+            if id:
+                check_id(id, taken, directory)
+            else:
+                id = new_id(taken, directory)
+
+            # Avalia se a localização pode ser resolvida localmente
+            if cache_only and cache.get(order['cidade'], order['estado'],
+                                        order['pais']) is None:
+                raise ValueError('Localização não encontrada no cache.')
+        except (ValueError, TypeError) as error:
+            rejected += 1
+            rejects.write(json.dumps({
+                'linha': number,
+                'erro': str(error),
+                'registro': record if isinstance(record, dict) else None
+            }, ensure_ascii=False) + '\n')
+            continue
+
+        taken.add(id)
+        accepted += 1
+        output.write(json.dumps(dict(id=id, **order),
+                                ensure_ascii=False) + '\n')
+
+    elapsed = time.perf_counter() - start
+
+    return {'aceitos': accepted, 'rejeitados': rejected,
+            'segundos': round(elapsed, 3)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m intake',
+        description='Valida e normaliza um fluxo de pedidos em lote.')
+    parser.add_argument('entrada', help='arquivo NDJSON ou CSV de pedidos')
+    parser.add_argument('-s', '--saida', default='pedidos.ndjson',
+                        help='fluxo NDJSON de pedidos válidos')
+    parser.add_argument('-r', '--rejeitados', default='rejeitados.ndjson',
+                        help='relatório NDJSON de pedidos rejeitados')
+    parser.add_argument('-f', '--formato', choices=('ndjson', 'csv'),
+                        help='formato da entrada (padrão: pela extensão)')
+    parser.add_argument('--somente-cache', action='store_true',
+                        help='rejeita localizações fora do cache local')
+    args = parser.parse_args(argv)
+
+    fmt = args.formato or ('csv' if args.entrada.endswith('.csv')
+                           else 'ndjson')
+    with open(args.entrada, encoding='utf-8', newline='') as file, \
+         open(args.saida, 'w', encoding='utf-8') as output, \
+         open(args.rejeitados, 'w', encoding='utf-8') as rejects:
+        summary = intake(file, output, rejects, fmt, args.somente_cache)
+    print(json.dumps(summary, ensure_ascii=False, indent=4))
+
+    return summary
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+# job_server.py
+#
+# Servidor HTTP local para a entrada de pedidos pela loja virtual. Recebe
+# os pedidos em JSON, no mesmo esquema lido pelo dress_flower.load_input,
+# valida os valores sem o Rhino e retorna o ID do pedido imediatamente.
+# Os pedidos são renderizados por um conjunto limitado de processos, em
+# ordem de prioridade (prévias antes dos arquivos de produção), com a
+# predefinição de qualidade de mesmo nome (veja quality), e a fila
+# tem um tamanho máximo: quando está cheia, novos pedidos são recusados
+# com 503 e Retry-After. Os registros dos pedidos concluídos são
+# descartados após um tempo ou acima de uma quantidade máxima; os
+# arquivos gerados permanecem nas pastas de saída.
+#
+# Rotas:
+#   POST /pedidos                  cria um pedido (?prioridade=previa)
+#   GET  /pedidos/<id>             estado do pedido
+#   GET  /pedidos/<id>/<formato>   arquivo gerado (jpeg, png, svg, pdf ou 3dm)
+#   GET  /pedidos/<id>/imagens/... arquivo das imagens da loja virtual
+#                                  (manifest.json por padrão)
+#   GET  /estado                   estado do servidor
+#
+# Uso: python -m job_server [-p PORTA] [-w PROCESSOS] [-f FILA]
+#                           [-t SEGUNDOS] [-c CONCLUÍDOS]
+#
+
+import argparse
+import collections
+import itertools
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import getcwd, path
+from urllib.parse import parse_qs, urlparse
+from batch import init_worker, render_order
+from intake import new_id, normalize
+from validation import check_input
+
+# Prioridade de cada tipo de pedido, renderizado com a predefinição de
+# qualidade e os formatos de saída de mesmo nome
+PRIORITIES = {
+    'previa': 0,
+    'producao': 1
+}
+
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+    '3dm': 'application/octet-stream',
+    'json': 'application/json',
+    'dzi': 'application/xml'
+}
+
+class JobQueue:
+    """
+    Fila de pedidos com prioridade, tamanho máximo e o estado dos pedidos
+    recebidos. Cada um dos WORKERS processos de renderização é alimentado
+    por uma thread, de modo que nunca há mais pedidos em execução do que
+    processos. Os pedidos concluídos ou que falharam são mantidos por TTL
+    segundos, até um máximo de MAX_FINISHED pedidos.
+    """
+    def __init__(self, workers=2, max_queued=32, ttl=3600,
+                 max_finished=1000):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._finished = collections.deque()
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(workers, initializer=init_worker)
+        self._threads = [threading.Thread(target=self._dispatch, daemon=True)
+                         for x in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, order, priority='producao'):
+        """
+        Valida e coloca um pedido na fila. Retorna o registro do pedido.
+        Levanta um ValueError ou TypeError para pedidos inválidos e um
+        queue.Full quando a fila está cheia.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError('Prioridade desconhecida: ' + str(priority))
+        order = normalize(order)
+        check_input(order)
+
+        with self._lock:
+            self._expire()
+            if self._queue.qsize() >= self.max_queued:
+                raise queue.Full()
+            id = new_id(self.jobs)
+            job = {'id': id, 'status': 'na fila', 'prioridade': priority,
+                   'recebido': time.time()}
+            self.jobs[id] = job
+            self._queue.put((PRIORITIES[priority], next(self._order), id,
+                             order, priority))
+
+        # Guarda o pedido com o mesmo formato do app
+        with open(path.join(getcwd(), 'JSON', id + '.json'), 'w',
+                  encoding='utf-8') as file:
+            json.dump(order, file, indent=4, ensure_ascii=False)
+
+        return dict(job)
+
+    def _dispatch(self):
+        """
+        Envia os pedidos da fila, em ordem de prioridade, a um processo de
+        renderização e registra o resultado.
+        """
+        while True:
+            rank, _, id, order, quality = self._queue.get()
+            with self._lock:
+                self.jobs[id]['status'] = 'em execução'
+                self.jobs[id]['início'] = time.time()
+            try:
+                record = self._pool.submit(render_order, id, order,
+                                           quality=quality).result()
+            except Exception as error:
+                record = {'status': 'erro',
+                          'erro': '{}: {}'.format(type(error).__name__,
+                                                  error)}
+            with self._lock:
+                job = self.jobs[id]
+                job['status'] = 'concluído' if record['status'] == 'ok' \
+                                else 'falhou'
+                job['fim'] = time.time()
+                job['saídas'] = record.get('saídas') or {}
+                if 'erro' in record:
+                    job['erro'] = record['erro']
+                self._finished.append(id)
+                self._expire()
+
+    def _expire(self):
+        """
+        Descarta os registros dos pedidos concluídos há mais de TTL
+        segundos e os mais antigos acima de MAX_FINISHED. Deve ser chamada
+        com a trava da fila.
+        """
+        limit = time.time() - self.ttl
+        while self._finished and (
+                len(self._finished) > self.max_finished or
+                self.jobs[self._finished[0]]['fim'] < limit):
+            del self.jobs[self._finished.popleft()]
+
+    def get(self, id):
+        """
+        Retorna uma cópia do registro de um pedido, ou None.
+        """
+        with self._lock:
+            job = self.jobs.get(id)
+            return dict(job) if job is not None else None
+
+    def status(self):
+        """
+        Retorna o estado da fila.
+        """
+        with self._lock:
+            self._expire()
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {'processos': self.workers, 'na fila': self._queue.qsize(),
+                'limite da fila': self.max_queued, 'pedidos': counts}
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Rotas do servidor de pedidos.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body, content_type='application/json',
+              headers=()):
+        if content_type == 'application/json' and \
+           not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/pedidos':
+            return self._send(404, {'erro': 'Rota não encontrada.'})
+        size = int(self.headers.get('Content-Length', 0))
+        priority = parse_qs(url.query).get('prioridade', ['producao'])[0]
+        try:
+            order = json.loads(self.rfile.read(size))
+            if not isinstance(order, dict):
+                raise ValueError('O pedido não é um objeto JSON.')
+            job = self.server.jobs.submit(order, priority)
+        except queue.Full:
+            return self._send(503, {'erro': 'A fila de pedidos está cheia.'},
+                              headers=[('Retry-After', '30')])
+        except (ValueError, TypeError) as error:
+            return self._send(400, {'erro': str(error)})
+
+        self._send(202, job, headers=[('Location', '/pedidos/' + job['id'])])
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        if parts == ['estado']:
+            return self._send(200, self.server.jobs.status())
+        if len(parts) < 2 or parts[0] != 'pedidos':
+            return self._send(404, {'erro': 'Rota não encontrada.'})
+
+        job = self.server.jobs.get(parts[1])
+        if job is None:
+            return self._send(404, {'erro': 'Pedido não encontrado.'})
+        if len(parts) == 2:
+            return self._send(200, job)
+
+        # Envia o arquivo gerado no formato pedido, ou um arquivo da pasta
+        # das imagens da loja virtual, sem sair da pasta
+        filename = job.get('saídas', {}).get(parts[2])
+        kind = parts[2]
+        if isinstance(filename, str) and path.isdir(filename):
+            name = path.normpath(path.join(filename,
+                                           *(parts[3:] or ['manifest.json'])))
+            filename = name if name.startswith(path.join(filename, '')) \
+                       else None
+            kind = path.splitext(name)[1][1:]
+        elif len(parts) > 3:
+            filename = None
+        if not isinstance(filename, str) or not path.isfile(filename):
+            return self._send(404, {'erro': 'Arquivo não disponível.'})
+        with open(filename, 'rb') as file:
+            data = file.read()
+        self._send(200, data, CONTENT_TYPES.get(kind,
+                                                'application/octet-stream'))
+
+    def log_message(self, format, *args):
+        return
+
+class JobServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP de pedidos com a sua fila de renderização.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=8150, workers=2, max_queued=32,
+                 host='127.0.0.1', ttl=3600, max_finished=1000):
+        super().__init__((host, port), _Handler)
+        self.jobs = JobQueue(workers, max_queued, ttl, max_finished)
+
+    def server_close(self):
+        super().server_close()
+        self.jobs.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m job_server',
+        description='Servidor HTTP local de pedidos.')
+    parser.add_argument('-p', '--porta', type=int, default=8150,
+                        help='porta do servidor (padrão: 8150)')
+    parser.add_argument('-w', '--processos', type=int, default=2,
+                        help='processos de renderização (padrão: 2)')
+    parser.add_argument('-f', '--fila', type=int, default=32,
+                        help='pedidos na fila antes de recusar novos')
+    parser.add_argument('-t', '--ttl', type=int, default=3600,
+                        help='segundos em que os pedidos concluídos são '
+                             'mantidos (padrão: 3600)')
+    parser.add_argument('-c', '--concluidos', type=int, default=1000,
+                        help='pedidos concluídos mantidos (padrão: 1000)')
+    args = parser.parse_args(argv)
+
+    server = JobServer(args.porta, args.processos, args.fila,
+                       ttl=args.ttl, max_finished=args.concluidos)
+    print('Servidor de pedidos em http://127.0.0.1:{}/'.format(args.porta))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
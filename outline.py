@@ -0,0 +1,421 @@
+# outline.py
+#
+# Calcula analiticamente o contorno base da flor (círculo central, pétalas,
+# tangentes externas, união e arredondamento dos cantos) com NumPy, sem
+# depender do servidor do Rhino.Compute. O contorno é descrito por uma
+# lista de segmentos de reta e arcos e pode ser convertido em uma curva
+# do rhino3dm para ser utilizada diretamente em geometry.draw_geometry.
+#
+
+import math
+import numpy as np
+import rhino3dm as r3dm
+
+TWO_PI = 2 * math.pi
+
+def _cross(a, b):
+    """
+    Calcula o produto vetorial 2D (componente Z) entre vetores.
+    """
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+def _polar(point):
+    """
+    Retorna o ângulo polar, em [0, 2π), de um ponto em relação à origem.
+    """
+    return math.atan2(point[1], point[0]) % TWO_PI
+
+def _sweep(a0, a1):
+    """
+    Retorna o ângulo percorrido no sentido anti-horário de A0 até A1.
+    """
+    return (a1 - a0) % TWO_PI
+
+def tangent_segments(center_radius, centers, radii):
+    """
+    Calcula as duas retas tangentes externas entre o círculo central,
+    posicionado na origem, e cada um dos círculos das pétalas.
+    Retorna dois arrays (N, 2, 2) com os pontos de início e fim de cada
+    tangente, o primeiro sobre o círculo central e o segundo sobre a pétala.
+    """
+    # Calcula a direção e a distância de cada pétala até a origem
+    dist = np.linalg.norm(centers, axis=1)
+    u = centers / dist[:, None]
+    u_perp = np.stack([-u[:, 1], u[:, 0]], axis=1)
+
+    # Calcula o ângulo entre a normal da tangente e a direção da pétala
+    cos_a = (center_radius - radii) / dist
+    sin_a = np.sqrt(1 - cos_a ** 2)
+
+    # Cria as tangentes de cada lado da pétala
+    segments = []
+    for side in (1, -1):
+        normal = u * cos_a[:, None] + side * u_perp * sin_a[:, None]
+        start = center_radius * normal
+        end = centers + radii[:, None] * normal
+        segments.append(np.stack([start, end], axis=1))
+
+    return segments[0], segments[1]
+
+def _ray_hits(angles, circles, segments):
+    """
+    Calcula, para cada ângulo, a distância até a origem do ponto mais
+    afastado de cada primitiva (círculos e segmentos) atingido pelo raio.
+    Retorna uma matriz (ângulos x primitivas), com -inf onde não há
+    intersecção.
+    """
+    u = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+    # Intersecção dos raios com os círculos
+    centers, radii = circles
+    b = u @ centers.T
+    disc = b ** 2 - np.sum(centers ** 2, axis=1) + radii ** 2
+    with np.errstate(invalid='ignore'):
+        t_circle = b + np.sqrt(disc)
+    t_circle = np.where((disc >= 0) & (t_circle > 0), t_circle, -np.inf)
+
+    # Intersecção dos raios com os segmentos de reta
+    a = segments[:, 0]
+    ab = segments[:, 1] - segments[:, 0]
+    denom = u[:, None, 0] * ab[None, :, 1] - u[:, None, 1] * ab[None, :, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_seg = _cross(a, ab)[None, :] / denom
+        s_seg = (a[None, :, 0] * u[:, None, 1] -
+                 a[None, :, 1] * u[:, None, 0]) / denom
+    valid = (np.abs(denom) > 1e-15) & (s_seg >= -1e-12) & \
+            (s_seg <= 1 + 1e-12) & (t_seg > 0)
+    t_seg = np.where(valid, t_seg, -np.inf)
+
+    return np.concatenate([t_circle, t_seg], axis=1)
+
+def _break_angles(circles, segments):
+    """
+    Calcula os ângulos polares em que a primitiva mais externa pode mudar:
+    extremidades dos segmentos, tangências dos raios com os círculos e
+    intersecções entre todas as primitivas.
+    """
+    centers, radii = circles
+    angles = [np.arctan2(segments[..., 1], segments[..., 0]).ravel()]
+
+    # Ângulos em que o raio tangencia cada círculo fora da origem
+    dist = np.linalg.norm(centers, axis=1)
+    outer = dist > radii
+    phi = np.arctan2(centers[outer, 1], centers[outer, 0])
+    half = np.arcsin(radii[outer] / dist[outer])
+    angles += [phi - half, phi + half]
+
+    # Intersecções círculo-círculo
+    i, j = np.triu_indices(len(radii), 1)
+    d_vec = centers[j] - centers[i]
+    d = np.linalg.norm(d_vec, axis=1)
+    ok = (d < radii[i] + radii[j]) & (d > np.abs(radii[i] - radii[j]))
+    i, j, d_vec, d = i[ok], j[ok], d_vec[ok], d[ok]
+    a = (radii[i] ** 2 - radii[j] ** 2 + d ** 2) / (2 * d)
+    h = np.sqrt(np.maximum(radii[i] ** 2 - a ** 2, 0))
+    base = centers[i] + d_vec * (a / d)[:, None]
+    perp = np.stack([-d_vec[:, 1], d_vec[:, 0]], axis=1) / d[:, None]
+    for side in (1, -1):
+        pts = base + side * h[:, None] * perp
+        angles.append(np.arctan2(pts[:, 1], pts[:, 0]))
+
+    # Intersecções círculo-segmento
+    a = segments[None, :, 0] - centers[:, None]
+    ab = (segments[:, 1] - segments[:, 0])[None]
+    qa = np.sum(ab ** 2, axis=2)
+    qb = 2 * np.sum(a * ab, axis=2)
+    qc = np.sum(a ** 2, axis=2) - radii[:, None] ** 2
+    disc = qb ** 2 - 4 * qa * qc
+    for side in (1, -1):
+        with np.errstate(invalid='ignore'):
+            s = (-qb + side * np.sqrt(disc)) / (2 * qa)
+        ok = (disc > 0) & (s > 0) & (s < 1)
+        pts = (segments[None, :, 0] + s[..., None] * ab)[ok]
+        angles.append(np.arctan2(pts[:, 1], pts[:, 0]))
+
+    # Intersecções segmento-segmento
+    i, j = np.triu_indices(len(segments), 1)
+    p, r = segments[i, 0], segments[i, 1] - segments[i, 0]
+    q, s = segments[j, 0], segments[j, 1] - segments[j, 0]
+    denom = _cross(r, s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = _cross(q - p, s) / denom
+        v = _cross(q - p, r) / denom
+    ok = (np.abs(denom) > 1e-15) & (t > 0) & (t < 1) & (v > 0) & (v < 1)
+    pts = p[ok] + t[ok, None] * r[ok]
+    angles.append(np.arctan2(pts[:, 1], pts[:, 0]))
+
+    # Organiza os ângulos, descartando valores praticamente repetidos
+    angles = np.sort(np.concatenate(angles) % TWO_PI)
+    keep = np.concatenate([[True], np.diff(angles) > 1e-12])
+
+    return angles[keep]
+
+def _primitive(index, circles, segments):
+    """
+    Descreve a primitiva de índice fornecido como um dicionário com o seu
+    tipo ('arc' ou 'line') e os dados necessários para o arredondamento.
+    """
+    centers, radii = circles
+    if index < len(radii):
+        return {'type': 'arc', 'center': centers[index],
+                'radius': radii[index], 'side': 1}
+    seg = segments[index - len(radii)]
+    return {'type': 'line', 'point': seg[0], 'direction': seg[1] - seg[0]}
+
+def _hit(primitive, angle):
+    """
+    Calcula o ponto mais afastado da origem em que o raio de ângulo
+    fornecido atinge uma primitiva.
+    """
+    u = np.array([math.cos(angle), math.sin(angle)])
+    if primitive['type'] == 'arc':
+        c, r = primitive['center'], primitive['radius']
+        b = u @ c
+        disc = max(b ** 2 - c @ c + r ** 2, 0)
+        return u * (b + math.sqrt(disc))
+    a, ab = primitive['point'], primitive['direction']
+    return u * (_cross(a, ab) / _cross(u, ab))
+
+def union_boundary(circles, segments):
+    """
+    Calcula o contorno da união dos círculos e dos polígonos tangentes.
+    Todas as regiões contêm a origem e são convexas, portanto a união é
+    estrelada em relação à origem e o seu contorno é o envelope externo das
+    primitivas ao longo dos raios. Retorna a lista de trechos do contorno
+    no sentido anti-horário.
+    """
+    angles = _break_angles(circles, segments)
+
+    # Identifica a primitiva mais externa em cada intervalo entre ângulos
+    ends = np.append(angles[1:], angles[0] + TWO_PI)
+    mids = (angles + ends) / 2
+    owner = np.argmax(_ray_hits(mids, circles, segments), axis=1)
+
+    # Agrupa intervalos consecutivos da mesma primitiva em um único trecho
+    starts = [k for k in range(len(owner)) if owner[k] != owner[k - 1]]
+    if not starts:
+        raise ValueError('O contorno da flor não possui cantos.')
+    pieces = []
+    for n, k in enumerate(starts):
+        primitive = _primitive(owner[k], circles, segments)
+        start = angles[k]
+        end = angles[starts[(n + 1) % len(starts)]]
+        pieces.append(dict(primitive, start=_hit(primitive, start),
+                           end=_hit(primitive, end)))
+
+    # Unifica os pontos de junção entre trechos consecutivos
+    for n in range(len(pieces)):
+        nxt = pieces[(n + 1) % len(pieces)]
+        joint = (pieces[n]['end'] + nxt['start']) / 2
+        pieces[n]['end'] = joint
+        nxt['start'] = joint
+
+    # Orienta as retas de acordo com o sentido de percurso do contorno
+    for piece in pieces:
+        if piece['type'] == 'line' and \
+           piece['direction'] @ (piece['end'] - piece['start']) < 0:
+            piece['direction'] = -piece['direction']
+
+    return pieces
+
+def _tangent(piece, point):
+    """
+    Calcula o vetor tangente unitário de um trecho em um ponto, de acordo
+    com o sentido de percurso do contorno.
+    """
+    if piece['type'] == 'line':
+        d = piece['direction']
+    else:
+        v = (point - piece['center']) * piece['side']
+        d = np.array([-v[1], v[0]])
+    return d / np.linalg.norm(d)
+
+def _offset_centers(a, b, x, radius):
+    """
+    Calcula os possíveis centros do arco de concordância entre os trechos
+    A e B, deslocando cada um deles para fora da região pelo raio fornecido.
+    """
+    # Desloca os trechos para fora da região
+    offsets = []
+    for piece in (a, b):
+        if piece['type'] == 'arc':
+            r = piece['radius'] + piece['side'] * radius
+            offsets.append(('arc', piece['center'], r))
+        else:
+            d = _tangent(piece, x)
+            normal = np.array([d[1], -d[0]])
+            offsets.append(('line', piece['start'] + normal * radius, d))
+
+    # Calcula as intersecções entre os trechos deslocados
+    (ta, pa, qa), (tb, pb, qb) = offsets
+    if ta == 'line' and tb == 'line':
+        denom = _cross(qa, qb)
+        if abs(denom) < 1e-15:
+            return []
+        return [pa + qa * (_cross(pb - pa, qb) / denom)]
+    if ta == 'line':
+        (ta, pa, qa), (tb, pb, qb) = (tb, pb, qb), (ta, pa, qa)
+    if tb == 'line':
+        f = pb - pa
+        a2, b2, c2 = qb @ qb, 2 * (f @ qb), f @ f - qa ** 2
+        disc = b2 ** 2 - 4 * a2 * c2
+        if disc < 0:
+            return []
+        return [pb + qb * ((-b2 + s * math.sqrt(disc)) / (2 * a2))
+                for s in (1, -1)]
+    d_vec = pb - pa
+    d = np.linalg.norm(d_vec)
+    if d == 0 or d > qa + qb or d < abs(qa - qb):
+        return []
+    m = (qa ** 2 - qb ** 2 + d ** 2) / (2 * d)
+    h = math.sqrt(max(qa ** 2 - m ** 2, 0))
+    base = pa + d_vec * (m / d)
+    perp = np.array([-d_vec[1], d_vec[0]]) / d
+    return [base + perp * h, base - perp * h]
+
+def _foot(piece, center, radius):
+    """
+    Calcula o ponto de tangência entre o arco de concordância e um trecho.
+    """
+    if piece['type'] == 'arc':
+        c, r = piece['center'], piece['radius']
+        return c + (center - c) * (r / (r + piece['side'] * radius))
+    d = _tangent(piece, center)
+    normal = np.array([d[1], -d[0]])
+    return center - normal * radius
+
+def _within(point, start, end):
+    """
+    Verifica se um ponto está, em ângulo polar, entre o início e o fim de
+    um trecho do contorno.
+    """
+    a0 = _polar(start)
+    return 0 < _sweep(a0, _polar(point)) <= _sweep(a0, _polar(end)) + 1e-12
+
+def corner_angle(radius, tolerance):
+    """
+    Retorna o ângulo entre as tangentes de um canto abaixo do qual o arco
+    de concordância do raio fornecido fica a menos de TOLERANCE do canto,
+    e o canto pode ser mantido.
+    """
+    return 2 * math.acos(radius / (radius + tolerance))
+
+def fillet_corners(pieces, radius, angle_tolerance=0.001):
+    """
+    Arredonda os cantos do contorno com arcos de concordância do raio
+    fornecido, de forma análoga ao Curve.CreateFilletCornersCurve. Cantos
+    com ângulo entre as tangentes até ANGLE_TOLERANCE, em radianos, e
+    cantos em que o arco não cabe nos trechos vizinhos são mantidos.
+    """
+    pieces = [dict(piece) for piece in pieces]
+    result = []
+    n = 0
+    while n < len(pieces):
+        a = pieces[n]
+        b = pieces[(n + 1) % len(pieces)]
+        x = a['end']
+
+        # Avalia se a junção entre os trechos é um canto
+        ta, tb = _tangent(a, x), _tangent(b, x)
+        if math.acos(np.clip(ta @ tb, -1, 1)) <= angle_tolerance:
+            result.append(a)
+            n += 1
+            continue
+
+        # Escolhe o centro do arco de concordância mais próximo do canto
+        centers = _offset_centers(a, b, x, radius)
+        if not centers:
+            result.append(a)
+            n += 1
+            continue
+        center = min(centers, key=lambda c: np.linalg.norm(c - x))
+        foot_a = _foot(a, center, radius)
+        foot_b = _foot(b, center, radius)
+
+        # Mantém o canto caso o arco não caiba nos trechos vizinhos
+        if not (_within(foot_a, a['start'], x) and
+                _within(foot_b, x, b['end'])):
+            result.append(a)
+            n += 1
+            continue
+
+        # Apara os trechos vizinhos e insere o arco de concordância
+        a['end'] = foot_a
+        b['start'] = foot_b
+        result.append(a)
+        result.append({'type': 'arc', 'center': center, 'radius': radius,
+                       'side': -1, 'start': foot_a, 'end': foot_b})
+        n += 1
+
+    # Atualiza o início do primeiro trecho caso o último canto tenha sido
+    # arredondado
+    result[0]['start'] = result[-1]['end']
+
+    return result
+
+def to_segments(pieces):
+    """
+    Converte os trechos do contorno em um array (N, 3, 2) com os pontos
+    inicial, intermediário e final de cada segmento. Em retas o ponto
+    intermediário é colinear às extremidades.
+    """
+    segments = np.empty((len(pieces), 3, 2))
+    for n, piece in enumerate(pieces):
+        start, end = piece['start'], piece['end']
+        if piece['type'] == 'line':
+            mid = (start + end) / 2
+        else:
+            c, r = piece['center'], piece['radius']
+            a0 = math.atan2(*(start - c)[::-1])
+            a1 = math.atan2(*(end - c)[::-1])
+            if piece['side'] > 0:
+                a_mid = a0 + _sweep(a0, a1) / 2
+            else:
+                a_mid = a0 - _sweep(a1, a0) / 2
+            mid = c + r * np.array([math.cos(a_mid), math.sin(a_mid)])
+        segments[n] = [start, mid, end]
+
+    return segments
+
+def flower_outline(centers, radii, center_radius, fillets, tolerance=0.001):
+    """
+    Calcula o contorno base da flor: a união do círculo central, posicionado
+    na origem, com os círculos das pétalas e os polígonos tangentes entre
+    eles, arredondando os cantos com cada um dos raios fornecidos em ordem.
+    Os cantos cujo arco ficaria a menos de TOLERANCE, nas unidades dos
+    círculos, do próprio canto são mantidos (veja corner_angle).
+    Retorna o contorno como um array de segmentos (veja to_segments).
+    """
+    centers = np.asarray(centers, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+
+    # Cria as primitivas: círculo central, pétalas e tangentes externas
+    circles = (np.vstack([[0.0, 0.0], centers]),
+               np.concatenate([[center_radius], radii]))
+    segments = np.concatenate(tangent_segments(center_radius, centers, radii))
+
+    # Calcula a união e arredonda os cantos
+    pieces = union_boundary(circles, segments)
+    for radius in fillets:
+        pieces = fillet_corners(pieces, radius,
+                                corner_angle(radius, tolerance))
+
+    return to_segments(pieces)
+
+def to_curve(segments, z=0.0):
+    """
+    Converte um array de segmentos em uma PolyCurve fechada do rhino3dm,
+    composta por retas e arcos exatos.
+    """
+    curve = r3dm.PolyCurve()
+    for start, mid, end in segments:
+        p0 = r3dm.Point3d(start[0], start[1], z)
+        p1 = r3dm.Point3d(end[0], end[1], z)
+        chord = np.linalg.norm(end - start)
+        if abs(_cross(mid - start, end - start)) <= 1e-9 * chord ** 2:
+            curve.Append(r3dm.Line(p0, p1))
+        else:
+            pm = r3dm.Point3d(mid[0], mid[1], z)
+            curve.Append(r3dm.Arc(p0, pm, p1))
+
+    return curve
@@ -0,0 +1,92 @@
+# preview.py
+#
+# Prévia rápida da arte em baixa resolução, desenhada à partir do modelo
+# 3DM em memória (rhino3dm.File3dm), sem o Rhino. A prévia fica
+# disponível logo após a etapa de geometria, antes da pintura e da
+# exportação do JPEG em alta resolução e do PDF. Também reúne as funções
+# de leitura das curvas do modelo utilizadas pelo rasterizador (raster).
+#
+
+# Amostras por curva ao converter as curvas em polilinhas
+SAMPLES = 96
+
+# Cor do preenchimento do texto e transparência das curvas de sobreposição,
+# como na pintura do artist.PaintDocument
+TEXT_COLOR = (210, 210, 210)
+CURVE_ALPHA = 122
+
+def gradient(c1, c2, n):
+    """
+    Cria uma lista de N cores em RGB-255 em um gradiente entre as cores
+    C1 e C2, com as mesmas operações do artist.MakeGradient, para que os
+    arredondamentos sejam iguais.
+    """
+    if n < 2:
+        return [tuple(c1)] * n
+    stops = [x / (n - 1) for x in range(n)]
+    return [tuple(round(((1 - stop) * (a / 255) + stop * (b / 255)) * 255)
+                  for a, b in zip(c1, c2)) for stop in stops]
+
+def sample_curve(curve, count=SAMPLES):
+    """
+    Converte uma curva do rhino3dm em uma lista de pontos (x, y).
+    """
+    polyline = curve.TryGetPolyline()
+    if polyline is not None:
+        return [(p.X, p.Y) for p in polyline]
+    start, end = curve.Domain.T0, curve.Domain.T1
+    points = [curve.PointAt(start + (end - start) * x / count)
+              for x in range(count + 1)]
+
+    return [(p.X, p.Y) for p in points]
+
+def read_model(model):
+    """
+    Retorna o modelo 3DM fornecido como um rhino3dm.File3dm ou pelo nome
+    do arquivo.
+    """
+    if isinstance(model, str):
+        import rhino3dm as r3dm
+        model = r3dm.File3dm.Read(model)
+
+    return model
+
+def model_curves(model):
+    """
+    Organiza as curvas do modelo por nome da layer, na ordem do modelo.
+    """
+    names = [layer.Name for layer in model.Layers]
+    curves = {}
+    for object in model.Objects:
+        name = names[object.Attributes.LayerIndex]
+        curves.setdefault(name, []).append(object.Geometry)
+
+    return curves
+
+def painted_regions(arte, colors):
+    """
+    Associa cada curva da layer 'Arte' à sua cor do gradiente e as ordena
+    da curva mais baixa para a mais alta, como na vista superior do
+    Rhino. O artist.PaintDocument percorre as curvas na ordem do
+    FindByLayer, a inversa da ordem do modelo, de modo que a curva
+    superior, a primeira do modelo, recebe a última cor do gradiente.
+    Retorna uma lista de pares (curva, cor).
+    """
+    stops = gradient(colors[0][1], colors[0][2], colors[1] + 2)
+    heights = [curve.GetBoundingBox().Min.Z for curve in arte]
+    last = len(arte) - 1
+
+    return [(arte[x], stops[last - x])
+            for x in sorted(range(len(arte)), key=lambda x: heights[x])]
+
+def draw_preview(model, colors, width=500):
+    """
+    Desenha a prévia da arte, com WIDTH pixels de largura, à partir do
+    modelo 3DM criado pelo geometry.draw_geometry e das cores do pedido
+    (veja dress_flower.make_flower), com o mesmo rasterizador do JPEG
+    sem o Rhino (veja raster.rasterize) e menos sublinhas por pixel.
+    Retorna uma PIL.Image.
+    """
+    from raster import rasterize
+
+    return rasterize(model, colors, width, samples=2)
@@ -0,0 +1,161 @@
+# pyramid.py
+#
+# Imagens da arte para a loja virtual à partir de uma única rasterização:
+# uma escada de larguras reduzidas, para as miniaturas, as listagens e a
+# página do produto, e uma pirâmide de blocos no formato Deep Zoom (DZI)
+# para o zoom. Os níveis da pirâmide são reduzidos pela metade um à
+# partir do outro, e cada largura da escada é reduzida do menor nível que
+# ainda é maior do que ela, de modo que a imagem é decodificada e
+# reduzida uma única vez e cada arquivo é escrito uma única vez. Um
+# manifesto JSON descreve todos os arquivos, com caminhos relativos à
+# pasta do pedido, e a loja apenas serve arquivos estáticos.
+#
+# Uso: python -m pyramid <id> [-l LARGURA] [-e LARGURA ...] [-b BLOCO]
+#
+
+import argparse
+import json
+import time
+from math import ceil, log2
+from os import makedirs, path
+from PIL import Image
+
+# Larguras da escada de imagens reduzidas, em pixels
+LADDER = (1600, 800, 400, 200)
+
+# Tamanho e sobreposição dos blocos do zoom e qualidade dos JPEGs
+TILE = 254
+OVERLAP = 1
+QUALITY = 90
+
+def pyramid_levels(image):
+    """
+    Percorre os níveis da pirâmide Deep Zoom, do maior, a própria imagem,
+    ao nível de um pixel. Cada nível tem a metade da largura e da altura
+    do nível anterior, arredondadas para cima. Retorna pares (nível,
+    PIL.Image).
+    """
+    level = ceil(log2(max(image.size))) if max(image.size) > 1 else 0
+    while True:
+        yield level, image
+        if level == 0:
+            break
+        image = image.reduce(2)
+        level -= 1
+
+def write_tiles(image, directory, tile=TILE, overlap=OVERLAP,
+                quality=QUALITY):
+    """
+    Divide um nível da pirâmide em blocos de TILE pixels, com OVERLAP
+    pixels repetidos dos blocos vizinhos, e os salva em JPEG como
+    <coluna>_<linha>.jpeg na pasta DIRECTORY. Retorna a quantidade de
+    blocos.
+    """
+    makedirs(directory, exist_ok=True)
+    width, height = image.size
+    columns, rows = ceil(width / tile), ceil(height / tile)
+    for column in range(columns):
+        for row in range(rows):
+            box = (max(column * tile - overlap, 0),
+                   max(row * tile - overlap, 0),
+                   min((column + 1) * tile + overlap, width),
+                   min((row + 1) * tile + overlap, height))
+            image.crop(box).save(
+                path.join(directory, '{}_{}.jpeg'.format(column, row)),
+                'JPEG', quality=quality)
+
+    return columns * rows
+
+def export_images(image, id, ladder=LADDER, tile=TILE, overlap=OVERLAP,
+                  quality=QUALITY, directory=None):
+    """
+    Cria as imagens da loja virtual à partir de uma única imagem da arte,
+    uma PIL.Image ou o nome do arquivo (como o JPEG exportado pelo
+    raster ou pelo Rhino): a escada de larguras LADDER, a pirâmide de
+    blocos do zoom e o manifesto. Os arquivos são salvos por padrão na
+    pasta IMAGENS/<id>, com o manifesto em manifest.json. Larguras da
+    escada maiores do que a imagem são ignoradas. Retorna o nome da
+    pasta.
+    """
+    from artifacts import output_paths
+
+    if isinstance(image, str):
+        image = Image.open(image)
+    image = image.convert('RGB')
+    directory = directory or output_paths(id)['imagens']
+    makedirs(directory, exist_ok=True)
+    width, height = image.size
+
+    # Percorre os níveis da pirâmide, salvando os blocos de cada nível e
+    # reduzindo as larguras da escada à partir do menor nível maior do
+    # que elas
+    pending = sorted((w for w in ladder if w <= width), reverse=True)
+    images, levels, count = [], 0, 0
+    for level, current in pyramid_levels(image):
+        count += write_tiles(current, path.join(directory, 'zoom_files',
+                                                str(level)),
+                             tile, overlap, quality)
+        levels += 1
+        while pending and (level == 0 or
+                           (current.width + 1) // 2 < pending[0]):
+            target = pending.pop(0)
+            size = (target, max(1, round(height * target / width)))
+            name = '{}.jpeg'.format(target)
+            filename = path.join(directory, name)
+            current.resize(size, Image.LANCZOS).save(filename, 'JPEG',
+                                                     quality=quality)
+            images.append({'largura': size[0], 'altura': size[1],
+                           'arquivo': name,
+                           'bytes': path.getsize(filename)})
+
+    # Descreve a pirâmide no formato Deep Zoom
+    with open(path.join(directory, 'zoom.dzi'), 'w',
+              encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"'
+                   ' Format="jpeg" Overlap="{}" TileSize="{}">'
+                   '<Size Width="{}" Height="{}"/></Image>\n'.format(
+                       overlap, tile, width, height))
+
+    # Escreve o manifesto por último, para que ele só exista quando todos
+    # os arquivos estiverem prontos. Os caminhos não dependem do ID, para
+    # que a pasta possa ser reaproveitada pelo cache de artefatos
+    manifest = {
+        'largura': width,
+        'altura': height,
+        'imagens': images,
+        'zoom': {'arquivo': 'zoom.dzi', 'blocos': 'zoom_files',
+                 'formato': 'jpeg', 'bloco': tile, 'sobreposição': overlap,
+                 'níveis': levels, 'quantidade': count}
+    }
+    with open(path.join(directory, 'manifest.json'), 'w',
+              encoding='utf-8') as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+
+    return directory
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pyramid',
+        description='Gera as imagens reduzidas e os blocos do zoom de um '
+                    'pedido já gerado sem o Rhino.')
+    parser.add_argument('id', help='ID do pedido')
+    parser.add_argument('-l', '--largura', type=int, default=3200,
+                        help='largura da rasterização (padrão: 3200)')
+    parser.add_argument('-e', '--escada', type=int, nargs='+',
+                        default=list(LADDER),
+                        help='larguras das imagens reduzidas')
+    parser.add_argument('-b', '--bloco', type=int, default=TILE,
+                        help='tamanho dos blocos do zoom (padrão: 254)')
+    args = parser.parse_args(argv)
+
+    from raster import order_model, rasterize
+
+    start = time.perf_counter()
+    model, colors, size = order_model(args.id)
+    directory = export_images(rasterize(model, colors, args.largura),
+                              args.id, args.escada, args.bloco)
+    print('{} ({:.2f} s)'.format(directory, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
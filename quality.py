@@ -0,0 +1,58 @@
+# quality.py
+#
+# Predefinições de qualidade da geração da arte. Cada predefinição define
+# a quantidade de passos entre as cores, as tolerâncias da geometria e do
+# contorno do texto, a largura do JPEG e os formatos exportados. A
+# produção mantém os valores originais e a pintura e a exportação pelo
+# Rhino; o rascunho e a prévia, usados enquanto o cliente ajusta as opções
+# do pedido, pintam e exportam a arte sem o Rhino (veja raster e vector),
+# com menos curvas e tolerâncias maiores.
+#
+
+from collections import namedtuple
+
+Preset = namedtuple('Preset', ['name', 'blend', 'tolerance', 'text_tolerance',
+                               'width', 'samples', 'outputs', 'renderer'])
+
+# name            nome da predefinição
+# blend           quantidade de passos entre as duas cores da arte
+# tolerance       tolerância das intersecções, dos arredondamentos e das
+#                 curvas intermediárias da geometria, em centímetros
+# text_tolerance  tolerância do contorno do texto
+# width           largura do JPEG e das imagens da loja virtual, em pixels,
+#                 quando rasterizados sem o Rhino
+# samples         sublinhas de varredura por pixel do JPEG sem o Rhino
+# outputs         formatos exportados por padrão
+# renderer        'rhino' para a pintura e a exportação pelo Rhino, ou
+#                 'local' para o raster e o vector
+PRESETS = {
+    'rascunho': Preset('rascunho', 12, 0.02, 0.1, 800, 2, ('jpeg',),
+                       'local'),
+    'previa': Preset('previa', 40, 0.005, 0.05, 1600, 4,
+                     ('jpeg', 'svg', 'imagens'), 'local'),
+    'producao': Preset('producao', 120, 0.001, 0.01, 3200, 4, ('pdf', 'jpeg'),
+                       'rhino')
+}
+
+# Predefinição utilizada quando nenhuma é fornecida
+DEFAULT = 'producao'
+
+def get_preset(quality=DEFAULT):
+    """
+    Retorna a predefinição de qualidade com o nome fornecido, ou a própria
+    predefinição caso QUALITY já seja um Preset.
+    """
+    if isinstance(quality, Preset):
+        return quality
+    if quality not in PRESETS:
+        raise ValueError('Qualidade desconhecida: ' + str(quality) +
+                         '. Utilize ' + ', '.join(PRESETS) + '.')
+
+    return PRESETS[quality]
+
+def cache_name(preset):
+    """
+    Nome da predefinição incluído nas chaves do cache de artefatos, ou
+    None para a produção, cujas chaves não mudam.
+    """
+    return None if preset.name == DEFAULT else preset.name
@@ -0,0 +1,466 @@
+# raster.py
+#
+# Rasterização da arte com NumPy e Pillow, sem o Rhino. Reproduz a
+# pintura do artist.PaintDocument à partir do modelo 3DM sem pintura:
+# as curvas fechadas da layer 'Arte' são preenchidas com o gradiente de
+# cores, da mais baixa para a mais alta, o texto é preenchido em cinza e
+# as curvas de sobreposição são desenhadas com transparência. A moldura
+# de impressão fica oculta, como no JPEG exportado pelo Rhino.
+#
+# O preenchimento é feito por linhas de varredura vetorizadas: os
+# cruzamentos de todas as arestas com todas as sublinhas de um polígono
+# são calculados de uma vez, ordenados, e a regra par-ímpar é aplicada
+# com uma soma acumulada. Cada pixel é dividido em SUPERSAMPLE sublinhas,
+# e a posição de cada cruzamento é distribuída entre as duas colunas
+# vizinhas, para bordas suavizadas em qualquer resolução.
+#
+# Para as imagens de impressão, em que a arte de 90 cm a 300 dpi tem mais
+# de 10.000 pixels de largura, a imagem é desenhada em faixas horizontais
+# com uma quantidade fixa de pixels, e cada faixa é comprimida e escrita
+# no PNG assim que é desenhada. A memória utilizada fica constante,
+# independente da dimensão da arte.
+#
+# Uso: python -m raster <id> [-l LARGURA] [-a AMOSTRAS] [-f jpeg|png]
+#                           [-r DPI]
+#
+
+import argparse
+import struct
+import time
+import zlib
+from math import ceil
+from os import makedirs, path
+import numpy as np
+from PIL import Image
+from preview import (CURVE_ALPHA, TEXT_COLOR, model_curves, painted_regions,
+                     read_model, sample_curve)
+
+# Sublinhas de varredura por pixel
+SUPERSAMPLE = 4
+
+# Espessura das curvas de sobreposição, em fração da largura da imagem
+STROKE = 1 / 1600
+
+# Pixels de cada faixa das imagens desenhadas em faixas (cerca de 12 MB
+# em RGB) e resolução padrão das imagens de impressão, a mesma do PDF
+# exportado pelo Rhino
+BAND = 1 << 22
+DPI = 300
+
+def coverage(rings, width, height, samples=SUPERSAMPLE, nonzero=False,
+             origin=0):
+    """
+    Calcula a cobertura, entre 0 e 1, dos pixels de uma imagem de WIDTH
+    por HEIGHT pixels, cuja primeira linha é a linha ORIGIN das
+    coordenadas, pelo polígono formado pelos anéis fechados RINGS (arrays
+    de pontos em pixels), com a regra par-ímpar, ou com a regra do número
+    de voltas diferente de zero com NONZERO. As sublinhas são calculadas
+    nas coordenadas originais, de modo que a cobertura de uma linha não
+    depende de ORIGIN. Retorna a cobertura da região do polígono e a
+    linha e a coluna do seu início na imagem, ou None caso o polígono
+    esteja fora da imagem.
+    """
+    # Organiza as arestas de todos os anéis, sem as arestas horizontais
+    starts = np.concatenate([ring for ring in rings])
+    ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    keep = starts[:, 1] != ends[:, 1]
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return None
+
+    # Limita a região do polígono à imagem
+    top = max(int(np.floor(min(starts[:, 1].min(), ends[:, 1].min()))),
+              origin)
+    bottom = min(int(np.ceil(max(starts[:, 1].max(), ends[:, 1].max()))),
+                 origin + height)
+    left = max(int(np.floor(min(starts[:, 0].min(), ends[:, 0].min()))), 0)
+    right = min(int(np.ceil(max(starts[:, 0].max(), ends[:, 0].max()))),
+                width)
+    if top >= bottom or left >= right:
+        return None
+
+    # Intervalo de sublinhas, com centro em (k + 0.5) / SAMPLES, cruzado
+    # por cada aresta
+    low = np.minimum(starts[:, 1], ends[:, 1])
+    high = np.maximum(starts[:, 1], ends[:, 1])
+    first = np.clip(np.ceil(low * samples - 0.5), top * samples,
+                    bottom * samples).astype(np.int64)
+    last = np.clip(np.ceil(high * samples - 0.5), top * samples,
+                   bottom * samples).astype(np.int64)
+    counts = last - first
+    total = int(counts.sum())
+    if not total:
+        return None
+
+    # Calcula os cruzamentos de todas as arestas com as suas sublinhas
+    edge = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    row = first[edge] + step
+    y = (row + 0.5) / samples
+    x0, y0 = starts[edge, 0], starts[edge, 1]
+    x1, y1 = ends[edge, 0], ends[edge, 1]
+    x = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+
+    # Ordena os cruzamentos por sublinha e posição, e alterna a entrada e
+    # a saída do polígono em cada sublinha (regra par-ímpar), ou acumula
+    # o sentido das arestas e marca a entrada e a saída da região com
+    # número de voltas diferente de zero
+    order = np.lexsort((x, row))
+    row, x = row[order], x[order]
+    start = np.searchsorted(row, row)
+    if nonzero:
+        turn = np.where(y1 > y0, 1, -1)[order]
+        wind = np.cumsum(turn)
+        wind -= np.where(start > 0, wind[start - 1], 0)
+        sign = ((wind != 0).astype(np.float64) -
+                (wind - turn != 0)) / samples
+    else:
+        rank = np.arange(total) - start
+        sign = np.where(rank % 2 == 0, 1.0, -1.0) / samples
+
+    # Distribui cada cruzamento entre as duas colunas vizinhas e acumula
+    # as sublinhas na linha de pixels correspondente
+    # A coluna e a fração são calculadas nas coordenadas originais, para
+    # que não dependam da região do polígono na imagem
+    columns = right - left + 1
+    x = np.clip(x, left, right)
+    column = np.minimum(np.floor(x), right - 1)
+    fraction = x - column
+    column = column.astype(np.int64) - left
+    line = row // samples - top
+    index = line * (columns + 1) + column
+    size = (bottom - top) * (columns + 1)
+    diff = np.bincount(np.concatenate((index, index + 1)),
+                       np.concatenate((sign * (1 - fraction), sign * fraction)),
+                       size).reshape(bottom - top, columns + 1)
+    cover = np.cumsum(diff[:, :right - left], axis=1, dtype=np.float32)
+    np.clip(cover, 0, 1, out=cover)
+
+    return cover, top - origin, left
+
+def mask(cover, alpha=1.0):
+    """
+    Converte a cobertura, entre 0 e 1, em uma máscara do Pillow. A
+    cobertura é alterada no lugar.
+    """
+    cover *= 255 * alpha
+    cover += 0.5
+    return Image.fromarray(cover.astype(np.uint8), 'L')
+
+class Canvas:
+    """
+    Faixa de HEIGHT linhas, à partir da linha TOP, de uma imagem RGB
+    quadrada de WIDTH pixels do Pillow (a imagem inteira por padrão). As
+    etapas do desenho são fornecidas em pixels da imagem inteira (veja
+    draw_steps), e a cobertura de cada preenchimento é convertida em uma
+    máscara e composta pelo Pillow.
+    """
+    def __init__(self, width, height=None, top=0, samples=SUPERSAMPLE,
+                 background=(255, 255, 255)):
+        self.width = width
+        self.height = width if height is None else height
+        self.top = top
+        self.samples = samples
+        self.pixels = Image.new('RGB', (width, self.height), background)
+
+    def fill(self, rings, color, alpha=1.0):
+        """
+        Preenche os anéis fechados, juntos, com a regra par-ímpar.
+        """
+        result = coverage(rings, self.width, self.height, self.samples,
+                          origin=self.top)
+        if result is None:
+            return
+        cover, top, left = result
+        self.pixels.paste(tuple(color), (left, top), mask(cover, alpha))
+
+    def stroke(self, rings, color, alpha=1.0, weight=1):
+        """
+        Desenha os anéis com WEIGHT pixels de espessura, como a união de
+        um retângulo por segmento, prolongado pela metade da espessura
+        nas duas pontas para cobrir as junções, preenchida pela cobertura
+        com a regra do número de voltas diferente de zero. O resultado não
+        depende da faixa, e a imagem desenhada em faixas é idêntica à
+        imagem inteira. Os segmentos fora da faixa não são desenhados.
+        """
+        half = weight / 2
+        starts = np.concatenate([ring for ring in rings])
+        ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+        bottom = self.top + self.height
+        keep = ((np.maximum(starts[:, 1], ends[:, 1]) >= self.top - weight) &
+                (np.minimum(starts[:, 1], ends[:, 1]) <= bottom + weight))
+        starts, ends = starts[keep], ends[keep]
+        length = np.linalg.norm(ends - starts, axis=1)
+        starts, ends, length = starts[length > 0], ends[length > 0], \
+            length[length > 0]
+        if not len(length):
+            return
+
+        # Retângulos com o mesmo sentido, para que a união seja a região
+        # coberta por ao menos um deles
+        along = (ends - starts) / length[:, None] * half
+        across = along[:, ::-1] * (-1, 1)
+        quads = np.stack([starts - along + across, ends + along + across,
+                          ends + along - across, starts - along - across],
+                         axis=1)
+        result = coverage(list(quads), self.width, self.height, self.samples,
+                          nonzero=True, origin=self.top)
+        if result is None:
+            return
+        cover, top, left = result
+        self.pixels.paste(tuple(color), (left, top), mask(cover, alpha))
+
+    def draw(self, steps):
+        """
+        Desenha as etapas criadas pelo draw_steps, em ordem, e retorna a
+        imagem.
+        """
+        for operation, rings, color, alpha, weight in steps:
+            if operation == 'fill':
+                self.fill(rings, color, alpha)
+            else:
+                self.stroke(rings, color, alpha, weight)
+
+        return self.pixels
+
+    def image(self):
+        return self.pixels
+
+def art_box(curves):
+    """
+    Caixa da moldura da arte, em que a imagem é enquadrada.
+    """
+    frame = curves.get('ViewFrame') or curves.get('Arte')
+    if not frame:
+        raise ValueError('O modelo não possui curvas para a rasterização.')
+
+    return frame[0].GetBoundingBox()
+
+def draw_steps(model, colors, width):
+    """
+    Prepara o desenho da arte do modelo 3DM sem pintura, criado pelo
+    geometry.draw_geometry (um rhino3dm.File3dm ou o nome do arquivo),
+    com as cores do pedido (veja dress_flower.make_flower), em uma imagem
+    quadrada de WIDTH pixels enquadrada na moldura da arte. As curvas são
+    amostradas e convertidas em pixels uma única vez, para que o desenho
+    possa ser repetido em cada faixa da imagem (veja render_bands).
+    Retorna uma lista com a operação ('fill' ou 'stroke'), os anéis em
+    pixels, a cor, a transparência e a espessura de cada etapa.
+    """
+    model = read_model(model)
+    curves = model_curves(model)
+    layers = {layer.Name: layer for layer in model.Layers}
+    box = art_box(curves)
+    scale = width / max(box.Max.X - box.Min.X, box.Max.Y - box.Min.Y)
+
+    # Converte as curvas em anéis de pixels, com a quantidade de amostras
+    # proporcional ao tamanho de cada curva na imagem
+    def rings(items):
+        result = []
+        for curve in items:
+            size = curve.GetBoundingBox()
+            size = max(size.Max.X - size.Min.X, size.Max.Y - size.Min.Y)
+            count = int(min(max(size * scale, 32), 2048))
+            points = np.asarray(sample_curve(curve, count), dtype=np.float64)
+            result.append(np.column_stack(
+                ((points[:, 0] - box.Min.X) * scale,
+                 (box.Max.Y - points[:, 1]) * scale)))
+        return result
+
+    # Preenche as curvas da arte com o gradiente de cores, na ordem das
+    # curvas do modelo, e desenha da curva mais baixa para a mais alta,
+    # como na vista superior do Rhino
+    steps = [('fill', rings([curve]), color, 1.0, 0)
+             for curve, color in painted_regions(curves.get('Arte', []),
+                                                 colors)]
+
+    # Preenche todas as curvas do texto juntas, para que os furos das
+    # letras fiquem vazios
+    if curves.get('Texto'):
+        steps.append(('fill', rings(curves['Texto']), TEXT_COLOR, 1.0, 0))
+
+    # Desenha as curvas de sobreposição e a moldura da arte
+    weight = width * STROKE
+    if curves.get('Curvas'):
+        steps.append(('stroke', rings(curves['Curvas']), colors[0][0][:3],
+                      CURVE_ALPHA / 255, weight))
+    if curves.get('ViewFrame'):
+        steps.append(('stroke', rings(curves['ViewFrame']),
+                      layers['ViewFrame'].Color[:3], 1.0, weight))
+
+    return steps
+
+def rasterize(model, colors, width=3200, samples=SUPERSAMPLE):
+    """
+    Rasteriza a arte do modelo 3DM sem pintura, criado pelo
+    geometry.draw_geometry (um rhino3dm.File3dm ou o nome do arquivo),
+    com as cores do pedido (veja dress_flower.make_flower), em uma
+    imagem quadrada de WIDTH pixels. Retorna uma PIL.Image.
+    """
+    return Canvas(width, samples=samples).draw(draw_steps(model, colors,
+                                                          width))
+
+def render_bands(steps, width, samples=SUPERSAMPLE, band=BAND):
+    """
+    Desenha as etapas do draw_steps em faixas horizontais de cerca de
+    BAND pixels, de cima para baixo, e retorna cada faixa como uma
+    PIL.Image assim que é desenhada. Apenas uma faixa fica em memória de
+    cada vez, independente da largura da imagem.
+    """
+    rows = max(1, band // width)
+    for top in range(0, width, rows):
+        canvas = Canvas(width, min(rows, width - top), top, samples)
+        yield canvas.draw(steps)
+
+class PngWriter:
+    """
+    Escreve uma imagem PNG em RGB faixa a faixa, diretamente no arquivo.
+    As linhas de cada faixa são filtradas e comprimidas à medida que são
+    escritas, sem manter a imagem inteira em memória.
+    """
+    def __init__(self, filename, width, height, dpi=None):
+        self.file = open(filename, 'wb')
+        self._compressor = zlib.compressobj(6)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2,
+                                         0, 0, 0))
+
+        # Resolução de impressão, em pixels por metro
+        if dpi:
+            density = round(dpi / 0.0254)
+            self._chunk(b'pHYs', struct.pack('>IIB', density, density, 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data +
+                        struct.pack('>I', zlib.crc32(kind + data)))
+
+    def write(self, image):
+        """
+        Acrescenta as linhas de uma faixa da imagem, uma PIL.Image em RGB.
+        """
+        rows = np.asarray(image, dtype=np.uint8).reshape(image.height, -1)
+
+        # Aplica o filtro Sub do PNG, a diferença de cada byte para o byte
+        # do pixel à esquerda, que comprime bem as áreas de cor contínua
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self.file.close()
+
+def render_jpeg(model, colors, id, width=3200, samples=SUPERSAMPLE,
+                filename=None, quality=95):
+    """
+    Rasteriza a arte e a salva em JPEG, por padrão no mesmo arquivo do
+    JPEG exportado pelo Rhino (JPEG/<id>_HQ.jpeg). Retorna o nome do
+    arquivo.
+    """
+    return save_jpeg(rasterize(model, colors, width, samples), id, filename,
+                     quality)
+
+def save_jpeg(image, id, filename=None, quality=95):
+    """
+    Salva uma imagem já rasterizada em JPEG, por padrão em
+    JPEG/<id>_HQ.jpeg. Retorna o nome do arquivo.
+    """
+    from artifacts import output_paths
+
+    filename = filename or output_paths(id)['jpeg']
+    image.save(filename, 'JPEG', quality=quality)
+
+    return filename
+
+def render_png(model, colors, id, dpi=DPI, width=None, samples=SUPERSAMPLE,
+               filename=None, band=BAND):
+    """
+    Rasteriza a arte para impressão em um PNG com DPI pontos por
+    polegada na dimensão da moldura da arte, como o PDF exportado pelo
+    Rhino, ou com WIDTH pixels de largura. A imagem é desenhada em faixas
+    (veja render_bands) e cada faixa é comprimida e escrita no arquivo
+    assim que é desenhada, de modo que a memória utilizada não depende da
+    dimensão da arte. O PNG é salvo por padrão em PNG/<id>.png. Retorna
+    o nome do arquivo.
+    """
+    from artifacts import output_paths
+
+    model = read_model(model)
+    if width is None:
+        box = art_box(model_curves(model))
+        size = max(box.Max.X - box.Min.X, box.Max.Y - box.Min.Y)
+        width = ceil((size / 2.54) * dpi)
+
+    filename = filename or output_paths(id)['png']
+    makedirs(path.dirname(filename), exist_ok=True)
+    steps = draw_steps(model, colors, width)
+    with PngWriter(filename, width, width, dpi) as png:
+        for image in render_bands(steps, width, samples, band):
+            png.write(image)
+
+    return filename
+
+def order_model(id):
+    """
+    Retorna o modelo 3DM sem pintura, as cores e a dimensão de um pedido
+    já gerado, com os passos da sua predefinição de qualidade.
+    """
+    from artifacts import get_store
+    from colors import color_table
+    from quality import get_preset
+
+    store = get_store()
+    record = store.order(str(id))
+    filename = store.fetch_model(record[0]) if record else None
+    if filename is None:
+        raise ValueError('Não foi encontrado modelo para o ID fornecido.')
+
+    key, input, quality = record
+    colors = [color_table(input[4]), get_preset(quality).blend]
+
+    return filename, colors, input[2]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m raster',
+        description='Gera o JPEG ou o PNG de impressão de um pedido já '
+                    'gerado sem o Rhino.')
+    parser.add_argument('id', help='ID do pedido')
+    parser.add_argument('-l', '--largura', type=int, default=None,
+                        help='largura da imagem em pixels (padrão: 3200 '
+                             'no JPEG e a resolução de impressão no PNG)')
+    parser.add_argument('-a', '--amostras', type=int, default=SUPERSAMPLE,
+                        help='sublinhas de varredura por pixel')
+    parser.add_argument('-f', '--formato', choices=('jpeg', 'png'),
+                        default='jpeg',
+                        help='formato de saída (padrão: jpeg)')
+    parser.add_argument('-r', '--resolucao', type=int, default=DPI,
+                        help='resolução do PNG em dpi (padrão: 300)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    model, colors, size = order_model(args.id)
+    if args.formato == 'png':
+        filename = render_png(model, colors, args.id, args.resolucao,
+                              args.largura, args.amostras)
+    else:
+        filename = render_jpeg(model, colors, args.id, args.largura or 3200,
+                               args.amostras)
+    print('{} ({:.2f} s)'.format(filename, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# raster_bench.py
+#
+# Compara o tempo de geração do JPEG de um pedido já gerado pelo
+# rasterizador sem o Rhino (raster) em várias larguras com a captura do
+# Rhino (artist.Session, pintura e ViewCapture). A captura do Rhino só é
+# medida quando o Rhino está disponível, de modo que o benchmark também
+# pode ser executado nos servidores de renderização em Linux.
+#
+# Uso: python -m raster_bench <id> [-l LARGURA ...] [-n REPETIÇÕES]
+#
+
+import argparse
+import os
+import statistics
+import time
+from raster import order_model, rasterize
+
+def measure(function, repeat):
+    """
+    Executa FUNCTION REPEAT vezes e retorna a mediana do tempo, em
+    segundos.
+    """
+    times = []
+    for x in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+def rhino_capture(filename, colors, size, id):
+    """
+    Pinta o modelo no Rhino e exporta o JPEG pela captura da vista, como
+    o dress_flower.finish. Retorna o nome do arquivo exportado.
+    """
+    from artist import Session
+
+    with Session(filename) as session:
+        session.paint(colors)
+        return session.export_jpeg(size, id)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m raster_bench',
+        description='Compara o rasterizador com a captura do Rhino.')
+    parser.add_argument('id', help='ID de um pedido já gerado')
+    parser.add_argument('-l', '--larguras', type=int, nargs='+',
+                        default=[500, 1600, 3200],
+                        help='larguras da imagem em pixels')
+    parser.add_argument('-n', '--repeticoes', type=int, default=3,
+                        help='repetições de cada medição (padrão: 3)')
+    args = parser.parse_args(argv)
+
+    filename, colors, size = order_model(args.id)
+    results = {}
+    for width in args.larguras:
+        results['raster {}px'.format(width)] = measure(
+            lambda: rasterize(filename, colors, width), args.repeticoes)
+
+    # Mede a captura do Rhino em um ID temporário, sem alterar o JPEG do
+    # pedido
+    try:
+        import artist
+    except ImportError:
+        artist = None
+    if artist is not None:
+        id = 'bench_{}'.format(os.getpid())
+        capture = []
+        results['rhino 3200px'] = measure(
+            lambda: capture.append(rhino_capture(filename, colors, size, id)),
+            args.repeticoes)
+        for name in set(capture):
+            os.remove(name)
+
+    for name, seconds in results.items():
+        print('{:<14} {:8.3f} s'.format(name, seconds))
+    if artist is None:
+        print('Rhino indisponível: captura do Rhino não medida.')
+
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+# render_service.py
+#
+# Serviço local de renderização com um conjunto fixo de processos que
+# mantêm o Rhino carregado entre os pedidos. Os clientes (app, batch ou
+# outros scripts) se conectam por um socket local do
+# multiprocessing.connection e enviam tarefas de pintura e exportação de
+# modelos 3DM, sem pagar o carregamento do Rhino a cada execução.
+# Cada processo é substituído por um novo após uma quantidade de tarefas
+# ou quando a sua memória passa de um limite.
+#
+# As mensagens do multiprocessing.connection usam o pickle, de modo que
+# qualquer processo com a chave de autenticação pode executar código no
+# serviço. A chave é lida da variável DRESSPOP_RENDER_KEY ou, caso ela
+# não exista, de um segredo gerado na primeira execução do serviço e
+# guardado em um arquivo legível apenas pelo usuário (KEY_FILE).
+#
+# Uso: python -m render_service [-w PROCESSOS] [-p PORTA] [-t TAREFAS]
+#                               [-m MEGABYTES]
+#
+
+import argparse
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import Client, Listener
+
+ADDRESS = ('localhost', int(os.environ.get('DRESSPOP_RENDER_PORT', 6150)))
+KEY_FILE = os.path.join(os.path.expanduser('~'), '.dresspop', 'render.key')
+
+def auth_key(create=False):
+    """
+    Retorna a chave de autenticação do serviço: a variável de ambiente
+    DRESSPOP_RENDER_KEY ou o segredo guardado em KEY_FILE. Com CREATE, o
+    segredo é gerado caso ainda não exista; sem CREATE, retorna None
+    quando não há chave. Levanta um PermissionError caso o arquivo possa
+    ser lido por outros usuários.
+    """
+    key = os.environ.get('DRESSPOP_RENDER_KEY')
+    if key:
+        return key.encode('utf-8')
+
+    # Cria o segredo apenas para o usuário, sem substituir um existente
+    if create and not os.path.exists(KEY_FILE):
+        os.makedirs(os.path.dirname(KEY_FILE), mode=0o700, exist_ok=True)
+        try:
+            handle = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(handle, 'w') as file:
+                file.write(secrets.token_hex(32))
+
+    try:
+        with open(KEY_FILE, encoding='utf-8') as file:
+            if os.name == 'posix' and os.fstat(file.fileno()).st_mode & 0o077:
+                raise PermissionError('A chave do serviço de renderização '
+                                      'pode ser lida por outros usuários: ' +
+                                      KEY_FILE)
+            key = file.read().strip()
+    except FileNotFoundError:
+        return None
+
+    return key.encode('utf-8') if key else None
+
+def memory():
+    """
+    Retorna a memória utilizada pelo processo atual, em megabytes, ou None
+    caso não seja possível medi-la.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+                process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize / 2**20
+        return None
+
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return None
+
+def run_job(job):
+    """
+    Executa uma tarefa de renderização no processo atual. A tarefa é um
+    dicionário com o modelo '3dm', o 'id' da arte e, opcionalmente, as
+    'cores' para a pintura, a 'dimensão' e os 'formatos' para a
+    exportação, e 'salvar' com o arquivo em que o modelo pintado é salvo.
+    Retorna os arquivos gerados e os tempos de cada etapa, em segundos.
+    """
+    from artist import Session
+
+    result = {'tempos': {}}
+    with Session(job['3dm']) as session:
+        # Pinta o modelo, caso as cores tenham sido fornecidas
+        if job.get('cores') is not None:
+            start = time.perf_counter()
+            session.paint(job['cores'])
+            result['tempos']['pintura'] = round(time.perf_counter() - start,
+                                                3)
+
+        # Exporta o modelo nos formatos pedidos
+        if job.get('formatos'):
+            files, timing = session.export_all(job['dimensão'], job['id'],
+                                               job['formatos'], False)
+            result.update(files)
+            result['tempos'].update(timing)
+
+        # Salva o modelo pintado
+        if job.get('salvar'):
+            result['3dm'] = session.save(job['salvar'])
+
+    return result
+
+def _worker(conn, max_jobs, max_memory):
+    """
+    Laço de um processo de renderização: carrega o Rhino uma única vez e
+    executa as tarefas recebidas pela conexão até atingir MAX_JOBS tarefas
+    ou MAX_MEMORY megabytes, quando avisa que deve ser substituído.
+    """
+    import artist
+
+    conn.send({'status': 'pronto', 'pid': os.getpid()})
+    jobs = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        reply = {'pid': os.getpid()}
+        try:
+            reply['resultado'] = run_job(job)
+            reply['status'] = 'ok'
+        except Exception as error:
+            reply['status'] = 'erro'
+            reply['erro'] = '{}: {}'.format(type(error).__name__, error)
+            reply['detalhes'] = traceback.format_exc()
+
+        # Avalia se o processo deve ser substituído
+        jobs += 1
+        used = memory()
+        reply['reciclar'] = bool((max_jobs and jobs >= max_jobs) or
+                                 (max_memory and used and used >= max_memory))
+        conn.send(reply)
+        if reply['reciclar']:
+            break
+
+    conn.close()
+
+class Worker:
+    """
+    Processo de renderização controlado pelo serviço.
+    """
+    def __init__(self, max_jobs, max_memory):
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=_worker,
+                                  args=(child, max_jobs, max_memory),
+                                  daemon=True)
+        self.process.start()
+        child.close()
+        self.pid = self.conn.recv()['pid']
+        self.jobs = 0
+
+    def run(self, job):
+        self.conn.send(job)
+        self.jobs += 1
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+class RenderService:
+    """
+    Serviço de renderização com WORKERS processos. As tarefas dos clientes
+    esperam por um processo livre, de modo que todos os clientes
+    compartilham o mesmo conjunto de processos. Sem AUTHKEY, utiliza a
+    chave do auth_key, criando o segredo caso necessário.
+    """
+    def __init__(self, workers=2, address=ADDRESS, authkey=None,
+                 max_jobs=50, max_memory=4096):
+        self.address = address
+        self.authkey = authkey or auth_key(create=True)
+        if not self.authkey:
+            raise ValueError('Chave do serviço de renderização não '
+                             'definida.')
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self.idle = queue.Queue()
+        self.workers = workers
+        self.stats = {'tarefas': 0, 'falhas': 0, 'reciclados': 0,
+                      'falhas de substituição': 0}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._closed = False
+        self._all = set()
+        for x in range(workers):
+            self.idle.put(self._start())
+
+    def _start(self):
+        """
+        Inicia um processo de renderização e o registra no serviço.
+        """
+        worker = Worker(self.max_jobs, self.max_memory)
+        with self._lock:
+            self._all.add(worker)
+
+        return worker
+
+    def submit(self, job):
+        """
+        Executa uma tarefa no próximo processo livre e retorna a resposta.
+        Processos que pedem para ser substituídos, ou que param de
+        responder, são trocados por novos.
+        """
+        worker = self.idle.get()
+        try:
+            reply = worker.run(job)
+        except (EOFError, OSError) as error:
+            reply = {'status': 'erro', 'reciclar': True,
+                     'erro': 'O processo de renderização parou: {}'
+                             .format(error)}
+        if reply.get('reciclar'):
+            threading.Thread(target=self._replace, args=(worker,),
+                             daemon=True).start()
+        else:
+            self.idle.put(worker)
+
+        with self._lock:
+            self.stats['tarefas'] += 1
+            self.stats['falhas'] += reply['status'] != 'ok'
+
+        return reply
+
+    def _replace(self, worker):
+        """
+        Encerra um processo e coloca um novo no seu lugar, já com o Rhino
+        carregado, sem atrasar a resposta da tarefa que o encerrou. Caso
+        o novo processo não inicie, a substituição é tentada novamente,
+        com intervalos crescentes, para que o serviço não perca processos.
+        """
+        worker.stop()
+        with self._lock:
+            self._all.discard(worker)
+
+        delay = 1
+        while not self._closed:
+            try:
+                new = self._start()
+            except Exception:
+                with self._lock:
+                    self.stats['falhas de substituição'] += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+                continue
+            if self._closed:
+                new.stop()
+                return
+            self.idle.put(new)
+            with self._lock:
+                self.stats['reciclados'] += 1
+            return
+
+    def status(self):
+        """
+        Retorna o estado do serviço.
+        """
+        with self._lock:
+            status = dict(self.stats)
+        status['processos'] = self.workers
+        status['livres'] = self.idle.qsize()
+
+        return status
+
+    def _serve(self, conn):
+        """
+        Atende as mensagens de um cliente até que ele se desconecte.
+        """
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if message.get('tarefa') == 'estado':
+                    conn.send(self.status())
+                else:
+                    conn.send(self.submit(message))
+
+    def serve_forever(self):
+        """
+        Aceita as conexões dos clientes, atendendo cada uma em uma thread.
+        """
+        self._listener = Listener(self.address, authkey=self.authkey)
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    break
+                threading.Thread(target=self._serve, args=(conn,),
+                                 daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Fecha o socket e encerra todos os processos de renderização,
+        inclusive os que estão executando uma tarefa, que são finalizados
+        caso não terminem em alguns segundos.
+        """
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop()
+
+class RenderClient:
+    """
+    Cliente do serviço de renderização. Uma conexão atende uma tarefa de
+    cada vez; para tarefas simultâneas, cada thread deve ter o seu cliente.
+    Sem AUTHKEY, utiliza a chave do auth_key.
+    """
+    def __init__(self, address=ADDRESS, authkey=None):
+        authkey = authkey or auth_key()
+        if not authkey:
+            raise ConnectionRefusedError('Chave do serviço de renderização '
+                                         'não encontrada.')
+        self.conn = Client(address, authkey=authkey)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def finish(self, filename, id, size, colors=None,
+               outputs=('pdf', 'jpeg'), save=None):
+        """
+        Pinta o modelo 3DM FILENAME com as cores fornecidas, exporta os
+        formatos de OUTPUTS e salva o modelo pintado em SAVE, caso
+        fornecido. Retorna os arquivos gerados e os tempos de cada etapa.
+        Levanta um RuntimeError caso a tarefa falhe no serviço.
+        """
+        self.conn.send({'tarefa': 'finalizar', '3dm': filename, 'id': id,
+                        'dimensão': size, 'cores': colors,
+                        'formatos': list(outputs), 'salvar': save})
+        reply = self.conn.recv()
+        if reply['status'] != 'ok':
+            raise RuntimeError(reply['erro'])
+
+        return reply['resultado']
+
+    def status(self):
+        """
+        Retorna o estado do serviço.
+        """
+        self.conn.send({'tarefa': 'estado'})
+        return self.conn.recv()
+
+    def close(self):
+        self.conn.close()
+
+def connect(address=ADDRESS, authkey=None):
+    """
+    Conecta ao serviço de renderização. Retorna um RenderClient, ou None
+    caso o serviço não esteja em execução ou a chave não seja aceita.
+    """
+    try:
+        return RenderClient(address, authkey)
+    except (OSError, mp.AuthenticationError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m render_service',
+        description='Serviço local de renderização com o Rhino carregado.')
+    parser.add_argument('-w', '--processos', type=int, default=2,
+                        help='quantidade de processos de renderização')
+    parser.add_argument('-p', '--porta', type=int, default=ADDRESS[1],
+                        help='porta local do serviço')
+    parser.add_argument('-t', '--tarefas', type=int, default=50,
+                        help='tarefas por processo antes de substituí-lo')
+    parser.add_argument('-m', '--memoria', type=int, default=4096,
+                        help='memória, em megabytes, para substituir um '
+                             'processo')
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.processos, ('localhost', args.porta),
+                            max_jobs=args.tarefas, max_memory=args.memoria)
+    print('Serviço de renderização em {}:{} com {} processos.'.format(
+        'localhost', args.porta, args.processos))
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# conftest.py
+#
+# Configuração comum dos testes: os módulos do projeto ficam na raiz do
+# repositório, e os pedidos de referência (JSON, 3DM, JPEG e PDF gerados
+# pelo Rhino) são utilizados como base de comparação dos renderizadores
+# sem o Rhino.
+#
+
+import json
+import sys
+from os import path
+
+BASE = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+import pytest
+
+def unpainted_model(id):
+    """
+    Reconstrói o modelo 3DM sem pintura de um pedido de referência à
+    partir do seu 3DM pintado pelo Rhino. As curvas da arte foram
+    substituídas por hatches, mas as curvas de sobreposição da layer
+    'Curvas' são cópias das curvas da arte no plano superior, na ordem
+    do geometry.flower_shape: a curva superior, a inferior e as curvas
+    intermediárias. As curvas da arte são recriadas na ordem do modelo,
+    da superior para a inferior, com as alturas do flower_shape. O texto
+    não é reconstruído.
+    """
+    import rhino3dm as r3dm
+
+    painted = r3dm.File3dm.Read(path.join(BASE, '3DM', id + '.3dm'))
+    names = [layer.Name for layer in painted.Layers]
+    curves = {}
+    for object in painted.Objects:
+        curves.setdefault(names[object.Attributes.LayerIndex],
+                          []).append(object.Geometry)
+
+    model = r3dm.File3dm()
+    model.Settings.ModelUnitSystem = r3dm.UnitSystem.Centimeters
+    for layer in painted.Layers:
+        index = model.Layers.AddLayer(layer.Name, layer.Color)
+        model.Layers[index].PlotWeight = layer.PlotWeight
+
+    overlay = curves['Curvas']
+    arte = [overlay[0]] + overlay[2:] + [overlay[1]]
+    for x, curve in enumerate(arte):
+        curve = curve.Duplicate()
+        height = 2.5 - 5 * x / (len(arte) - 1)
+        curve.Translate(r3dm.Vector3d(
+            0, 0, height - curve.GetBoundingBox().Min.Z))
+        att = r3dm.ObjectAttributes()
+        att.LayerIndex = names.index('Arte')
+        model.Objects.AddCurve(curve, att)
+    for name in ('Curvas', 'ViewFrame', 'PrintFrame'):
+        for curve in curves.get(name, []):
+            att = r3dm.ObjectAttributes()
+            att.LayerIndex = names.index(name)
+            model.Objects.AddCurve(curve, att)
+
+    return model
+
+def order_colors(id, blend=120):
+    """
+    Cores de um pedido de referência, como no dress_flower.make_flower.
+    """
+    from colors import color_table
+
+    with open(path.join(BASE, 'JSON', id + '.json'), encoding='utf-8') as file:
+        return [color_table(json.load(file)['cores']), blend]
+
+@pytest.fixture(scope='session')
+def reference():
+    """
+    Modelo sem pintura e cores do pedido de referência DPSLS001.
+    """
+    pytest.importorskip('rhino3dm')
+    return unpainted_model('DPSLS001'), order_colors('DPSLS001')
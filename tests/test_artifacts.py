@@ -0,0 +1,69 @@
+# test_artifacts.py
+#
+# Testes do registro dos pedidos no cache de artefatos.
+#
+
+import json
+import sqlite3
+
+import pytest
+
+import artifacts
+import dress_flower
+
+INPUT = ((2, 0, 1, 1, 2, 0, 2, 3), (-23.55, -46.63), 60, 'são paulo', 3)
+
+def test_order_quality(tmp_path):
+    store = artifacts.ArtifactStore(str(tmp_path))
+    store.record_order('1', 'chave', INPUT, 'rascunho')
+    key, input, quality = store.order('1')
+    assert (key, quality) == ('chave', 'rascunho')
+    assert input[2:] == INPUT[2:]
+
+def test_old_index(tmp_path):
+    # Índice sem a coluna da qualidade, de antes das predefinições
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite3'))
+    with db:
+        db.execute('CREATE TABLE orders (id TEXT PRIMARY KEY, key TEXT, '
+                   'input TEXT)')
+        db.execute('INSERT INTO orders VALUES (?, ?, ?)',
+                   ('1', 'chave', json.dumps(INPUT)))
+    db.close()
+
+    store = artifacts.ArtifactStore(str(tmp_path))
+    assert store.order('1')[2] == 'producao'
+
+def test_recolor_quality(tmp_path, monkeypatch):
+    store = artifacts.ArtifactStore(str(tmp_path))
+    store.record_order('1', 'chave', INPUT, 'producao')
+    monkeypatch.setattr(dress_flower, 'get_store', lambda: store)
+    with pytest.raises(ValueError, match='qualidade producao'):
+        dress_flower.recolor('1', 5, quality='rascunho')
+
+def test_sources():
+    # Módulos do projeto importados, direta ou indiretamente, pela geração
+    import ast
+    from os import listdir, path
+
+    from conftest import BASE
+
+    local = {name[:-3] for name in listdir(BASE) if name.endswith('.py')}
+    found, pending = set(), ['dress_flower']
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        with open(path.join(BASE, name + '.py'), encoding='utf-8') as file:
+            tree = ast.parse(file.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.split('.')[0] for alias in node.names
+                            if alias.name.split('.')[0] in local]
+            elif isinstance(node, ast.ImportFrom) and node.module and \
+                    node.module.split('.')[0] in local:
+                pending.append(node.module.split('.')[0])
+
+    # A validação e a localização apenas produzem os valores de entrada
+    inputs = {'artifacts', 'geolocation', 'validation'}
+    assert {name + '.py' for name in found - inputs} == set(artifacts.SOURCES)
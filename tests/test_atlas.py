@@ -0,0 +1,70 @@
+# test_atlas.py
+#
+# Testes do atlas de contornos base: construção em um intervalo curto de
+# datas, busca das datas, datas fora do atlas e atlas de outra versão ou
+# de outra tolerância, que não são utilizados.
+#
+
+import datetime
+import json
+from os import path
+
+import numpy as np
+import pytest
+
+pytest.importorskip('rhino3dm')
+pytest.importorskip('compute_rhino3d')
+
+import atlas
+from geometry import TOLERANCE, base_outline
+
+START = datetime.date(2004, 2, 27)
+END = datetime.date(2004, 3, 1)
+
+@pytest.fixture(scope='module')
+def directory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('atlas'))
+    atlas.build(START, END, directory, workers=1)
+    return directory
+
+@pytest.fixture
+def installed(directory, monkeypatch):
+    # Instala o atlas construído como o atlas do processo
+    monkeypatch.setattr(atlas, 'DIRECTORY', directory)
+    monkeypatch.setattr(atlas, '_atlas', None)
+    return directory
+
+def test_build(directory):
+    with open(path.join(directory, 'atlas.json'), encoding='utf-8') as file:
+        meta = json.load(file)
+    assert meta['datas'] == 4 and meta['falhas'] == 0
+    assert meta['tolerância'] == TOLERANCE
+    assert meta['versão'] == atlas.version()
+
+    index = np.load(path.join(directory, 'index.npy'))
+    assert index.shape == (4, 2)
+    assert index[:, 1].sum() == meta['segmentos']
+
+def test_lookup(directory):
+    # Inclui o dia 29 de fevereiro do ano bissexto
+    opened = atlas.Atlas(directory)
+    for x in range(4):
+        date = atlas.to_digits(START + datetime.timedelta(x))
+        assert np.array_equal(opened.lookup(date), base_outline(date))
+
+def test_lookup_miss(directory):
+    opened = atlas.Atlas(directory)
+    assert opened.lookup(atlas.to_digits(END + datetime.timedelta(1))) is None
+    assert opened.lookup(atlas.to_digits(START - datetime.timedelta(1))) is None
+    assert opened.lookup([3, 0, 0, 2, 2, 0, 0, 4]) is None
+
+def test_lookup_outline_tolerance(installed):
+    date = atlas.to_digits(START)
+    assert np.array_equal(atlas.lookup_outline(date, TOLERANCE),
+                          base_outline(date))
+    assert atlas.lookup_outline(date, TOLERANCE * 10) is None
+
+def test_other_version(installed, monkeypatch):
+    monkeypatch.setattr(atlas, 'version', lambda: 'outra')
+    assert atlas.get_atlas() is None
+    assert atlas.lookup_outline(atlas.to_digits(START), TOLERANCE) is None
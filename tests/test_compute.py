@@ -0,0 +1,66 @@
+# test_compute.py
+#
+# Testes do ComputeClient com os servidores substitutos do compute_bench:
+# repetição em outro servidor após um erro 5xx, desvio dos servidores
+# que falham na verificação de saúde e ordem dos resultados agrupados.
+#
+
+import contextlib
+
+import pytest
+
+r3dm = pytest.importorskip('rhino3dm')
+compute_rhino3d = pytest.importorskip('compute_rhino3d')
+
+from compute import ComputeClient
+from compute_bench import StandInServer
+
+@pytest.fixture
+def servers():
+    with contextlib.ExitStack() as stack:
+        yield [stack.enter_context(StandInServer(latency=0))
+               for _ in range(2)]
+
+@pytest.fixture
+def client(servers, monkeypatch):
+    client = ComputeClient([server.url for server in servers],
+                           health_interval=None)
+    monkeypatch.setattr(compute_rhino3d.Util, 'url', client.urls[0])
+    monkeypatch.setattr(compute_rhino3d.Util, 'ComputeFetch', client.fetch)
+    yield client
+    client.close()
+
+def test_retry_after_server_error(servers, client):
+    servers[0].errors = 1
+    assert client.fetch('teste', [7]) == 7
+    assert (servers[0].failed, servers[0].requests) == (1, 0)
+    assert servers[1].requests == 1
+    assert [ep['saudável'] for ep in client.pool.status()] == [False, True]
+
+def test_error_after_retries(servers, client):
+    servers[0].errors = servers[1].errors = 3
+    with pytest.raises(Exception):
+        client.fetch('teste', [7])
+    assert servers[0].failed + servers[1].failed == client.retries + 1
+
+def test_unhealthy_endpoint(servers, client):
+    servers[0].healthy = False
+    client.pool.check_health(client.session)
+    for value in range(4):
+        assert client.fetch('teste', [value]) == value
+    assert (servers[0].requests, servers[1].requests) == (0, 4)
+
+    # Sem servidores saudáveis, as requisições ainda são atendidas
+    servers[1].healthy = False
+    client.pool.check_health(client.session)
+    assert client.fetch('teste', [9]) == 9
+
+def test_batch_order(client):
+    from compute_rhino3d import Curve
+
+    curves = [r3dm.Circle(r3dm.Point3d(0, 0, 0), radius).ToNurbsCurve()
+              for radius in range(1, 21)]
+    plane = r3dm.Plane(r3dm.Point3d(0, 0, 10), r3dm.Vector3d(0, 0, 1))
+    result = client.batch(Curve.ProjectToPlane, curves, [plane] * len(curves))
+    radii = [curve.GetBoundingBox().Max.X for curve in result]
+    assert radii == pytest.approx(list(range(1, 21)))
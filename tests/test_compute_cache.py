@@ -0,0 +1,69 @@
+# test_compute_cache.py
+#
+# Testes do cache de respostas do Rhino.Compute: as buscas não esperam
+# pela gravação em disco, o descarte mantém o diretório abaixo do limite e
+# processos que compartilham o diretório gravam a mesma resposta sem
+# conflito.
+#
+
+import multiprocessing
+import os
+import threading
+
+from compute_cache import ComputeCache
+
+def test_get_during_disk_write(tmp_path, monkeypatch):
+    cache = ComputeCache(str(tmp_path))
+    cache.put('a' * 64, b'{}')
+
+    # Bloqueia a gravação em disco da próxima resposta
+    writing, release = threading.Event(), threading.Event()
+    store = cache._store
+    def slow_store(key, body):
+        writing.set()
+        release.wait(5)
+        store(key, body)
+    monkeypatch.setattr(cache, '_store', slow_store)
+
+    thread = threading.Thread(target=cache.put, args=('b' * 64, b'[]'))
+    thread.start()
+    assert writing.wait(5)
+    assert cache.get('a' * 64) == b'{}'
+    assert cache.get('b' * 64) == b'[]'
+    release.set()
+    thread.join()
+
+def test_eviction(tmp_path):
+    cache = ComputeCache(str(tmp_path), disk_bytes=10000)
+    for n in range(50):
+        cache.put('{:064x}'.format(n), b'x' * 1000)
+        if cache._evictor is not None:
+            cache._evictor.join()
+
+    size = sum(entry[1] for entry in cache._scan())
+    assert size <= 10000
+    assert cache._disk_size == size
+
+def store_many(directory, body):
+    cache = ComputeCache(directory)
+    for n in range(200):
+        cache._store('c' * 64, body)
+
+def test_store_from_processes(tmp_path):
+    # A thread principal dos processos criados por fork costuma ter o
+    # mesmo identificador, e os arquivos temporários não podem depender
+    # dele
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=store_many,
+                                 args=(str(tmp_path), bytes([65 + n]) * 64))
+                 for n in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    files = os.listdir(tmp_path / 'cc')
+    assert files == ['c' * 64 + '.json']
+    assert ComputeCache(str(tmp_path)).get('c' * 64) in (b'A' * 64,
+                                                         b'B' * 64)
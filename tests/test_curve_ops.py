@@ -0,0 +1,43 @@
+# test_curve_ops.py
+#
+# Testes da caixa delimitadora e do ponto mais próximo calculados pelos
+# trechos de Bézier, comparados com a amostragem pelo PointAt.
+#
+
+import math
+
+import numpy as np
+import pytest
+
+r3dm = pytest.importorskip('rhino3dm')
+
+import curve_ops
+
+def wavy_curve():
+    points = []
+    for i in range(40):
+        a = 2 * math.pi * i / 40
+        radius = 10 * (1 + 0.3 * math.sin(5 * a))
+        points.append(r3dm.Point3d(radius * math.cos(a), radius * math.sin(a),
+                                   0.5 * math.sin(3 * a)))
+    return r3dm.NurbsCurve.Create(True, 3, points)
+
+CURVES = [wavy_curve(),
+          r3dm.Circle(r3dm.Point3d(1, 2, 0), 5).ToNurbsCurve()]
+
+@pytest.mark.parametrize('curve', CURVES)
+def test_bounding_box(curve):
+    box = curve_ops.bounding_box(curve)
+    sampled = curve_ops._sampled_box(curve, 2048)
+    for a, b in [(box.Min, sampled.Min), (box.Max, sampled.Max)]:
+        assert np.allclose([a.X, a.Y, a.Z], [b.X, b.Y, b.Z], atol=1e-9)
+
+@pytest.mark.parametrize('curve', CURVES)
+def test_closest_point(curve):
+    for point in [r3dm.Point3d(3, 4, 0), r3dm.Point3d(-20, 1, 0),
+                  r3dm.Point3d(12, 0, 0), curve.PointAt(curve.Domain.T0)]:
+        t = curve_ops.closest_point(curve, point)[1]
+        target = np.array([point.X, point.Y, point.Z])
+        u = curve_ops._sampled_closest_point(curve, target, 2048)[1]
+        assert curve.PointAt(t).DistanceTo(point) <= \
+            curve.PointAt(u).DistanceTo(point) + 1e-9
@@ -0,0 +1,96 @@
+# test_geolocation.py
+#
+# Testes do cache de localizações, da normalização das chaves, da
+# importação do gazetteer e da busca com um provedor substituto, sem rede.
+#
+
+import sqlite3
+
+import pytest
+
+import geolocation
+from geolocation import GeocodeCache, Location, ProviderError, normalize
+
+class StubProvider:
+    """
+    Provedor substituto que conta as buscas e retorna RESULT, ou levanta
+    RESULT caso seja uma exceção.
+    """
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, cidade, estado, pais):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = GeocodeCache(':memory:')
+    monkeypatch.setattr(geolocation, '_cache', cache)
+    monkeypatch.setattr(geolocation, '_provider', None)
+    return cache
+
+def test_normalize():
+    assert normalize('  São   Paulo ') == 'sao paulo'
+    assert normalize('GOIÂNIA') == 'goiania'
+    assert GeocodeCache.key('Belém', 'PA', 'Brasil') == \
+        GeocodeCache.key('belem ', 'pa', ' BRASIL')
+
+def test_cache_persists(tmp_path):
+    database = str(tmp_path / 'geocode.sqlite3')
+    GeocodeCache(database).put('São Paulo', 'SP', 'Brasil',
+                               Location(-23.55, -46.63, 'São Paulo',
+                                        'São Paulo'))
+
+    location = GeocodeCache(database).get('sao paulo', 'sp', 'brasil')
+    assert (location.latitude, location.longitude) == (-23.55, -46.63)
+    assert location.raw['address'] == {'city': 'São Paulo',
+                                       'state': 'São Paulo'}
+    assert GeocodeCache(database).get('Santos', 'SP', 'Brasil') is None
+
+def test_import_gazetteer(tmp_path, cache):
+    filename = tmp_path / 'gazetteer.csv'
+    filename.write_text(
+        'cidade,estado,pais,latitude,longitude,nome_cidade,nome_estado\n'
+        'Sao Paulo,SP,Brasil,-23.55,-46.63,São Paulo,São Paulo\n'
+        'Curitiba,PR,Brasil,-25.43,-49.27,,\n', encoding='utf-8')
+
+    assert cache.import_gazetteer(str(filename)) == 2
+    assert cache.get('São Paulo', 'SP', 'Brasil').raw['address']['city'] == \
+        'São Paulo'
+    assert cache.get('Curitiba', 'PR', 'Brasil').raw['address'] == \
+        {'city': 'Curitiba', 'state': 'PR'}
+
+def test_coordinates_provider(cache):
+    provider = StubProvider(Location(-22.9, -43.2, 'Rio de Janeiro', 'RJ'))
+    geolocation.set_provider(provider)
+
+    for x in range(2):
+        location = geolocation.coordinates('Rio de Janeiro', 'RJ', 'Brasil')
+        assert location.latitude == -22.9
+    assert provider.calls == 1
+    assert cache.get('rio de janeiro', 'rj', 'brasil') is location
+
+@pytest.mark.parametrize('error', [ProviderError('indisponível'),
+                                   TimeoutError('timeout')])
+def test_coordinates_provider_error(cache, error):
+    geolocation.set_provider(StubProvider(error))
+    assert geolocation.coordinates('Natal', 'RN', 'Brasil') is None
+
+def test_coordinates_unexpected_error(cache):
+    # Erros de programação não são tratados como localização inexistente
+    geolocation.set_provider(StubProvider(KeyError('city')))
+    with pytest.raises(KeyError):
+        geolocation.coordinates('Natal', 'RN', 'Brasil')
+
+def test_coordinates_locked_database(cache, monkeypatch):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(cache, 'put', locked)
+    geolocation.set_provider(StubProvider(Location(-5.8, -35.2, 'Natal',
+                                                   'RN')))
+
+    assert geolocation.coordinates('Natal', 'RN', 'Brasil').latitude == -5.8
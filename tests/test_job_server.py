@@ -0,0 +1,38 @@
+# test_job_server.py
+#
+# Testes do descarte dos registros dos pedidos concluídos da fila do
+# servidor de pedidos.
+#
+
+import time
+
+import pytest
+
+from job_server import JobQueue
+
+@pytest.fixture
+def jobs():
+    jobs = JobQueue(workers=1, ttl=60, max_finished=3)
+    yield jobs
+    jobs.close()
+
+def finish(jobs, id, age):
+    # Registra um pedido concluído há AGE segundos, como o _dispatch
+    with jobs._lock:
+        jobs.jobs[id] = {'id': id, 'status': 'concluído',
+                         'fim': time.time() - age}
+        jobs._finished.append(id)
+
+def test_ttl(jobs):
+    finish(jobs, 'antigo', 120)
+    finish(jobs, 'recente', 10)
+    jobs.jobs['na fila'] = {'id': 'na fila', 'status': 'na fila'}
+    assert jobs.status()['pedidos'] == {'concluído': 1, 'na fila': 1}
+    assert jobs.get('antigo') is None
+    assert jobs.get('recente') is not None
+
+def test_max_finished(jobs):
+    for n in range(5):
+        finish(jobs, str(n), 5 - n)
+    jobs.status()
+    assert sorted(jobs.jobs) == ['2', '3', '4']
@@ -0,0 +1,78 @@
+# test_outline.py
+#
+# Compara o contorno base da flor calculado localmente pelo outline com
+# o calculado pelo Rhino.Compute (união e arredondamento dos cantos) em
+# algumas datas. Os testes da comparação são ignorados quando não há um
+# servidor do Rhino.Compute disponível.
+#
+
+import datetime
+import math
+
+import numpy as np
+import pytest
+
+r3dm = pytest.importorskip('rhino3dm')
+pytest.importorskip('compute_rhino3d')
+requests = pytest.importorskip('requests')
+
+import compute
+from atlas import to_digits
+from geometry import REFERENCE, TOLERANCE, base_outline, compute_outline
+from outline import corner_angle, to_curve
+from preview import sample_curve
+
+DATES = [datetime.date(1990, 1, 1), datetime.date(2004, 7, 23),
+         datetime.date(2019, 12, 31)]
+
+SAMPLES = 8000
+
+@pytest.fixture(scope='module')
+def server():
+    try:
+        response = requests.get(compute.URLS[0].rstrip('/') + '/healthcheck',
+                                timeout=2)
+        available = response.status_code == 200
+    except requests.RequestException:
+        available = False
+    if not available:
+        pytest.skip('Rhino.Compute indisponível')
+
+def points(curve):
+    return np.array(sample_curve(curve, SAMPLES))
+
+def area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+def distance(a, b):
+    # Maior distância dos pontos de A até a poligonal fechada B
+    starts, ends = b, np.roll(b, -1, axis=0)
+    edges = ends - starts
+    length = np.maximum((edges ** 2).sum(axis=1), 1e-300)
+    result = 0.0
+    for chunk in np.array_split(a, 16):
+        offset = chunk[:, None, :] - starts[None]
+        t = np.clip((offset * edges).sum(axis=2) / length, 0, 1)
+        gap = offset - t[..., None] * edges
+        result = max(result, np.sqrt((gap ** 2).sum(axis=2)).min(axis=1).max())
+    return result
+
+@pytest.mark.parametrize('day', DATES, ids=str)
+def test_outline_matches_compute(server, day):
+    date = to_digits(day)
+    local = points(to_curve(base_outline(date)))
+    remote = points(compute_outline(date))
+
+    assert np.abs(local.min(axis=0) - remote.min(axis=0)).max() < 0.01
+    assert np.abs(local.max(axis=0) - remote.max(axis=0)).max() < 0.01
+    assert abs(area(local) - area(remote)) < 1e-4 * area(remote)
+    assert max(distance(local, remote), distance(remote, local)) < 0.02
+
+def test_corner_angle():
+    # O arco de concordância de um canto com o ângulo limite fica
+    # exatamente a TOLERANCE do canto
+    radius = REFERENCE / 100
+    angle = corner_angle(radius, TOLERANCE)
+    assert radius / math.cos(angle / 2) - radius == pytest.approx(TOLERANCE)
+    assert corner_angle(radius / 2, TOLERANCE) > angle
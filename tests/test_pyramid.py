@@ -0,0 +1,109 @@
+# test_pyramid.py
+#
+# Testes das imagens da loja virtual: níveis e blocos da pirâmide Deep
+# Zoom de uma imagem com dimensões ímpares, larguras da escada, caminhos
+# relativos do manifesto e o reaproveitamento do JPEG exportado pelo
+# Rhino na produção.
+#
+
+import json
+import os
+from math import ceil, log2
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pyramid import TILE, export_images
+
+WIDTH, HEIGHT = 1001, 601
+
+@pytest.fixture
+def image():
+    x, y = np.meshgrid(np.arange(WIDTH), np.arange(HEIGHT))
+    pixels = np.stack([x % 256, y % 256, (x + y) % 256], axis=2)
+    return Image.fromarray(pixels.astype(np.uint8), 'RGB')
+
+@pytest.fixture
+def directory(image, tmp_path):
+    return export_images(image, 'teste', directory=str(tmp_path / 'teste'))
+
+def manifest(directory):
+    with open(os.path.join(directory, 'manifest.json'),
+              encoding='utf-8') as file:
+        return json.load(file)
+
+def test_dzi_levels(directory):
+    # Cada nível tem as dimensões da imagem divididas por 2 ** (máximo -
+    # nível), arredondadas para cima, como no formato Deep Zoom
+    top = ceil(log2(max(WIDTH, HEIGHT)))
+    tiles = os.path.join(directory, 'zoom_files')
+    assert sorted(os.listdir(tiles), key=int) == \
+        [str(level) for level in range(top + 1)]
+
+    count = 0
+    for level in range(top + 1):
+        width = ceil(WIDTH / 2 ** (top - level))
+        height = ceil(HEIGHT / 2 ** (top - level))
+        columns, rows = ceil(width / TILE), ceil(height / TILE)
+        folder = os.path.join(tiles, str(level))
+        assert len(os.listdir(folder)) == columns * rows
+        count += columns * rows
+
+        # O último bloco termina na borda do nível
+        last = os.path.join(folder, '{}_{}.jpeg'.format(columns - 1,
+                                                       rows - 1))
+        with Image.open(last) as tile:
+            assert tile.size == (width - (columns - 1) * TILE + (columns > 1),
+                                 height - (rows - 1) * TILE + (rows > 1))
+
+    zoom = manifest(directory)['zoom']
+    assert (zoom['níveis'], zoom['quantidade']) == (top + 1, count)
+
+def test_ladder(directory):
+    # A largura maior do que a imagem é ignorada
+    images = manifest(directory)['imagens']
+    assert [image['largura'] for image in images] == [800, 400, 200]
+    for entry in images:
+        assert entry['altura'] == round(HEIGHT * entry['largura'] / WIDTH)
+        with Image.open(os.path.join(directory, entry['arquivo'])) as image:
+            assert image.size == (entry['largura'], entry['altura'])
+
+def test_manifest_relative_paths(directory, tmp_path):
+    # A pasta pode ser movida sem alterar o manifesto
+    moved = str(tmp_path / 'outra')
+    os.rename(directory, moved)
+    data = manifest(moved)
+    names = [entry['arquivo'] for entry in data['imagens']]
+    names += [data['zoom']['arquivo'], data['zoom']['blocos']]
+    for name in names:
+        assert not os.path.isabs(name) and 'teste' not in name
+        assert os.path.exists(os.path.join(moved, name))
+
+def test_production_images_from_rhino_jpeg(image, tmp_path, monkeypatch):
+    # Na produção, as imagens são reduzidas do JPEG exportado pelo Rhino
+    # (aqui pelo serviço de renderização substituto), sem rasterizar
+    import dress_flower
+
+    monkeypatch.chdir(tmp_path)
+    jpeg = str(tmp_path / 'rhino.jpeg')
+    image.save(jpeg, 'JPEG')
+
+    class Model:
+        def Write(self, filename):
+            pass
+
+    class Service:
+        def finish(self, filename, art_id, size, colors, outputs, file3dm):
+            assert outputs == ('jpeg',)
+            return {'jpeg': jpeg, 'tempos': {'jpeg': 0.0}}
+
+    def rasterize(*args):
+        raise AssertionError('rasterização sem o Rhino')
+    monkeypatch.setattr('raster.rasterize', rasterize)
+
+    result = dress_flower.finish([None, None, 60], [[], 10], Model(), 'teste',
+                                 save_3dm=False, outputs=('jpeg', 'imagens'),
+                                 service=Service())
+    assert manifest(result['imagens'])['largura'] == WIDTH
+    assert 'imagens' in result['tempos']
@@ -0,0 +1,83 @@
+# test_raster.py
+#
+# Compara o rasterizador sem o Rhino com o JPEG exportado pelo Rhino para
+# o pedido de referência, e a imagem desenhada em faixas com a imagem
+# inteira.
+#
+
+import tracemalloc
+from os import path
+import numpy as np
+from PIL import Image
+from conftest import BASE
+from raster import PngWriter, draw_steps, rasterize, render_bands
+
+WIDTH = 800
+
+def baseline(id):
+    image = Image.open(path.join(BASE, 'JPEG', id + '_HQ.jpeg'))
+    return image.convert('RGB')
+
+def test_gradient_matches_rhino_pixel(reference):
+    # A curva superior recebe a última cor do gradiente, como no
+    # artist.PaintDocument
+    model, colors = reference
+    image = rasterize(model, colors, WIDTH, samples=2)
+    scale = 3200 // WIDTH
+    expected = baseline('DPSLS001').getpixel((1760, 1440))
+    pixel = image.getpixel((1760 // scale, 1440 // scale))
+
+    assert max(abs(a - b) for a, b in zip(pixel, expected)) <= 4
+    assert max(abs(a - b) for a, b in zip(pixel, colors[0][2])) <= 4
+
+def test_raster_matches_rhino_jpeg(reference):
+    # Compara as duas imagens reduzidas, para que as diferenças de
+    # suavização das bordas e das curvas de sobreposição e o texto, que
+    # não é reconstruído, não dominem a comparação
+    model, colors = reference
+    image = rasterize(model, colors, WIDTH, samples=2)
+    size = (WIDTH // 16, WIDTH // 16)
+    a = np.asarray(image.resize(size, Image.BOX), dtype=float)
+    b = np.asarray(baseline('DPSLS001').resize(size, Image.BOX), dtype=float)
+
+    assert np.abs(a - b).mean() < 6
+
+def write_png(filename, steps, width, band):
+    with PngWriter(filename, width, width) as png:
+        for image in render_bands(steps, width, 2, band):
+            png.write(image)
+
+def test_png_bands_match_full_image(reference, tmp_path):
+    # Faixas de 15 linhas, com a última faixa incompleta
+    model, colors = reference
+    width = 200
+    filename = str(tmp_path / 'bands.png')
+    write_png(filename, draw_steps(model, colors, width), width, width * 15)
+    image = rasterize(model, colors, width, samples=2)
+
+    with Image.open(filename) as png:
+        assert png.size == (width, width)
+        assert png.tobytes() == image.tobytes()
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_png_bands_memory_is_bounded(reference, tmp_path):
+    # Com a mesma quantidade de pixels por faixa, o pico de memória não
+    # cresce com a largura da imagem e fica bem abaixo do pico da imagem
+    # desenhada inteira
+    model, colors = reference
+    filename = str(tmp_path / 'bands.png')
+    peaks = []
+    for width in (200, 400):
+        steps = draw_steps(model, colors, width)
+        peaks.append(peak_memory(write_png, filename, steps, width, 200 * 20))
+    full = peak_memory(rasterize, model, colors, 400, 2)
+
+    assert peaks[1] < 1.5 * peaks[0]
+    assert peaks[1] < full / 4
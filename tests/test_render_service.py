@@ -0,0 +1,39 @@
+# test_render_service.py
+#
+# Testes da chave de autenticação do serviço de renderização.
+#
+
+import os
+import stat
+
+import pytest
+
+import render_service
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'dresspop' / 'render.key')
+    monkeypatch.setattr(render_service, 'KEY_FILE', filename)
+    monkeypatch.delenv('DRESSPOP_RENDER_KEY', raising=False)
+    return filename
+
+def test_environment_key(key_file, monkeypatch):
+    monkeypatch.setenv('DRESSPOP_RENDER_KEY', 'segredo')
+    assert render_service.auth_key(create=True) == b'segredo'
+    assert not os.path.exists(key_file)
+
+def test_generated_key(key_file):
+    assert render_service.auth_key() is None
+    key = render_service.auth_key(create=True)
+    assert len(key) == 64
+    assert render_service.auth_key() == key
+    if os.name == 'posix':
+        assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+
+@pytest.mark.skipif(os.name != 'posix', reason='permissões POSIX')
+def test_shared_key_refused(key_file):
+    render_service.auth_key(create=True)
+    os.chmod(key_file, 0o644)
+    with pytest.raises(PermissionError):
+        render_service.auth_key()
+    assert render_service.connect(('localhost', 1)) is None
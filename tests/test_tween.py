@@ -0,0 +1,57 @@
+# test_tween.py
+#
+# Testes das curvas intermediárias locais em uma forma fixa: o contorno da
+# flor e uma cópia reduzida dele, cujas curvas intermediárias exatas são
+# cópias do contorno em escalas intermediárias.
+#
+
+import math
+
+import pytest
+
+r3dm = pytest.importorskip('rhino3dm')
+pytest.importorskip('compute_rhino3d')
+
+import tween
+from outline import flower_outline, to_curve
+
+COUNT = 12
+SCALE = 0.6
+
+def flower():
+    angles = [math.radians(a) for a in (90, 150, 230, 310, 20)]
+    centers = [[6 * math.cos(a), 6 * math.sin(a)] for a in angles]
+    return to_curve(flower_outline(centers, [2.4, 1.8, 2.2, 1.6, 2.0], 4,
+                                   [0.4, 0.2]))
+
+def scaled(curve, factor):
+    copy = curve.Duplicate()
+    copy.Transform(r3dm.Transform.Scale(r3dm.Point3d(0, 0, 0), factor))
+    return copy
+
+@pytest.fixture(scope='module')
+def shape():
+    curve0 = flower()
+    curve1 = scaled(curve0, SCALE)
+    exact = [scaled(curve0, 1 + (SCALE - 1) * (i + 1) / (COUNT + 1))
+             for i in range(COUNT)]
+    return curve0, curve1, exact
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.02])
+def test_compare_tweens(shape, tolerance):
+    curve0, curve1, exact = shape
+    local = tween.tween_curves(curve0, curve1, COUNT, tolerance)
+    assert tween.compare_tweens(local, exact) <= tolerance
+
+def test_check_tweens(shape, monkeypatch):
+    # O Rhino.Compute é substituído pelas curvas intermediárias exatas
+    curve0, curve1, exact = shape
+    monkeypatch.setattr(tween.Curve, 'CreateTweenCurvesWithMatching',
+                        lambda *args: exact)
+    deviation, ok = tween.check_tweens(curve0, curve1, COUNT)
+    assert ok and deviation <= 0.001
+
+def test_grid_density():
+    assert tween.grid_density(0.001) == tween.DENSITY
+    assert tween.grid_density(0.02) < tween.DENSITY
+    assert tween.grid_density(10) == tween.MIN_DENSITY
@@ -0,0 +1,66 @@
+# test_validation.py
+#
+# Testes da validação dos pedidos e da criação e da validação dos IDs da
+# entrada em lote.
+#
+
+import io
+import json
+import random
+
+import pytest
+
+from intake import intake, new_id
+from validation import check_input
+
+ORDER = {'data': '12/06/1990', 'cidade': 'São Paulo', 'estado': 'SP',
+         'pais': 'Brasil', 'dimensões': 60, 'cores': 3}
+
+def test_sizes():
+    assert check_input(ORDER) == [1, 2, 0, 6, 1, 9, 9, 0]
+    order = dict(ORDER, dimensões=45)
+    with pytest.raises(ValueError):
+        check_input(order)
+
+    # O dress_flower.load_input não limita as dimensões
+    check_input(order, sizes=None)
+    with pytest.raises(TypeError):
+        check_input(dict(ORDER, dimensões='45'), sizes=None)
+
+def test_new_id_existing_order(tmp_path):
+    random.seed(1)
+    first = new_id(set(), str(tmp_path))
+    (tmp_path / (first + '.json')).write_text('{}')
+
+    random.seed(1)
+    second = new_id(set(), str(tmp_path))
+    assert second != first
+
+    random.seed(1)
+    assert new_id({second}, str(tmp_path)) not in (first, second)
+
+def run_intake(records, directory):
+    output, rejects = io.StringIO(), io.StringIO()
+    stream = io.StringIO(''.join(json.dumps(record) + '\n'
+                                 for record in records))
+    summary = intake(stream, output, rejects, directory=str(directory))
+    accepted = [json.loads(line)['id'] for line in
+                output.getvalue().splitlines()]
+    errors = [json.loads(line)['erro'] for line in
+              rejects.getvalue().splitlines()]
+    return summary, accepted, errors
+
+@pytest.mark.parametrize('id', ['../pedido', 'a b', 'DPS/001', 'ção'])
+def test_intake_invalid_id(tmp_path, id):
+    summary, accepted, errors = run_intake([dict(ORDER, id=id)], tmp_path)
+    assert summary['rejeitados'] == 1 and not accepted
+    assert errors[0].startswith('ID de pedido inválido')
+
+def test_intake_existing_id(tmp_path):
+    (tmp_path / 'DPSLS001.json').write_text('{}')
+    records = [dict(ORDER, id='DPSLS001'), dict(ORDER, id='DPS_LS-002'),
+               dict(ORDER, id='DPS_LS-002')]
+    summary, accepted, errors = run_intake(records, tmp_path)
+    assert accepted == ['DPS_LS-002']
+    assert errors[0].startswith('ID de pedido já utilizado')
+    assert errors[1].startswith('ID de pedido repetido')
@@ -0,0 +1,102 @@
+# test_vector.py
+#
+# Compara a ordem e as cores dos preenchimentos do PDF vetorial sem o
+# Rhino com o PDF exportado pelo Rhino para o pedido de referência.
+#
+
+import re
+import zlib
+from os import path
+from conftest import BASE
+from vector import export_pdf, painted_layers
+
+# Cor do preenchimento do texto, fora da comparação do gradiente
+TEXT = (210, 210, 210)
+
+def content_streams(filename):
+    """
+    Retorna os fluxos de conteúdo comprimidos do PDF, descomprimidos.
+    """
+    with open(filename, 'rb') as file:
+        data = file.read()
+    streams = []
+    for match in re.finditer(rb'(?<!end)stream\r?\n', data):
+        end = data.index(b'endstream', match.end())
+        try:
+            streams.append(zlib.decompress(data[match.end():end]))
+        except zlib.error:
+            continue
+
+    return streams
+
+def fill_colors(filename):
+    """
+    Cores de preenchimento do PDF, em RGB-255, na ordem do desenho, sem
+    o branco, o texto e as repetições consecutivas.
+    """
+    colors = []
+    for stream in content_streams(filename):
+        for match in re.finditer(rb'([\d.]+) ([\d.]+) ([\d.]+) (?:sc|rg)\b',
+                                 stream):
+            color = tuple(round(float(v) * 255) for v in match.groups())
+            if color in ((255, 255, 255), TEXT):
+                continue
+            if not colors or colors[-1] != color:
+                colors.append(color)
+
+    return colors
+
+def unique(colors):
+    result = []
+    for color in colors:
+        color = tuple(color)
+        if not result or result[-1] != color:
+            result.append(color)
+    return result
+
+def test_fill_order_matches_rhino_pdf(reference, tmp_path):
+    model, colors = reference
+    expected = fill_colors(path.join(BASE, 'PDF', 'DPSLS001.pdf'))
+
+    # Os preenchimentos da arte começam pela curva inferior, com a
+    # primeira cor do gradiente, e terminam na superior, com a última
+    steps = unique(color for layer, operation, items, color, alpha, weight
+                   in painted_layers(model, colors)
+                   if layer == 'Arte')
+    assert steps == expected
+    assert steps[0] == tuple(colors[0][1])
+    assert steps[-1] == tuple(colors[0][2])
+
+    filename = export_pdf(model, colors, 'teste',
+                          str(tmp_path / 'teste.pdf'))
+    assert fill_colors(filename) == expected
+
+def svg_fill_colors(filename):
+    """
+    Cores de preenchimento dos caminhos do SVG, pelas classes, na ordem
+    do documento, sem o branco, o texto e as repetições consecutivas.
+    """
+    with open(filename, encoding='utf-8') as file:
+        data = file.read()
+    styles = dict(re.findall(r'\.(s\d+)\{fill:#([0-9a-f]{6})', data))
+    colors = []
+    for name in re.findall(r'<path class="(s\d+)"', data):
+        if name not in styles:
+            continue
+        color = tuple(int(styles[name][i:i + 2], 16) for i in (0, 2, 4))
+        if color in ((255, 255, 255), TEXT):
+            continue
+        if not colors or colors[-1] != color:
+            colors.append(color)
+
+    return colors
+
+def test_svg_fill_order_matches_rhino_pdf(reference, tmp_path):
+    from vector import export_svg
+
+    model, colors = reference
+    expected = fill_colors(path.join(BASE, 'PDF', 'DPSLS001.pdf'))
+    filename = export_svg(model, colors, 'teste',
+                          str(tmp_path / 'teste.svg'))
+
+    assert svg_fill_colors(filename) == expected
@@ -0,0 +1,186 @@
+# tween.py
+#
+# Cria localmente, com NumPy, as curvas intermediárias entre duas curvas
+# fechadas com as costuras já alinhadas, substituindo o
+# Curve.CreateTweenCurvesWithMatching do Rhino.Compute. As curvas são
+# amostradas nas mesmas posições de comprimento de arco e todas as curvas
+# intermediárias são interpoladas em uma única operação vetorizada. As
+# curvas são convertidas em NURBS e avaliadas pelos seus trechos de Bézier
+# (veja curve_ops.evaluate), sem uma chamada ao rhino3dm por ponto.
+#
+
+import numpy as np
+import rhino3dm as r3dm
+from compute_rhino3d import Curve
+from curve_ops import evaluate
+
+# Densidade da grade de parâmetros na tolerância de produção. A flecha de
+# cada passo da grade é proporcional ao quadrado do passo, de modo que
+# tolerâncias maiores usam grades proporcionalmente menos densas
+DENSITY = 8192
+DENSITY_TOLERANCE = 0.001
+MIN_DENSITY = 1024
+
+def grid_density(tolerance):
+    """
+    Calcula a densidade da grade de parâmetros para a tolerância
+    fornecida: DENSITY na tolerância de produção, reduzida com a raiz
+    quadrada da tolerância até MIN_DENSITY.
+    """
+    density = DENSITY * (DENSITY_TOLERANCE / tolerance) ** 0.5
+
+    return int(min(max(density, MIN_DENSITY), DENSITY))
+
+def _nurbs(curve):
+    """
+    Retorna a forma NURBS da curva, avaliada pelos trechos de Bézier, ou a
+    própria curva caso a conversão não seja possível. A parametrização
+    pode mudar, mas as amostras são escolhidas pelo comprimento de arco.
+    """
+    nurbs = curve.ToNurbsCurve()
+
+    return curve if nurbs is None else nurbs
+
+def _arc_table(curve, density):
+    """
+    Cria a tabela de parâmetros, comprimentos de arco normalizados e
+    curvaturas de uma curva, avaliada em uma grade densa de parâmetros.
+    A curvatura é estimada pelo ângulo entre segmentos consecutivos da
+    grade, para que arcos menores que o passo da grade não sejam perdidos.
+    """
+    domain = curve.Domain
+    params = np.linspace(domain.T0, domain.T1, density + 1)
+    points = evaluate(curve, params)
+    steps = np.diff(points, axis=0)
+    size = np.maximum(np.linalg.norm(steps, axis=1), 1e-15)
+    length = np.concatenate([[0], np.cumsum(size)])
+
+    # Calcula o ângulo de giro em cada vértice da grade, considerando a
+    # curva fechada
+    unit = steps / size[:, None]
+    prev = np.roll(unit, 1, axis=0)
+    turn = np.arccos(np.clip(np.sum(unit * prev, axis=1), -1, 1))
+    curvature = turn / ((size + np.roll(size, 1)) / 2)
+    curvature = np.append(curvature, curvature[0])
+
+    return params, length / length[-1], curvature, length[-1]
+
+def matched_samples(curve0, curve1, tolerance=0.001, density=None):
+    """
+    Escolhe posições de comprimento de arco comuns às duas curvas, com
+    densidade proporcional à raiz quadrada da curvatura, de modo que o
+    desvio de corda de cada polígono fique dentro da tolerância. DENSITY
+    é a densidade da grade de parâmetros, por padrão a do grid_density.
+    Retorna os pontos correspondentes sobre cada curva, em arrays (M, 3).
+    """
+    density = density or grid_density(tolerance)
+    curve0, curve1 = _nurbs(curve0), _nurbs(curve1)
+    tables = [_arc_table(curve, density) for curve in (curve0, curve1)]
+
+    # Combina a curvatura das duas curvas em uma grade comum de posições
+    s = np.linspace(0, 1, density + 1)
+    kappa = np.maximum(*[np.interp(s, table[1], table[2])
+                         for table in tables])
+    length = max(table[3] for table in tables)
+
+    # Estende a curvatura para os trechos vizinhos, para que a transição
+    # entre retas e arcos já seja amostrada com a densidade do arco
+    reach = density // 128
+    kappa = np.max([np.roll(kappa, k) for k in range(-reach, reach + 1)],
+                   axis=0)
+
+    # Calcula a quantidade de amostras necessária em cada trecho da grade
+    # para que a flecha h²κ/8 fique abaixo da metade da tolerância, já que
+    # a interpolação combina o desvio das duas curvas
+    step = length / density
+    need = step * np.sqrt(kappa / (4 * tolerance))
+    need = np.maximum((need[1:] + need[:-1]) / 2, 1e-3)
+    cdf = np.concatenate([[0], np.cumsum(need)])
+    count = int(np.ceil(cdf[-1])) + 1
+
+    # Distribui as amostras de acordo com a densidade acumulada
+    targets = np.interp(np.arange(count) * (cdf[-1] / count), cdf, s)
+
+    # Avalia os pontos exatos sobre cada curva nas posições escolhidas
+    samples = []
+    for curve, (params, arc, _, _) in zip((curve0, curve1), tables):
+        t = np.interp(targets, arc, params)
+        samples.append(evaluate(curve, t))
+
+    return samples[0], samples[1]
+
+def tween_points(points0, points1, count):
+    """
+    Interpola, em uma única operação, COUNT polígonos intermediários entre
+    os dois conjuntos de pontos correspondentes fornecidos.
+    Retorna um array (COUNT, M, 3).
+    """
+    factors = np.arange(1, count + 1)[:, None, None] / (count + 1)
+
+    return (1 - factors) * points0[None] + factors * points1[None]
+
+def tween_curves(curve0, curve1, count, tolerance=0.001):
+    """
+    Cria COUNT curvas intermediárias entre duas curvas fechadas, do mesmo
+    modo que Curve.CreateTweenCurvesWithMatching, porém sem o Rhino.Compute.
+    As curvas são retornadas como PolylineCurves fechadas cujo desvio em
+    relação à interpolação exata fica dentro da tolerância.
+    """
+    points0, points1 = matched_samples(curve0, curve1, tolerance)
+    tweens = tween_points(points0, points1, count)
+
+    curves = []
+    for points in tweens:
+        vertices = [r3dm.Point3d(*p) for p in points]
+        vertices.append(vertices[0])
+        curves.append(r3dm.PolylineCurve(vertices))
+
+    return curves
+
+def _deviation(points, polyline):
+    """
+    Calcula a maior distância entre um conjunto de pontos e um polígono
+    fechado, fornecido como um array (M, 3) de vértices.
+    """
+    a = polyline
+    ab = np.roll(polyline, -1, axis=0) - a
+    worst = 0.0
+    for p in points:
+        t = np.clip(np.sum((p - a) * ab, axis=1) /
+                    np.maximum(np.sum(ab * ab, axis=1), 1e-30), 0, 1)
+        dist = np.linalg.norm(a + ab * t[:, None] - p, axis=1)
+        worst = max(worst, dist.min())
+
+    return worst
+
+def compare_tweens(local, remote, samples=256):
+    """
+    Compara as curvas intermediárias locais com as do Rhino.Compute,
+    retornando o maior desvio encontrado entre curvas correspondentes.
+    """
+    if len(local) != len(remote):
+        raise ValueError('Quantidade de curvas intermediárias diferente.')
+
+    worst = 0.0
+    for lcrv, rcrv in zip(local, remote):
+        vertices = np.array([(p.X, p.Y, p.Z) for p in
+                             [lcrv.Point(i) for i in range(lcrv.PointCount)]])
+        domain = rcrv.Domain
+        params = np.linspace(domain.T0, domain.T1, samples, endpoint=False)
+        points = np.array([(p.X, p.Y, p.Z) for p in
+                           [rcrv.PointAt(t) for t in params]])
+        worst = max(worst, _deviation(points, vertices[:-1]))
+
+    return worst
+
+def check_tweens(curve0, curve1, count, tolerance=0.001):
+    """
+    Cria as curvas intermediárias localmente e pelo Rhino.Compute e verifica
+    se o desvio entre elas está dentro da tolerância do modelo.
+    Retorna o desvio encontrado e se ele é aceitável.
+    """
+    local = tween_curves(curve0, curve1, count, tolerance)
+    remote = Curve.CreateTweenCurvesWithMatching(curve0, curve1, count)
+    deviation = compare_tweens(local, remote)
+
+    return deviation, deviation <= tolerance
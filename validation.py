@@ -0,0 +1,73 @@
+# validation.py
+#
+# Validação dos valores de entrada de um pedido, sem dependências do
+# Rhino ou da rede, compartilhada entre o dress_flower.load_input e a
+# entrada de pedidos em lote (intake).
+#
+
+SIZES = (31, 60, 90)
+
+FIELDS = ('data', 'cidade', 'estado', 'pais', 'dimensões', 'cores')
+
+def check_date(value):
+    """
+    Avalia se a data está no formato DD/MM/AAAA e retorna os seus oito
+    dígitos como uma lista de números inteiros.
+    """
+    if type(value) != str:
+        raise TypeError('Valor de entrada para a data não é compatível.')
+    date = value.split('/')
+    if len(date) != 3:
+        raise ValueError('Confira se inseriu a data com dia, mês e ano.')
+    elif len(date[0]) != 2 or len(date[1]) != 2 or len(date[2]) != 4:
+        raise ValueError('Confira se a data está no formato DD/MM/AAAA.')
+    elif ''.join(date).isnumeric() == False:
+        raise ValueError('Confira se inseriu corretamente a data.')
+
+    return [int(x) for x in ''.join(date)]
+
+def check_location(cidade, estado, pais):
+    """
+    Avalia se a localização é composta por cidade, estado e país.
+    """
+    for value in (cidade, estado, pais):
+        if type(value) != str or not value.strip():
+            raise ValueError('Confira se colocou corretamente a cidade,'
+                             ' o estado e o país no campo de localização.')
+
+def check_size(value, sizes=SIZES):
+    """
+    Avalia se a dimensão da arte é uma das dimensões SIZES disponíveis, ou
+    apenas se ela é um número inteiro quando SIZES é None.
+    """
+    if type(value) != int:
+        raise TypeError('Valor de entrada para a dimensão não é compatível.')
+    elif sizes is not None and value not in sizes:
+        raise ValueError('Não existe dimensão compatível com a selecionada.')
+
+def check_color(value):
+    """
+    Avalia se o valor das cores corresponde a uma das 12 opções.
+    """
+    if type(value) != int:
+        raise TypeError('Valor de entrada para as cores não é compatível.')
+    elif value < 1 or value > 12:
+        raise ValueError('Não existe valor compatível com a cor selecionada.')
+
+def check_input(input, sizes=SIZES):
+    """
+    Avalia todos os valores de entrada de um pedido, levantando um
+    ValueError ou TypeError no primeiro valor incorreto. A dimensão deve
+    ser uma das SIZES, ou qualquer número inteiro quando SIZES é None.
+    Retorna os dígitos da data como uma lista de números inteiros.
+    """
+    missing = [field for field in FIELDS if field not in input]
+    if missing:
+        raise ValueError('Campos ausentes no pedido: ' + ', '.join(missing))
+
+    date = check_date(input['data'])
+    check_location(input['cidade'], input['estado'], input['pais'])
+    check_size(input['dimensões'], sizes)
+    check_color(input['cores'])
+
+    return date
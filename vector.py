@@ -0,0 +1,545 @@
+# vector.py
+#
+# Exportação vetorial da arte (PDF e SVG) sem o Rhino. Reproduz a pintura do
+# artist.PaintDocument à partir do modelo 3DM sem pintura e escreve as
+# regiões pintadas diretamente como caminhos vetoriais, com as dimensões
+# exatas da arte.
+#
+# As curvas são convertidas em segmentos de Bézier cúbicos: exatamente
+# para as curvas polinomiais de grau 1 a 3, e pela aproximação cúbica
+# das cônicas para os arcos racionais de grau 2 do contorno da flor.
+# Outras curvas são amostradas em polilinhas.
+#
+# O PDF é escrito objeto a objeto diretamente no arquivo, com o conteúdo
+# da página comprimido à medida que as curvas são convertidas. As cores
+# de preenchimento e os estados de transparência são definidos uma única
+# vez em tabelas compartilhadas, e cada layer do modelo vira um grupo de
+# conteúdo opcional, como nos PDFs exportados pelo Rhino. A página tem a
+# dimensão da moldura de impressão (arte e sangria), e a moldura da arte
+# é registrada como o TrimBox.
+#
+# O SVG, para a loja virtual, tem o mesmo enquadramento do JPEG, as
+# coordenadas quantizadas em uma grade inteira, comandos relativos e as
+# cores em classes compartilhadas, e pode ser comprimido com o gzip.
+#
+# Uso: python -m vector <id> [-f pdf|svg] [-z]
+#
+
+import argparse
+import time
+import zlib
+from os import makedirs, path
+import numpy as np
+from preview import (CURVE_ALPHA, TEXT_COLOR, model_curves, painted_regions,
+                     read_model, sample_curve)
+
+# Pontos tipográficos por centímetro, a unidade do modelo
+POINTS = 72 / 2.54
+
+# Pontos por milímetro, a unidade da espessura de impressão das layers
+WEIGHT = 72 / 25.4
+
+# Desvio máximo, em centímetros, ao simplificar polilinhas e amostras
+TOLERANCE = 0.0025
+
+# Layers do modelo, na ordem dos grupos de conteúdo opcional
+LAYERS = ('Arte', 'Texto', 'Curvas', 'ViewFrame', 'PrintFrame')
+
+def simplify(points, tolerance=TOLERANCE):
+    """
+    Simplifica uma polilinha pelo algoritmo de Douglas-Peucker, mantendo
+    os pontos que se afastam mais de TOLERANCE da polilinha simplificada.
+    Todos os trechos de um mesmo nível da subdivisão são avaliados de uma
+    vez. Retorna os pontos mantidos.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count = len(points)
+    if count < 3:
+        return points
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    while True:
+        # Trecho da polilinha simplificada de cada ponto
+        kept = np.flatnonzero(keep)
+        span = np.searchsorted(kept, np.arange(count), side='right') - 1
+        span = np.minimum(span, len(kept) - 2)
+        start = points[kept[span]]
+        chord = points[kept[span + 1]] - start
+        inner = points - start
+
+        # Distância de cada ponto à corda do seu trecho
+        length = (chord * chord).sum(axis=1)
+        t = np.clip((inner * chord).sum(axis=1) / np.maximum(length, 1e-300),
+                    0, 1)
+        offset = inner - t[:, None] * chord
+        distance = np.hypot(offset[:, 0], offset[:, 1])
+        distance[keep] = 0
+
+        # Mantém o ponto mais distante de cada trecho acima da tolerância
+        farthest = np.maximum.reduceat(distance, kept[:-1])
+        chosen = np.flatnonzero((distance > tolerance) &
+                                (distance == farthest[span]))
+        if not len(chosen):
+            break
+        chosen = chosen[np.unique(span[chosen], return_index=True)[1]]
+        keep[chosen] = True
+
+    return points[keep]
+
+def bezier_segments(curve, count=None, tolerance=TOLERANCE):
+    """
+    Converte uma curva do rhino3dm em segmentos de Bézier cúbicos, ou em
+    segmentos de reta para as polilinhas.
+    Retorna o ponto inicial e a lista de segmentos, cada um com os dois
+    pontos de controle e o ponto final. Segmentos de reta têm os pontos
+    de controle iguais a None. Curvas que não podem ser convertidas são
+    amostradas com COUNT pontos. As polilinhas e as amostras são
+    simplificadas com o desvio máximo TOLERANCE, em centímetros.
+    """
+    nurbs = None if curve.IsPolyline() else curve.ToNurbsCurve()
+    degree = nurbs.Degree if nurbs is not None else 0
+    if not 2 <= degree <= 3 or (nurbs.IsRational and degree != 2) \
+            or not nurbs.MakePiecewiseBezier(True):
+        points = sample_curve(curve, count) if count else sample_curve(curve)
+        points = simplify(points, tolerance)
+        return points[0], [(None, None, p) for p in points[1:]]
+
+    points = [(p.X / p.W, p.Y / p.W, p.W) for p in nurbs.Points]
+    start = points[0][:2]
+    segments = []
+    for x in range(0, len(points) - 1, degree):
+        span = points[x:x + degree + 1]
+        if degree == 2:
+            # Eleva o grau de uma cônica, com o peso do ponto central
+            # normalizado, para uma cúbica: exata para as parábolas e
+            # com a tangente correta nos arcos de até 90 graus
+            (x0, y0, w0), (x1, y1, w1), (x2, y2, w2) = span
+            w = w1 / (w0 * w2) ** 0.5
+            k = 4 * w / (3 * (1 + w))
+            segments.append(((x0 + k * (x1 - x0), y0 + k * (y1 - y0)),
+                             (x2 + k * (x1 - x2), y2 + k * (y1 - y2)),
+                             (x2, y2)))
+        else:
+            segments.append((span[1][:2], span[2][:2], span[3][:2]))
+
+    return start, segments
+
+def number(value, digits=2):
+    """
+    Formata um número com até DIGITS casas decimais, sem zeros à direita.
+    """
+    text = '{:.{}f}'.format(value, digits).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+class PdfWriter:
+    """
+    Escreve um PDF de uma página com caminhos vetoriais, objeto a objeto,
+    diretamente no arquivo. O conteúdo da página é comprimido à medida que
+    é escrito. Os objetos de número fixo são escritos ao final, com as
+    tabelas de cores e de transparência.
+    """
+    # Números dos objetos fixos; os grupos de conteúdo opcional e os
+    # estados de transparência seguem a partir de FIRST
+    CATALOG, PAGES, PAGE, CONTENT, LENGTH, FIRST = 1, 2, 3, 4, 5, 6
+
+    def __init__(self, filename, box, trim=None, origin=(0, 0),
+                 scale=POINTS, layers=LAYERS):
+        self.file = open(filename, 'wb')
+        self.box = box
+        self.trim = trim
+        self.origin = origin
+        self.scale = scale
+        self.layers = list(layers)
+        self.offsets = {}
+        self.colors = {}
+        self.states = {}
+        self.layer = None
+        self.color = None
+        self._compressor = zlib.compressobj(9)
+        self._length = 0
+
+        # Cabeçalho e início do conteúdo da página
+        self.file.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+        self._begin(self.CONTENT)
+        self.file.write('<< /Length {} 0 R /Filter /FlateDecode >>\nstream\n'
+                        .format(self.LENGTH).encode('ascii'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _begin(self, number):
+        self.offsets[number] = self.file.tell()
+        self.file.write('{} 0 obj\n'.format(number).encode('ascii'))
+
+    def _object(self, number, body):
+        self._begin(number)
+        self.file.write(body.encode('latin-1') + b'\nendobj\n')
+
+    def _write(self, text):
+        """
+        Comprime e escreve um trecho do conteúdo da página.
+        """
+        data = self._compressor.compress(text.encode('latin-1'))
+        self._length += len(data)
+        self.file.write(data)
+
+    def _point(self, point):
+        return '{} {}'.format(
+            number((point[0] - self.origin[0]) * self.scale),
+            number((point[1] - self.origin[1]) * self.scale))
+
+    def _path(self, curves, count=None):
+        """
+        Converte as curvas no caminho do PDF, um subcaminho por curva.
+        """
+        parts = []
+        for curve in curves:
+            start, segments = bezier_segments(curve, count and count(curve))
+            parts.append(self._point(start) + ' m')
+            for c1, c2, end in segments:
+                if c1 is None:
+                    parts.append(self._point(end) + ' l')
+                else:
+                    parts.append(' '.join((self._point(c1), self._point(c2),
+                                           self._point(end), 'c')))
+            parts.append('h')
+
+        return '\n'.join(parts) + '\n'
+
+    def _set_layer(self, layer):
+        if layer == self.layer:
+            return
+        if self.layer is not None:
+            self._write('EMC\n')
+        if layer not in self.layers:
+            self.layers.append(layer)
+        self._write('/OC /L{} BDC\n'.format(self.layers.index(layer)))
+        self.layer = layer
+
+    def _set_color(self, color, operator):
+        """
+        Define a cor pela tabela de cores, formatada uma única vez.
+        """
+        key = (tuple(color), operator)
+        if key not in self.colors:
+            self.colors[key] = ' '.join([number(c / 255, 3) for c in color] +
+                                        [operator]) + '\n'
+        if self.color != key:
+            self._write(self.colors[key])
+            self.color = key
+
+    def _set_alpha(self, alpha):
+        """
+        Define a transparência pela tabela de estados gráficos.
+        """
+        alpha = round(alpha, 3)
+        if alpha not in self.states:
+            self.states[alpha] = 'GS{}'.format(len(self.states))
+        self._write('/{} gs\n'.format(self.states[alpha]))
+
+    def fill(self, curves, color, layer, count=None):
+        """
+        Preenche as curvas, juntas, com a regra par-ímpar.
+        """
+        self._set_layer(layer)
+        self._set_color(color, 'rg')
+        self._write(self._path(curves, count) + 'f*\n')
+
+    def stroke(self, curves, color, layer, width=0.0, alpha=1.0, count=None):
+        """
+        Desenha as curvas com WIDTH pontos de espessura (0 para a linha
+        mais fina do dispositivo) e transparência ALPHA.
+        """
+        self._set_layer(layer)
+        self._write('q\n')
+        if alpha < 1:
+            self._set_alpha(alpha)
+        self.color = None
+        self._set_color(color, 'RG')
+        self._write('{} w\n'.format(number(width)) +
+                    self._path(curves, count) + 'S\nQ\n')
+        self.color = None
+
+    def close(self):
+        """
+        Finaliza o conteúdo da página e escreve os outros objetos, a
+        tabela de referências e o trailer.
+        """
+        if self.file.closed:
+            return
+        if self.layer is not None:
+            self._write('EMC\n')
+        data = self._compressor.flush()
+        self._length += len(data)
+        self.file.write(data + b'\nendstream\nendobj\n')
+        self._object(self.LENGTH, str(self._length))
+
+        # Grupos de conteúdo opcional e estados de transparência
+        groups = {}
+        for x, name in enumerate(self.layers):
+            groups[x] = self.FIRST + x
+            self._object(groups[x], '<< /Type /OCG /Name ({}) >>'.format(name))
+        states = {}
+        for x, (alpha, name) in enumerate(self.states.items()):
+            states[name] = self.FIRST + len(self.layers) + x
+            self._object(states[name], '<< /Type /ExtGState /CA {0} /ca {0} >>'
+                         .format(number(alpha)))
+
+        # Página, com as dimensões da moldura de impressão e da arte
+        def rectangle(box):
+            return '[{} {}]'.format(self._point(box[0]), self._point(box[1]))
+        refs = ' '.join('{} 0 R'.format(n) for n in groups.values())
+        resources = '/Properties << {} >>'.format(' '.join(
+            '/L{} {} 0 R'.format(x, n) for x, n in groups.items()))
+        if states:
+            resources += ' /ExtGState << {} >>'.format(' '.join(
+                '/{} {} 0 R'.format(name, n) for name, n in states.items()))
+        page = '<< /Type /Page /Parent {} 0 R /MediaBox {} /BleedBox {}'\
+               .format(self.PAGES, rectangle(self.box), rectangle(self.box))
+        if self.trim is not None:
+            page += ' /TrimBox {}'.format(rectangle(self.trim))
+        page += ' /Resources << {} >> /Contents {} 0 R >>'.format(
+            resources, self.CONTENT)
+        self._object(self.PAGE, page)
+        self._object(self.PAGES, '<< /Type /Pages /Kids [{} 0 R] /Count 1 >>'
+                     .format(self.PAGE))
+        self._object(self.CATALOG, '<< /Type /Catalog /Pages {} 0 R '
+                     '/OCProperties << /OCGs [{}] /D << /Order [{}] >> >> >>'
+                     .format(self.PAGES, refs, refs))
+
+        # Tabela de referências e trailer
+        xref = self.file.tell()
+        count = max(self.offsets) + 1
+        lines = ['xref', '0 {}'.format(count), '0000000000 65535 f ']
+        for n in range(1, count):
+            lines.append('{:010d} 00000 n '.format(self.offsets[n]))
+        lines += ['trailer', '<< /Size {} /Root {} 0 R >>'.format(
+            count, self.CATALOG), 'startxref', str(xref), '%%EOF', '']
+        self.file.write('\n'.join(lines).encode('ascii'))
+        self.file.close()
+
+def frame_box(curves, name):
+    """
+    Retorna os cantos inferior esquerdo e superior direito da moldura
+    NAME, ou None caso a moldura não exista.
+    """
+    if not curves.get(name):
+        return None
+    box = curves[name][0].GetBoundingBox()
+
+    return (box.Min.X, box.Min.Y), (box.Max.X, box.Max.Y)
+
+def painted_layers(model, colors, frames=('ViewFrame', 'PrintFrame')):
+    """
+    Percorre as layers do modelo na ordem da pintura do
+    artist.PaintDocument. Retorna uma lista com o nome da layer, a
+    operação ('fill' ou 'stroke'), as curvas, a cor, a transparência e a
+    espessura de impressão em milímetros de cada etapa do desenho. As
+    curvas da arte são preenchidas uma a uma, com o gradiente de cores, e
+    as curvas do texto juntas, para que os furos das letras fiquem vazios.
+    """
+    curves = model_curves(model)
+    layers = {layer.Name: layer for layer in model.Layers}
+
+    steps = [('Arte', 'fill', [curve], color, 1.0, 0.0)
+             for curve, color in painted_regions(curves.get('Arte', []),
+                                                 colors)]
+    if curves.get('Texto'):
+        steps.append(('Texto', 'fill', curves['Texto'], TEXT_COLOR, 1.0, 0.0))
+    if curves.get('Curvas'):
+        steps.append(('Curvas', 'stroke', curves['Curvas'],
+                      tuple(colors[0][0][:3]), CURVE_ALPHA / 255,
+                      max(layers['Curvas'].PlotWeight, 0)))
+    for name in frames:
+        if curves.get(name):
+            steps.append((name, 'stroke', curves[name],
+                          tuple(layers[name].Color[:3]), 1.0,
+                          max(layers[name].PlotWeight, 0)))
+
+    return steps
+
+def export_pdf(model, colors, id, filename=None):
+    """
+    Exporta a arte do modelo 3DM sem pintura, criado pelo
+    geometry.draw_geometry (um rhino3dm.File3dm ou o nome do arquivo), em
+    um PDF vetorial para produção, com as cores do pedido (veja
+    dress_flower.make_flower). O PDF é salvo por padrão no mesmo arquivo
+    do PDF exportado pelo Rhino (PDF/<id>.pdf). Retorna o nome do arquivo.
+    """
+    from artifacts import output_paths
+
+    model = read_model(model)
+    curves = model_curves(model)
+    trim = frame_box(curves, 'ViewFrame')
+    box = frame_box(curves, 'PrintFrame') or trim
+    if box is None:
+        raise ValueError('O modelo não possui molduras para o PDF.')
+
+    # Amostras das curvas que não podem ser convertidas, com cerca de um
+    # terço de ponto tipográfico entre as amostras
+    def count(curve):
+        size = curve.GetBoundingBox()
+        size = max(size.Max.X - size.Min.X, size.Max.Y - size.Min.Y) * POINTS
+        return int(min(max(size * 3, 32), 8192))
+
+    filename = filename or output_paths(id)['pdf']
+    with PdfWriter(filename, box, trim, origin=box[0]) as pdf:
+        for layer, operation, items, color, alpha, weight in \
+                painted_layers(model, colors):
+            if operation == 'fill':
+                pdf.fill(items, color, layer, count)
+            else:
+                pdf.stroke(items, color, layer, weight * WEIGHT, alpha, count)
+
+    return filename
+
+def svg_numbers(values):
+    """
+    Junta os números de um comando do caminho SVG, sem o espaço antes dos
+    números negativos.
+    """
+    text = ''
+    for value in values:
+        text += ('' if not text or value < 0 else ' ') + str(value)
+
+    return text
+
+def svg_path(curves, project, count, tolerance):
+    """
+    Converte as curvas nos dados de um caminho SVG, com as coordenadas
+    quantizadas na grade inteira de PROJECT e os comandos relativos ao
+    ponto anterior. Segmentos que se anulam na grade são descartados.
+    """
+    parts = []
+    for curve in curves:
+        start, segments = bezier_segments(curve, count(curve), tolerance)
+        last = project(start)
+        parts.append('M' + svg_numbers(last))
+        command = None
+        for c1, c2, end in segments:
+            point = project(end)
+            if c1 is None:
+                if point == last:
+                    continue
+                values, letter = (point[0] - last[0], point[1] - last[1]), 'l'
+            else:
+                a, b = project(c1), project(c2)
+                values = (a[0] - last[0], a[1] - last[1], b[0] - last[0],
+                          b[1] - last[1], point[0] - last[0],
+                          point[1] - last[1])
+                letter = 'c'
+                if not any(values):
+                    continue
+            # Comandos repetidos podem omitir a letra
+            numbers = svg_numbers(values)
+            if letter == command:
+                parts.append(numbers if values[0] < 0 else ' ' + numbers)
+            else:
+                parts.append(letter + numbers)
+            command = letter
+            last = point
+        parts.append('z')
+
+    return ''.join(parts)
+
+def export_svg(model, colors, id, filename=None, grid=4000, compress=False):
+    """
+    Exporta a arte do modelo 3DM sem pintura em um SVG compacto para a
+    loja virtual, com as camadas pintadas e o enquadramento do JPEG (a
+    moldura da arte, sem a sangria). As coordenadas são quantizadas em
+    uma grade de GRID unidades na largura da arte, as cores são definidas
+    uma única vez em classes compartilhadas, e, com COMPRESS, o arquivo é
+    comprimido com o gzip (SVGZ). O SVG é salvo por padrão em
+    SVG/<id>.svg, ou SVG/<id>.svgz. Retorna o nome do arquivo.
+    """
+    import gzip
+    from artifacts import output_paths
+
+    model = read_model(model)
+    box = frame_box(model_curves(model), 'ViewFrame')
+    if box is None:
+        raise ValueError('O modelo não possui a moldura da arte para o SVG.')
+    (left, bottom), (right, top) = box
+    unit = max(right - left, top - bottom) / grid
+
+    def project(point):
+        return (round((point[0] - left) / unit), round((top - point[1]) / unit))
+
+    # Amostras das curvas que não podem ser convertidas, com cerca de uma
+    # unidade da grade entre as amostras
+    def count(curve):
+        size = curve.GetBoundingBox()
+        size = max(size.Max.X - size.Min.X, size.Max.Y - size.Min.Y) / unit
+        return int(min(max(size * 3, 32), 8192))
+
+    # Converte as camadas em caminhos, com uma classe por estilo
+    styles = {}
+    groups = []
+    for layer, operation, items, color, alpha, weight in \
+            painted_layers(model, colors, ('ViewFrame',)):
+        hex = '#{:02x}{:02x}{:02x}'.format(*color)
+        if operation == 'fill':
+            style = 'fill:' + hex
+        else:
+            style = 'fill:none;stroke:{};stroke-width:{}'.format(
+                hex, number(max(weight / 10 / unit, 1)))
+            if alpha < 1:
+                style += ';stroke-opacity:' + number(alpha, 3)
+        name = styles.setdefault(style, 's{}'.format(len(styles)))
+        data = svg_path(items, project, count, unit / 2)
+        if groups and groups[-1][0] == layer:
+            groups[-1][1].append((name, data))
+        else:
+            groups.append((layer, [(name, data)]))
+
+    # Escreve o documento
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {0} {0}" '
+             'fill-rule="evenodd">'.format(grid),
+             '<style>' + ''.join('.{}{{{}}}'.format(name, style)
+                                 for style, name in styles.items()) +
+             '</style>',
+             '<rect width="100%" height="100%" fill="#fff"/>']
+    for layer, paths in groups:
+        lines.append('<g id="{}">'.format(layer))
+        lines += ['<path class="{}" d="{}"/>'.format(name, data)
+                  for name, data in paths]
+        lines.append('</g>')
+    lines.append('</svg>\n')
+    data = '\n'.join(lines).encode('utf-8')
+
+    filename = filename or output_paths(id)['svg'] + ('z' if compress else '')
+    makedirs(path.dirname(filename), exist_ok=True)
+    if compress:
+        data = gzip.compress(data, 9, mtime=0)
+    with open(filename, 'wb') as file:
+        file.write(data)
+
+    return filename
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m vector',
+        description='Gera o PDF ou o SVG de um pedido já gerado sem o '
+                    'Rhino.')
+    parser.add_argument('id', help='ID do pedido')
+    parser.add_argument('-f', '--formato', choices=('pdf', 'svg'),
+                        default='pdf', help='formato de saída (padrão: pdf)')
+    parser.add_argument('-z', '--gzip', action='store_true',
+                        help='comprime o SVG com o gzip (SVGZ)')
+    args = parser.parse_args(argv)
+
+    from raster import order_model
+
+    start = time.perf_counter()
+    model, colors, size = order_model(args.id)
+    if args.formato == 'svg':
+        filename = export_svg(model, colors, args.id, compress=args.gzip)
+    else:
+        filename = export_pdf(model, colors, args.id)
+    print('{} ({:.2f} s)'.format(filename, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()